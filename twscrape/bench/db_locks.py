@@ -0,0 +1,53 @@
+"""
+Micro-benchmark of account lock/unlock throughput in AccountsPool.
+Usage: python bench/db_locks.py [accounts] [ops] [workers] [--in-memory]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from twscrape import AccountsPool
+from twscrape.logger import set_log_level
+
+Q = "SearchTimeline"
+
+
+async def worker(pool: AccountsPool, ops: int):
+    done = 0
+    while done < ops:
+        acc = await pool.get_for_queue(Q)
+        if acc is None:
+            await asyncio.sleep(0)
+            continue
+
+        await pool.unlock(acc.username, Q, req_count=1)
+        done += 1
+
+
+async def main(accounts: int, ops: int, workers: int, in_memory: bool):
+    set_log_level("ERROR")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = AccountsPool(os.path.join(tmp, "bench.db"), in_memory=in_memory)
+        for i in range(accounts):
+            await pool.add_account(f"user{i}", "pass", f"user{i}@example.com", "email_pass")
+            await pool.set_active(f"user{i}", True)
+
+        st = time.perf_counter()
+        await asyncio.gather(*[worker(pool, ops // workers) for _ in range(workers)])
+        await pool.close()
+        el = time.perf_counter() - st
+
+        total = (ops // workers) * workers
+        mode = "memory" if in_memory else "db"
+        print(f"accounts={accounts} workers={workers} mode={mode} lock+unlock={total}")
+        print(f"{total / el:,.0f} lock+unlock/s ({el * 1000 / total:.3f} ms per cycle)")
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:] if not x.startswith("--")]
+    accounts, ops, workers = (args + [300, 2000, 8][len(args) :])[:3]
+    asyncio.run(main(accounts, ops, workers, "--in-memory" in sys.argv))
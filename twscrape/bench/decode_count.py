@@ -0,0 +1,74 @@
+"""
+Count of JSON decodes and time per page for `api.search()` over tests/mocked-data/raw_search.json
+(full pipeline: QueueClient checks, API pagination, models parsing; network mocked).
+Usage: python bench/decode_count.py [pages] [--debug]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from twscrape import API, AccountsPool, jsonlib
+from twscrape.logger import set_log_level
+from twscrape.queue_client import XClIdGenStore
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data", "raw_search.json")
+DATA = os.path.abspath(DATA)
+
+
+class ClIdGenMock:
+    def calc(self, *args, **kwargs):
+        return "mocked-clid"
+
+
+async def main(pages: int, debug: bool):
+    with open(DATA, "rb") as fp:
+        body = fp.read()
+
+    requests = 0
+
+    async def handle(self, request: httpx.Request):
+        nonlocal requests
+        requests += 1
+        return httpx.Response(200, content=body, request=request)
+
+    async def get_clid(*args, **kwargs):
+        return ClIdGenMock()
+
+    decodes = 0
+    orig_loads = jsonlib.loads
+
+    def counted_loads(data):
+        nonlocal decodes
+        decodes += isinstance(data, bytes)  # response bodies, not account fields
+        return orig_loads(data)
+
+    setattr(httpx.AsyncHTTPTransport, "handle_async_request", handle)
+    setattr(jsonlib, "loads", counted_loads)
+    setattr(XClIdGenStore, "get", get_clid)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = AccountsPool(os.path.join(tmp, "bench.db"))
+        await pool.add_account("user1", "pass1", "email1", "email_pass1", cookies="ct0=abc")
+
+        api = API(pool, debug=debug)
+        set_log_level("ERROR")
+
+        # same page returned each time, limit stops pagination after `pages` pages
+        st, tweets = time.perf_counter(), 0
+        async for _ in api.search("elon musk", limit=pages * 10):
+            tweets += 1
+        el = time.perf_counter() - st
+
+        print(f"pages={requests} tweets={tweets} page_size={len(body) / 1024:.0f}KB debug={debug}")
+        print(f"{decodes / requests:.1f} decodes per page, {el * 1000 / requests:.2f} ms per page")
+        await pool.close()
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:] if not x.startswith("--")]
+    asyncio.run(main(args[0] if args else 200, "--debug" in sys.argv))
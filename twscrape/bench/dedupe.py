@@ -0,0 +1,53 @@
+"""
+Benchmark of crawl-scoped dedupe filters: memory per id, time per `add` and observed false
+positive rate (new ids reported as seen) for snowflake-like tweet ids.
+Usage: python bench/dedupe.py [ids] [error_rate]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from twscrape.dedupe import BloomIds, SeenIds
+
+
+def make_ids(count: int, rnd: random.Random):
+    base = 1_700_000_000_000_000_000
+    return [str(base + rnd.randrange(1 << 50)) for _ in range(count)]
+
+
+def run(name: str, make, ids: list[str], new_ids: list[str]):
+    tracemalloc.start()
+    seen = make()
+    for x in ids:
+        seen.add(x)
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    seen = make()
+    st = time.perf_counter()
+    for x in ids:
+        seen.add(x)
+    el = time.perf_counter() - st
+
+    dups = sum(x in seen for x in ids[:10_000])
+    fp = sum(x in seen for x in new_ids)
+    print(
+        f"{name:>12}: {mem / len(ids):6.1f} B/id, {el / len(ids) * 1e6:.2f} us/add,"
+        f" duplicates found {dups}/10000, false positives {fp}/{len(new_ids)}"
+    )
+
+
+def main(count: int, error_rate: float):
+    rnd = random.Random(42)
+    ids, new_ids = make_ids(count, rnd), make_ids(100_000, rnd)
+    print(f"ids={count:,} error_rate={error_rate}")
+    run("set", SeenIds, ids, new_ids)
+    run("bloom", lambda: BloomIds(capacity=count, error_rate=error_rate), ids, new_ids)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    error_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.001
+    main(count, error_rate)
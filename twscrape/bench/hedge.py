@@ -0,0 +1,61 @@
+"""
+Benchmark of hedged single-item requests (`user_by_id` etc.) with simulated latencies: most
+accounts / proxies answer fast, but some requests are slow (long tail). Hedging sends same
+request with second account when first one is slower than percentile of observed latencies.
+Usage: python bench/hedge.py [requests] [slow_pct] [concurrency]
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from twscrape.api import API
+
+
+def make_api(hedge: float, slow_pct: float, rnd: random.Random):
+    api = API(hedge=hedge)
+    api.hedge_delay = 0.3
+
+    async def get(queue: str, url: str, params: dict):
+        slow = rnd.random() < slow_pct / 100
+        await asyncio.sleep(rnd.uniform(1.0, 3.0) if slow else rnd.uniform(0.05, 0.15))
+        return True
+
+    setattr(api, "_gql_get", get)
+    return api
+
+
+async def run(name: str, api: API, total: int, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    times: list[float] = []
+
+    async def one():
+        async with sem:
+            st = time.perf_counter()
+            await api._gql_item("x/UserByRestId", {})
+            times.append(time.perf_counter() - st)
+
+    await asyncio.gather(*[one() for _ in range(total)])
+    times.sort()
+    p50, p99 = times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+    stats = api.hedge_stats
+    extra = stats["hedged"] / max(stats["requests"], 1) * 100
+    print(
+        f"{name:>12}: p50 {p50:6.0f} ms, p99 {p99:6.0f} ms, max {times[-1] * 1000:6.0f} ms,"
+        f" extra requests {extra:4.1f}%, won by hedge {stats['won_by_hedge']}"
+    )
+
+
+async def main(total: int, slow_pct: float, concurrency: int):
+    print(f"requests={total} slow={slow_pct}% (1-3s, else 50-150ms) concurrency={concurrency}")
+    await run("no hedge", make_api(0, slow_pct, random.Random(1)), total, concurrency)
+    for pct in [90, 95]:
+        api = make_api(pct, slow_pct, random.Random(1))
+        await run(f"hedge p{pct}", api, total, concurrency)
+
+
+if __name__ == "__main__":
+    args = [float(x) for x in sys.argv[1:]]
+    total, slow_pct, concurrency = (args + [1000, 3, 50][len(args) :])[:3]
+    asyncio.run(main(int(total), slow_pct, int(concurrency)))
@@ -0,0 +1,142 @@
+"""
+Benchmark of many concurrent requests through one account: HTTP/1.1 vs HTTP/2 transport
+against local HTTPS stand-in server (supports both protocols, responds after small delay).
+Requires `h2` package. Usage: python bench/http2.py [requests] [concurrency] [delay_ms]
+"""
+
+import asyncio
+import ssl
+import sys
+import tempfile
+import time
+
+import h2.config
+import h2.connection
+import h2.events
+import httpx
+from http_reuse import BODY, make_cert
+
+from twscrape.transports import TransportPool
+
+
+class Server:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            if writer.get_extra_info("ssl_object").selected_alpn_protocol() == "h2":
+                await self.handle_h2(reader, writer)
+            else:
+                await self.handle_h1(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_h1(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(self.delay)
+            rep = b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+            rep += b"content-length: %d\r\n\r\n%s" % (len(BODY), BODY)
+            writer.write(rep)
+            await writer.drain()
+
+    async def handle_h2(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        tasks = set()
+
+        async def respond(stream_id: int):
+            await asyncio.sleep(self.delay)
+            hdr = [(":status", "200"), ("content-type", "application/json")]
+            conn.send_headers(stream_id, hdr + [("content-length", str(len(BODY)))])
+            conn.send_data(stream_id, BODY, end_stream=True)
+            writer.write(conn.data_to_send())
+
+        while True:
+            data = await reader.read(65535)
+            if not data:
+                break
+
+            for ev in conn.receive_data(data):
+                if isinstance(ev, h2.events.RequestReceived) and ev.stream_id is not None:
+                    task = asyncio.create_task(respond(ev.stream_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if isinstance(ev, h2.events.ConnectionTerminated):
+                    return
+
+            writer.write(conn.data_to_send())
+
+
+async def run(name: str, pool: TransportPool, http2: bool, url, total, concurrency, server):
+    sem = asyncio.Semaphore(concurrency)
+    times: list[float] = []
+    transport = await pool.acquire("user1", None, http2)
+    clt = httpx.AsyncClient(transport=transport, timeout=60)
+
+    async def one():
+        async with sem:
+            st = time.perf_counter()
+            rep = await clt.get(url)
+            rep.raise_for_status()
+            times.append(time.perf_counter() - st)
+            return rep.http_version
+
+    server.connections = 0
+    st = time.perf_counter()
+    versions = set(await asyncio.gather(*[one() for _ in range(total)]))
+    el = time.perf_counter() - st
+    await pool.release("user1", None, transport, http2)
+
+    times.sort()
+    p50, p99 = times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+    print(
+        f"{name:>22}: {total / el:,.0f} req/s, p50 {p50:.1f} ms, p99 {p99:.1f} ms,"
+        f" connections: {server.connections}, protocol: {','.join(versions)}"
+    )
+
+
+async def main(total: int, concurrency: int, delay_ms: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        crt, key = make_cert(tmp)
+        srv_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        srv_ctx.load_cert_chain(crt, key)
+        srv_ctx.set_alpn_protocols(["h2", "http/1.1"])
+        clt_ctx = ssl.create_default_context(cafile=crt)
+
+        server = Server(delay_ms / 1000)
+        srv = await asyncio.start_server(server.handle, "127.0.0.1", 0, ssl=srv_ctx)
+        port = srv.sockets[0].getsockname()[1]
+        url = f"https://127.0.0.1:{port}/i/api/graphql/SearchTimeline"
+
+        class Pool(TransportPool):
+            def _make(self, proxy: str | None, http2: bool):
+                limits = httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                )
+                return httpx.AsyncHTTPTransport(verify=clt_ctx, limits=limits, http2=http2)
+
+        print(f"requests={total} concurrency={concurrency} server delay={delay_ms}ms, one account")
+        for name, max_conn, http2 in [
+            ("HTTP/1.1, 10 conns max", 10, False),
+            (f"HTTP/1.1, {concurrency} conns max", concurrency, False),
+            ("HTTP/2", 10, True),
+        ]:
+            pool = Pool(keepalive=60, max_connections=max_conn)
+            await run(name, pool, http2, url, total, concurrency, server)
+            await pool.close()
+
+        srv.close()
+        await srv.wait_closed()
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:]]
+    asyncio.run(main(*(args + [2000, 50, 20][len(args) :])[:3]))
@@ -0,0 +1,124 @@
+"""
+Benchmark of single-request sessions (like `user_by_id` calls) against local HTTPS stand-in server:
+new client per session (old behavior) vs shared keep-alive transport from TransportPool.
+Usage: python bench/http_reuse.py [requests] [concurrency]
+"""
+
+import asyncio
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from twscrape.transports import TransportPool
+
+BODY = b'{"data":{"user":{"result":{"rest_id":"2244994945"}}}}'
+
+
+class Server:
+    def __init__(self):
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                if not head:
+                    break
+
+                self.requests += 1
+                rep = b"HTTP/1.1 200 OK\r\ncontent-type: application/json\r\n"
+                rep += b"content-length: %d\r\n\r\n%s" % (len(BODY), BODY)
+                writer.write(rep)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_cert(tmp: str):
+    crt, key = os.path.join(tmp, "crt.pem"), os.path.join(tmp, "key.pem")
+    cmd = ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+    cmd += ["-keyout", key, "-out", crt, "-subj", "/CN=localhost"]
+    cmd += ["-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return crt, key
+
+
+async def run(name: str, total: int, concurrency: int, session, server: Server):
+    sem = asyncio.Semaphore(concurrency)
+    times: list[float] = []
+
+    async def one(i: int):
+        async with sem:
+            st = time.perf_counter()
+            await session(f"user{i % concurrency}")
+            times.append(time.perf_counter() - st)
+
+    server.connections, server.requests = 0, 0
+    st = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(total)])
+    el = time.perf_counter() - st
+
+    times.sort()
+    p50, p99 = times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+    print(
+        f"{name:>18}: {total / el:,.0f} req/s, p50 {p50:.2f} ms, p99 {p99:.2f} ms,"
+        f" connections: {server.connections}"
+    )
+
+
+async def main(total: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        crt, key = make_cert(tmp)
+        srv_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        srv_ctx.load_cert_chain(crt, key)
+        clt_ctx = ssl.create_default_context(cafile=crt)
+
+        server = Server()
+        srv = await asyncio.start_server(server.handle, "127.0.0.1", 0, ssl=srv_ctx)
+        port = srv.sockets[0].getsockname()[1]
+        url = f"https://127.0.0.1:{port}/i/api/graphql/UserByRestId"
+
+        async def new_client(username: str):
+            transport = httpx.AsyncHTTPTransport(retries=3, verify=clt_ctx)
+            async with httpx.AsyncClient(transport=transport) as clt:
+                (await clt.get(url)).raise_for_status()
+
+        class Pool(TransportPool):
+            def _make(self, proxy: str | None, http2: bool):
+                limits = httpx.Limits(keepalive_expiry=self.keepalive)
+                return httpx.AsyncHTTPTransport(
+                    retries=3, verify=clt_ctx, limits=limits, http2=http2
+                )
+
+        pool = Pool(keepalive=60, max_connections=10)
+
+        async def shared(username: str):
+            transport = await pool.acquire(username, None)
+            try:
+                clt = httpx.AsyncClient(transport=transport)
+                (await clt.get(url)).raise_for_status()
+            finally:
+                await pool.release(username, None, transport)
+
+        print(f"requests={total} concurrency={concurrency} (one request per session)")
+        await run("new client", total, concurrency, new_client, server)
+        await run("shared transport", total, concurrency, shared, server)
+
+        await pool.close()
+        srv.close()
+        await srv.wait_closed()
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:]]
+    total, concurrency = (args + [2000, 8][len(args) :])[:2]
+    asyncio.run(main(total, concurrency))
@@ -0,0 +1,51 @@
+"""
+Decode of tests/mocked-data/raw_search.json and encode of parsed tweets (`Tweet.json()` and
+`Tweet.json(compact=True)` output) with each installed JSON backend (see `TWS_JSON`).
+Usage: python bench/json_backend.py [rounds]
+"""
+
+import importlib.util
+import os
+import sys
+import time
+
+from twscrape import jsonlib
+from twscrape.models import parse_tweets
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data", "raw_search.json")
+DATA = os.path.abspath(DATA)
+
+
+def bench(fn, rounds: int):
+    st = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - st) * 1000 / rounds
+
+
+def main(rounds: int):
+    with open(DATA, "rb") as fp:
+        body = fp.read()
+
+    docs = [x.dict() for x in parse_tweets(jsonlib.get_backend("json")[0](body))]
+    print(f"page={len(body) / 1024:.0f}KB tweets={len(docs)} rounds={rounds}")
+
+    for name in jsonlib.BACKENDS:
+        if importlib.util.find_spec(name) is None:
+            print(f"{name:>8}: not installed")
+            continue
+
+        loads, dumps = jsonlib.get_backend(name)
+        dec = bench(lambda: loads(body), rounds)
+        enc = bench(lambda: [dumps(x, default=str) for x in docs], rounds)
+        enc_c = bench(
+            lambda: [dumps(x, default=str, compact=True, ascii=False) for x in docs], rounds
+        )
+        print(
+            f"{name:>8}: decode page {dec:.3f} ms, encode tweets {enc:.3f} ms"
+            f" (compact {enc_c:.3f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,46 @@
+"""
+Throughput of consumer which reads only `id`, `date`, `user.username` and `rawContent`
+of tweets: `parse_tweets` (full Tweet) vs `parse_tweets_lazy` (LazyTweet), over timeline pages
+from tests/mocked-data (each page decoded `copies` times, decode not measured).
+Usage: python bench/lazy_tweets.py [copies]
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any
+
+from twscrape.models import parse_tweets, parse_tweets_lazy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data")
+FILES = ["raw_search", "raw_user_tweets", "raw_list_timeline", "raw_tweet_details"]
+
+
+def consume(parse, docs: list[Any]):
+    res = []
+    for doc in docs:
+        for x in parse(doc):
+            res.append((x.id, x.date, x.user.username, x.rawContent))
+    return res
+
+
+def main(copies: int):
+    print(f"copies={copies}, consumer reads: id, date, user.username, rawContent")
+    for name in FILES:
+        with open(os.path.join(DATA_DIR, f"{name}.json")) as fp:
+            body = fp.read()
+        docs = [json.loads(body) for _ in range(copies)]
+
+        rep = {}
+        for kind, parse in [("full", parse_tweets), ("lazy", parse_tweets_lazy)]:
+            st = time.perf_counter()
+            rep[kind] = consume(parse, docs)
+            el = time.perf_counter() - st
+            print(f"{name:>18} {kind}: {len(rep[kind]) / el:,.0f} tweets/s")
+
+        assert rep["full"] == rep["lazy"]
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
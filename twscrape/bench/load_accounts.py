@@ -0,0 +1,42 @@
+"""
+Benchmark of accounts import from file.
+Usage: python bench/load_accounts.py [accounts] [--one-by-one]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from twscrape import AccountsPool
+from twscrape.logger import set_log_level
+
+
+async def main(accounts: int, one_by_one: bool):
+    set_log_level("ERROR")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "accounts.txt")
+        with open(path, "w") as fp:
+            for i in range(accounts):
+                fp.write(f"user{i}:pass{i}:user{i}@example.com:email_pass{i}\n")
+
+        pool = AccountsPool(os.path.join(tmp, "bench.db"))
+        await pool.get_all()  # create db
+
+        st = time.perf_counter()
+        if one_by_one:
+            for i in range(accounts):
+                await pool.add_account(f"user{i}", f"pass{i}", f"user{i}@example.com", "x")
+        else:
+            await pool.load_from_file(path, "username:password:email:email_password")
+        el = time.perf_counter() - st
+
+        mode = "one-by-one" if one_by_one else "bulk"
+        print(f"accounts={accounts} mode={mode}: {el:.2f}s ({accounts / el:,.0f} accounts/s)")
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:] if not x.startswith("--")]
+    asyncio.run(main(args[0] if args else 5000, "--one-by-one" in sys.argv))
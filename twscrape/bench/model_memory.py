@@ -0,0 +1,81 @@
+"""
+Memory per parsed Tweet (with embedded user, retweet, quote, media, etc) over
+tests/mocked-data/raw_search.json: slotted models vs same models as plain dataclasses
+(per-instance `__dict__`, as before). Measured with tracemalloc, decoded response excluded.
+Usage: python bench/model_memory.py [copies]
+"""
+
+import dataclasses
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from typing import Any
+
+from twscrape import models
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data", "raw_search.json")
+DATA = os.path.abspath(DATA)
+
+
+def plain_models():
+    # same fields & methods, but without slots
+    res = {}
+    for name, cls in vars(models).items():
+        if not (isinstance(cls, type) and issubclass(cls, models.JSONTrait)):
+            continue
+        if cls.__module__ != models.__name__ or cls is models.JSONTrait:
+            continue
+
+        attrs = []
+        for f in dataclasses.fields(cls):
+            kw = {"default": f.default, "default_factory": f.default_factory}
+            kw = {k: v for k, v in kw.items() if v is not dataclasses.MISSING}
+            attrs.append((f.name, f.type, dataclasses.field(**kw)))
+
+        ns: dict[str, Any] = {k: v for k, v in vars(cls).items() if isinstance(v, staticmethod)}
+        ns["dict"], ns["json"] = models.JSONTrait.dict, models.JSONTrait.json
+        res[name] = dataclasses.make_dataclass(name, attrs, namespace=ns)
+
+    return res
+
+
+def measure(docs: list[Any]):  # parsers accept decoded response too
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tweets = [x for doc in docs for x in models.parse_tweets(doc)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return tweets, used
+
+
+def main(copies: int):
+    # separate decoded copy per page, so parsed strings are not shared between pages
+    with open(DATA) as fp:
+        body = fp.read()
+    docs = [json.loads(body) for _ in range(copies)]
+
+    slotted = {k: getattr(models, k) for k in plain_models()}
+    tweets, used_slots = measure(docs)
+    count, sample = len(tweets), tweets[0].json()
+    del tweets
+
+    for k, v in plain_models().items():
+        setattr(models, k, v)
+    tweets, used_plain = measure(docs)
+    assert tweets[0].json() == sample and not hasattr(tweets[0], "__slots__")
+    del tweets
+
+    for k, v in slotted.items():
+        setattr(models, k, v)
+
+    print(f"tweets={count} (raw_search.json x {copies})")
+    print(f"  plain dataclasses: {used_plain / count:,.0f} bytes per tweet")
+    print(f"  slotted:           {used_slots / count:,.0f} bytes per tweet")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,109 @@
+"""
+Simulation of client-side pacing (simulated clock, no network): workers send requests (1s each)
+through pool of accounts with `limit` requests per 15-minute window. Without pacing account is
+used till `remaining=0` response, which is retried on other account (wasted); with pacing its
+requests are spread over window and account is switched when wait is too long.
+Usage: python bench/pacing_sim.py [accounts] [workers] [hours]
+"""
+
+import sys
+
+from twscrape.pacing import Pacer
+
+Q = "SearchTimeline"
+WINDOW = 15 * 60
+
+
+class Clock:
+    def __init__(self):
+        self.ts = 1_700_000_000.0
+
+    def __call__(self):
+        return self.ts
+
+
+def simulate(paced: bool, accounts: int, workers: int, hours: int, limit=50):
+    clock = Clock()
+    pacer = Pacer(burst=5, max_wait=10, clock=clock)  # waits done by simulation loop
+    api: dict[int, tuple[int, float]] = {}  # account -> (remaining, reset) on server side
+    locked: dict[int, float] = {}  # account -> until
+    busy_till = [0.0] * workers
+    acc_of: list[int | None] = [None] * workers
+    done, wasted, max_burst = 0, 0, 0
+    sent: dict[int, list[float]] = {x: [] for x in range(accounts)}
+
+    end = clock.ts + hours * 3600
+    while clock.ts < end:
+        for w in range(workers):
+            if busy_till[w] > clock.ts:
+                continue
+
+            if acc_of[w] is None:
+                used = set(x for x in acc_of if x is not None)
+                free = [
+                    x for x in range(accounts) if locked.get(x, 0) <= clock.ts and x not in used
+                ]
+                if not free:
+                    continue
+                acc_of[w] = free[0]
+
+            acc = acc_of[w]
+            assert acc is not None
+            if paced:
+                bucket = pacer._bucket(str(acc), Q)
+                wait = bucket.reserve(clock.ts)
+                if wait > pacer.max_wait:
+                    bucket.cancel()
+                    locked[acc], acc_of[w] = clock.ts + wait, None
+                    continue
+                clock_ts = clock.ts + wait  # token reserved, worker holds account till then
+            else:
+                clock_ts = clock.ts
+
+            remaining, reset = api.get(acc, (limit, 0.0))
+            if reset <= clock_ts:
+                remaining, reset = limit, clock_ts + WINDOW
+            remaining -= 1
+            api[acc] = (remaining, reset)
+            sent[acc].append(clock_ts)
+            busy_till[w] = clock_ts + 1
+
+            if remaining == 0:  # rate limited: account locked, request retried elsewhere
+                wasted += 1
+                locked[acc], acc_of[w] = reset, None
+                continue
+
+            done += 1
+            if paced:
+                pacer._bucket(str(acc), Q).update(remaining, reset, clock_ts)
+
+        clock.ts += 1
+
+    for ts in sent.values():
+        for i in range(len(ts)):
+            j = i
+            while j < len(ts) and ts[j] - ts[i] < 60:
+                j += 1
+            max_burst = max(max_burst, j - i)
+
+    windows = hours * 3600 / WINDOW
+    return {
+        "req/window": done / windows,
+        "wasted/window": wasted / windows,
+        "max req/min per account": max_burst,
+    }
+
+
+def main(accounts: int, workers: int, hours: int):
+    print(f"accounts={accounts} workers={workers} hours={hours} limit=50/15min")
+    for name, paced in [("no pacing", False), ("pacing", True)]:
+        rep = simulate(paced, accounts, workers, hours)
+        msg = ", ".join(
+            [f"{k}: {v:,.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in rep.items()]
+        )
+        print(f"{name:>10}: {msg}")
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:]]
+    main(*(args + [20, 4, 4][len(args) :])[:3])
@@ -0,0 +1,44 @@
+"""
+`created_at` parsing: email.utils.parsedate_to_datetime vs utils.parse_date (without cache hits)
+and vs utils.snowflake_ts (from tweet id), over values from tests/mocked-data.
+Usage: python bench/parse_date.py [rounds]
+"""
+
+import email.utils
+import os
+import re
+import sys
+import time
+
+from twscrape.utils import parse_date, snowflake_ts
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data")
+
+
+def timeit(name: str, fn, vals: list, rounds: int):
+    st = time.perf_counter()
+    for _ in range(rounds):
+        for x in vals:
+            fn(x)
+    el = time.perf_counter() - st
+    print(f"{name:>22}: {el * 1e6 / (rounds * len(vals)):.2f} us per value")
+
+
+def main(rounds: int):
+    dates, ids = set(), set()
+    for filename in os.listdir(DATA_DIR):
+        with open(os.path.join(DATA_DIR, filename)) as fp:
+            text = fp.read()
+        dates.update(re.findall(r'"created_at":\s*"([^"]+)"', text))
+        ids.update(int(x) for x in re.findall(r'"id_str":\s*"(\d+)"', text))
+
+    dates, ids = sorted(dates), [x for x in sorted(ids) if snowflake_ts(x)]
+    print(f"created_at values={len(dates)} snowflake ids={len(ids)} rounds={rounds}")
+    timeit("parsedate_to_datetime", email.utils.parsedate_to_datetime, dates, rounds)
+    timeit("parse_date (no cache)", parse_date.__wrapped__, dates, rounds)
+    timeit("parse_date (cached)", parse_date, dates, rounds)
+    timeit("snowflake_ts", snowflake_ts, ids, rounds)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
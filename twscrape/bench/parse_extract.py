@@ -0,0 +1,68 @@
+"""
+Extraction of tweets / users / trends from responses (`to_old_rep`) over all files in
+tests/mocked-data: generic recursive walker vs targeted timeline walker. Asserts same output
+(same maps in same order and same parsed models) before timing.
+Usage: python bench/parse_extract.py [rounds]
+"""
+
+import functools
+import glob
+import json
+import os
+import sys
+import time
+from typing import Any
+
+from twscrape import models
+from twscrape.utils import to_old_rep
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data")
+
+
+def parse_all(doc: Any):  # parsers accept decoded response too
+    return [
+        [x.json() for x in models.parse_tweets(doc)],
+        [x.json() for x in models.parse_users(doc)],
+        [x.json() for x in models.parse_trends(doc)],
+    ]
+
+
+def timeit(fn, docs: list[dict], rounds: int):
+    st = time.perf_counter()
+    for _ in range(rounds):
+        for x in docs:
+            fn(x)
+    return (time.perf_counter() - st) * 1000 / rounds
+
+
+def main(rounds: int):
+    models.logger.remove()  # some mocked responses are partial and logs parse errors
+    files = sorted(glob.glob(os.path.join(DATA_DIR, "*.json")))
+    docs = []
+    for file in files:
+        with open(file) as fp:
+            docs.append(json.load(fp))
+
+    generic = functools.partial(to_old_rep, generic=True)
+    for file, doc in zip(files, docs):
+        old, new = generic(doc), to_old_rep(doc)
+        assert old == new, file
+        assert all(list(old[k]) == list(new[k]) for k in old), file
+
+        models.to_old_rep = generic
+        old = parse_all(doc)
+        models.to_old_rep = to_old_rep
+        assert old == parse_all(doc), file
+
+    print(f"files={len(docs)} rounds={rounds}, output identical")
+    for name, fn in [("generic", generic), ("targeted", to_old_rep)]:
+        ext = timeit(fn, docs, rounds)
+        models.to_old_rep = fn
+        full = timeit(parse_all, docs, rounds)
+        print(f"{name:>9}: to_old_rep {ext:.2f} ms, full parse (with .json()) {full:.2f} ms")
+
+    models.to_old_rep = to_old_rep
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,48 @@
+"""
+Benchmark of paginated iteration with read-ahead: simulated page request latency and consumer
+work per page, either async (eg. DB writes) or CPU-bound (eg. parsing, blocks event loop).
+Usage: python bench/prefetch.py [pages] [latency_ms] [work_ms]
+"""
+
+import asyncio
+import sys
+import time
+from contextlib import aclosing
+
+from twscrape.utils import read_ahead
+
+
+async def pages(count: int, latency: float):
+    for i in range(count):
+        await asyncio.sleep(latency)  # request in flight, event loop free
+        yield i
+
+
+async def run(count: int, latency: float, work: float, depth: int, cpu: bool):
+    gen = pages(count, latency)
+    if depth > 0:
+        gen = read_ahead(gen, depth)
+
+    st = time.perf_counter()
+    async with aclosing(gen) as gen:
+        async for _ in gen:
+            if cpu:
+                time.sleep(work)
+            else:
+                await asyncio.sleep(work)
+    return time.perf_counter() - st
+
+
+async def main(count: int, latency_ms: float, work_ms: float):
+    print(f"pages={count} latency={latency_ms}ms work={work_ms}ms")
+    for cpu in [False, True]:
+        for depth in [0, 1, 2]:
+            el = await run(count, latency_ms / 1000, work_ms / 1000, depth, cpu)
+            name = f"{'cpu' if cpu else 'async'} work, prefetch={depth}"
+            print(f"{name:>24}: {el:.2f}s, {count / el:.1f} pages/s")
+
+
+if __name__ == "__main__":
+    args = [float(x) for x in sys.argv[1:]]
+    count, latency, work = (args + [50, 100, 100][len(args) :])[:3]
+    asyncio.run(main(int(count), latency, work))
@@ -0,0 +1,115 @@
+"""
+Simulation of account selection policies under X API rate limits (simulated clock, no network).
+Each account has `limit` requests per 15-minute window, started by first request after reset.
+Workers run jobs of random number of pages (1 request per second), idle between jobs.
+Response with `remaining=0` is handled as in QueueClient: account locked till reset and
+request retried on another account (so it is wasted).
+
+Usage: python bench/rate_limit_sim.py [accounts] [workers] [idle_sec] [hours]
+"""
+
+import random
+import sys
+
+from twscrape.account import Account
+from twscrape.scheduler import AccountScheduler
+
+Q = "SearchTimeline"
+WINDOW = 15 * 60
+
+
+class Clock:
+    def __init__(self):
+        self.ts = 1_700_000_000
+
+    def __call__(self):
+        return self.ts
+
+
+def make_account(username: str):
+    return Account(
+        username=username,
+        password="",
+        email="",
+        email_password="",
+        user_agent="",
+        active=True,
+        locks={},
+        stats={},
+        headers={},
+        cookies={},
+    )
+
+
+def simulate(prefer_budget: bool, accounts: int, workers: int, idle: int, hours: int, limit=50):
+    rnd = random.Random(42)
+    clock = Clock()
+    accs = [make_account(f"user{i:03d}") for i in range(accounts)]
+    sched = AccountScheduler(accs, prefer_budget=prefer_budget, clock=clock)
+
+    api: dict[str, tuple[int, int]] = {}  # username -> (remaining, reset) on server side
+    jobs = [{"acc": None, "pages": 0, "idle_till": 0} for _ in range(workers)]
+    done, wasted, switches, waits = 0, 0, 0, 0
+
+    end = clock.ts + hours * 3600
+    while clock.ts < end:
+        for job in jobs:
+            if job["pages"] == 0:
+                if job["idle_till"] > clock.ts:
+                    continue
+                job["pages"] = rnd.randint(1, 40)
+
+            if job["acc"] is None:
+                job["acc"] = sched.acquire(Q)
+                if job["acc"] is None:
+                    waits += 1
+                    continue
+
+            username = job["acc"].username
+            remaining, reset = api.get(username, (limit, 0))
+            if reset <= clock.ts:
+                remaining, reset = limit, clock.ts + WINDOW
+
+            remaining -= 1
+            api[username] = (remaining, reset)
+
+            if remaining == 0:  # rate limited: switch account and retry page
+                sched.set_lock(username, Q, reset, 0, remaining, reset)
+                job["acc"] = None
+                wasted += 1
+                switches += 1
+                continue
+
+            done += 1
+            job["pages"] -= 1
+            if job["pages"] == 0:
+                sched.set_lock(username, Q, 0, 1, remaining, reset)
+                job["acc"] = None
+                job["idle_till"] = clock.ts + rnd.randint(0, idle)
+
+        clock.ts += 1
+
+    windows = hours * 3600 / WINDOW
+    used = [sum(x.stats.values()) for x in accs]
+    return {
+        "req/window": done / windows,
+        "wasted/window": wasted / windows,
+        "switches/window": switches / windows,
+        "worker waits (s)": waits,
+        "jobs per acc max/min": f"{max(used)}/{min(used)}",
+    }
+
+
+def main(accounts: int, workers: int, idle: int, hours: int):
+    print(f"accounts={accounts} workers={workers} idle<={idle}s hours={hours} limit=50/15min")
+    for name, prefer_budget in [("order by username", False), ("budget aware", True)]:
+        rep = simulate(prefer_budget, accounts, workers, idle, hours)
+        msg = ", ".join(
+            [f"{k}: {v:,.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in rep.items()]
+        )
+        print(f"{name:>18}: {msg}")
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:]]
+    main(*(args + [50, 4, 60, 4][len(args) :])[:4])
@@ -0,0 +1,58 @@
+"""
+Parse time, distinct User objects and memory per tweet for timeline pages from
+tests/mocked-data (each page decoded `copies` times), with and without users LRU
+between responses (`TWS_USER_CACHE`).
+Usage: python bench/user_interning.py [copies]
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any
+
+from twscrape import models
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data")
+FILES = ["raw_user_tweets", "raw_list_timeline", "raw_search"]
+
+
+def parse(docs: list[Any]):  # parsers accept decoded response too
+    return [x for doc in docs for x in models.parse_tweets(doc)]
+
+
+def main(copies: int):
+    for name in FILES:
+        with open(os.path.join(DATA_DIR, f"{name}.json")) as fp:
+            body = fp.read()
+        docs = [json.loads(body) for _ in range(copies)]
+
+        for lru in [0, 10_000]:
+            models.USER_CACHE_SIZE, models._users_lru = lru, OrderedDict()
+            st = time.perf_counter()
+            parse(docs)
+            el = time.perf_counter() - st
+
+            models._users_lru = OrderedDict()
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            tweets = parse(docs)
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+            users = len({id(x.user) for x in tweets})
+            print(
+                f"{name:>18} lru={lru:<6}: {el * 1000 / copies:.2f} ms per page,"
+                f" {len(tweets)} tweets, {users} User objects, {used / len(tweets):,.0f} B per tweet"
+            )
+            del tweets
+
+    models.USER_CACHE_SIZE, models._users_lru = 0, OrderedDict()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,66 @@
+"""
+Benchmark of XClientTxId keys extraction from x.com page: full BeautifulSoup parse and
+re-serialization (old `load_keys`) vs regexes on raw text. Saved page fixture is padded with
+inline scripts & markup to size of real page.
+Usage: python bench/xclid_parse.py [page_kb]
+"""
+
+import os
+import sys
+import time
+
+import bs4
+
+from twscrape.xclid import get_scripts_list, parse_anim_paths, parse_page, parse_vk_bytes
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "mocked-data", "xclid_page.html")
+
+
+def make_page(size: int):
+    with open(FIXTURE) as fp:
+        text = fp.read()
+
+    # real page: mostly inline state & scripts, plus some markup
+    pad, i = [], 0
+    while len(text) + sum(len(x) for x in pad) < size:
+        pad.append(
+            f'<div class="css-{i:x}" data-testid="cell-{i}"><span dir="ltr">item {i}</span>'
+        )
+        pad.append(f"</div><script>window.__META_{i}__={{'k':'{'x' * 400}'}};</script>")
+        i += 1
+
+    return text.replace("</body>", "".join(pad) + "</body>")
+
+
+def old_keys(text: str):
+    soup = bs4.BeautifulSoup(text, "html.parser")
+    list(get_scripts_list(str(soup)))
+    return parse_vk_bytes(soup), parse_anim_paths(soup)
+
+
+def new_keys(text: str):
+    list(get_scripts_list(text))
+    return parse_page(text)
+
+
+def bench(fn, text: str, rounds: int):
+    best = float("inf")
+    for _ in range(5):
+        st = time.perf_counter()
+        for _ in range(rounds):
+            fn(text)
+        best = min(best, (time.perf_counter() - st) / rounds)
+    return best * 1000
+
+
+def main(page_kb: int):
+    text = make_page(page_kb * 1024)
+    assert old_keys(text) == new_keys(text)
+
+    print(f"page={len(text) / 1024:.0f}KB")
+    print(f"{'bs4 + str(soup)':>16}: {bench(old_keys, text, 3):8.2f} ms")
+    print(f"{'regex':>16}: {bench(new_keys, text, 50):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 250)
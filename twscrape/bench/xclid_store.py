@@ -0,0 +1,62 @@
+"""
+Benchmark of XClIdGen creation on start of many accounts (page & script downloads simulated
+with fixed latency): generator per account (old behavior) vs shared single-flight store.
+Usage: python bench/xclid_store.py [accounts] [latency_ms]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import twscrape.queue_client as queue_client_mod
+from twscrape.queue_client import XClIdGenStore
+from twscrape.xclid import XClIdGen
+
+
+class PerAccountStore:  # old XClIdGenStore
+    items: dict[str, XClIdGen] = {}
+
+    @classmethod
+    async def get(cls, username: str, fresh=False) -> XClIdGen:
+        if username in cls.items and not fresh:
+            return cls.items[username]
+
+        cls.items[username] = await XClIdGen.create()
+        return cls.items[username]
+
+
+async def run(name: str, store, accounts: int, calls: list):
+    calls.clear()
+    st = time.perf_counter()
+    # each account makes two concurrent first requests
+    await asyncio.gather(*[store.get(f"user{i % accounts}") for i in range(accounts * 2)])
+    el = time.perf_counter() - st
+    print(f"{name:>18}: {el * 1000:7.1f} ms, page downloads: {len(calls)}")
+
+
+async def main(accounts: int, latency: float):
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(latency)  # x.com page + ondemand.s.js script
+        return XClIdGen(list(range(48)), "key")
+
+    setattr(XClIdGen, "create", create)
+    with tempfile.TemporaryDirectory() as tmp:
+        setattr(queue_client_mod, "XCLID_CACHE", os.path.join(tmp, "xclid.json"))
+
+        print(f"accounts={accounts} latency={latency * 1000:.0f}ms")
+        await run("per account", PerAccountStore, accounts, calls)
+        await run("shared, cold", XClIdGenStore, accounts, calls)
+
+        XClIdGenStore.gen = None  # new process: keys loaded from disk
+        await run("shared, warm start", XClIdGenStore, accounts, calls)
+
+
+if __name__ == "__main__":
+    args = [int(x) for x in sys.argv[1:]]
+    accounts, latency = (args + [500, 800][len(args) :])[:2]
+    asyncio.run(main(accounts, latency / 1000))
@@ -0,0 +1,76 @@
+import asyncio
+
+from twscrape.pacing import Pacer
+
+Q = "SearchTimeline"
+
+
+class SimClock:
+    def __init__(self):
+        self.ts = 1_700_000_000.0
+        self.sleeps: list[float] = []
+
+    def __call__(self):
+        return self.ts
+
+    async def sleep(self, sec: float):
+        self.sleeps.append(sec)
+        self.ts += sec
+
+
+class SimServer:
+    # rate limit window started by first request, as on X side
+    def __init__(self, clock: SimClock, limit: int, window=900):
+        self.clock, self.limit, self.window = clock, limit, window
+        self.remaining, self.reset = limit, 0.0
+
+    def request(self):
+        if self.clock.ts >= self.reset:
+            self.remaining, self.reset = self.limit, self.clock.ts + self.window
+        self.remaining -= 1
+        return self.remaining, self.reset
+
+
+async def test_pacing_window():
+    clock = SimClock()
+    pacer = Pacer(burst=5, max_wait=60, clock=clock, sleep=clock.sleep)
+    server = SimServer(clock, limit=50)
+
+    sent: list[float] = []
+    end = clock.ts + 3 * 900
+    while clock.ts < end:
+        assert await pacer.wait("user1", Q) == 0
+        sent.append(clock.ts)
+        remaining, reset = server.request()
+        assert remaining > 0  # not rate limited before reset
+        pacer.update("user1", Q, remaining, reset)
+        clock.ts += 0.5  # request time
+
+    # budget used over whole window, not in first seconds
+    assert 3 * 45 <= len(sent) <= 3 * 50 + 3
+    assert len([x for x in sent if x < sent[0] + 60]) <= 5 + 4
+    assert max(clock.sleeps) < 60
+
+
+async def test_pacing_shared_budget():
+    clock = SimClock()
+    pacer = Pacer(burst=2, max_wait=300, clock=clock, sleep=clock.sleep)
+
+    # no rate limit info: not paced
+    assert await pacer.wait("user1", Q) == 0 and clock.sleeps == []
+
+    # concurrent callers take tokens in turn (sleep not advances clock here)
+    pacer.update("user1", Q, remaining=91, reset=clock.ts + 900)  # 1 token per 10s
+    pacer._sleep = lambda sec: clock.sleeps.append(sec) or asyncio.sleep(0)
+    await asyncio.gather(*[pacer.wait("user1", Q) for _ in range(5)])
+    assert sorted(clock.sleeps) == [10, 20, 30, 40]
+
+    # long wait: token not taken, caller should use other account
+    pacer.max_wait = 5
+    assert await pacer.wait("user1", Q) == 50
+    assert await pacer.wait("user1", Q) == 50
+    assert await pacer.wait("user2", Q) == 0
+
+    # after window reset no pacing till next response
+    clock.ts += 900
+    assert await pacer.wait("user1", Q) == 0
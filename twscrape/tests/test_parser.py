@@ -1,8 +1,9 @@
 import json
 import os
+from collections import OrderedDict, defaultdict
 from typing import Callable
 
-from twscrape import API, gather
+from twscrape import API, gather, models
 from twscrape.models import (
     AudiospaceCard,
     BroadcastCard,
@@ -13,7 +14,10 @@ from twscrape.models import (
     User,
     UserRef,
     parse_tweet,
+    parse_tweets,
+    parse_tweets_lazy,
 )
+from twscrape.utils import get_typed_object, to_old_rep
 
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, "mocked-data")
@@ -488,3 +492,91 @@ async def test_cards():
     assert doc.card._type == "audiospace"
     assert isinstance(doc.card, AudiospaceCard)
     assert doc.card.url is not None
+
+
+def test_timeline_extractor():
+    # targeted walker gives same objects in same order as generic one
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if not filename.endswith(".json"):
+            continue
+
+        raw = fake_rep(filename).json()
+        old, new = to_old_rep(raw, generic=True), to_old_rep(raw)
+        assert old == new, filename
+        for key in ["tweets", "users", "trends"]:
+            assert list(old[key]) == list(new[key]), filename
+
+
+def test_timeline_extractor_unknown_wrapper():
+    # tweet under unknown key of result is still found
+    def wrap(obj):
+        if isinstance(obj, dict):
+            if "result" in obj.get("tweet_results", {}):
+                obj["tweet_results"] = {"unknown_wrapper": obj["tweet_results"]}
+            for v in obj.values():
+                wrap(v)
+        elif isinstance(obj, list):
+            for v in obj:
+                wrap(v)
+
+    raw = fake_rep("raw_user_tweets").json()
+    wrap(raw)
+    old, new = to_old_rep(fake_rep("raw_user_tweets").json()), to_old_rep(raw)
+    assert len(old["tweets"]) > 0
+    assert list(old["tweets"]) == list(new["tweets"])
+    assert list(old["users"]) == list(new["users"])
+
+
+def test_users_shared(monkeypatch):
+    raw = fake_rep("raw_user_tweets").json()
+    tweets = list(parse_tweets(raw))
+    users = {x.user.id: x.user for x in tweets}
+    assert len(users) < len(tweets)
+    for x in tweets:
+        assert x.user is users[x.user.id]
+
+    # not shared between responses by default
+    assert list(parse_tweets(raw))[0].user is not tweets[0].user
+
+    monkeypatch.setattr(models, "USER_CACHE_SIZE", 100)
+    monkeypatch.setattr(models, "_users_lru", OrderedDict())
+    user = list(parse_tweets(raw))[0].user
+    assert list(parse_tweets(fake_rep("raw_user_tweets").json()))[0].user is user
+    assert len(models._users_lru) == len(users)
+
+    # changed user is parsed again
+    raw = fake_rep("raw_user_tweets").json()
+    for x in get_typed_object(raw, defaultdict(list))["User"]:
+        if x.get("rest_id") == str(user.id):
+            x["legacy"]["followers_count"] = user.followersCount + 1
+    monkeypatch.setattr(models, "USER_CACHE_SIZE", 2)
+    tweet = list(parse_tweets(raw))[0]
+    assert tweet.user is not user and tweet.user.followersCount == user.followersCount + 1
+    assert len(models._users_lru) == 2
+
+
+def test_lazy_tweets():
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if not filename.endswith(".json"):
+            continue
+
+        raw = fake_rep(filename).json()
+        tweets, lazy = list(parse_tweets(raw)), list(parse_tweets_lazy(raw))
+        assert [x.id for x in tweets] == [x.id for x in lazy], filename
+
+        for doc, lz in zip(tweets, lazy):
+            assert lz.rawContent == doc.rawContent
+            assert lz.to_tweet() == doc
+            # all fields (incl. nested tweets) same as in full parse
+            for k in doc.__dataclass_fields__:
+                if k in ["_type", "retweetedTweet", "quotedTweet"]:
+                    continue
+                assert getattr(lz, k) == getattr(doc, k), f"{filename} {k}"
+
+            for k in ["retweetedTweet", "quotedTweet"]:
+                nested = getattr(lz, k)
+                assert (nested.to_tweet() if nested else None) == getattr(doc, k)
+
+            # fields already parsed are reused, not computed again
+            full = lz.to_tweet()
+            assert full == doc and full.media is lz.media and full.links is lz.links
@@ -1,4 +1,16 @@
-from twscrape.accounts_pool import AccountsPool
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from twscrape.account import Account
+from twscrape.accounts_pool import AccountsPool, _safari_agents
+from twscrape.db import close_pools, fetchall, get_pool
+from twscrape.login import LoginConfig
 from twscrape.utils import utc
 
 
@@ -36,6 +48,62 @@ async def test_add_accounts(pool_mock: AccountsPool):
     assert acc.email_password == "email_pass2"
 
 
+async def test_load_from_file(pool_mock: AccountsPool, tmp_path):
+    await pool_mock.add_account("user1", "pass1", "email1", "email_pass1")
+    await pool_mock.unlock("user1", "test_queue")  # known queue
+
+    lines = [f"user{x}:pass{x}:email{x}:email_pass{x}:" for x in range(1, 6)]
+    lines += ["USER2:pass:email:email_pass:", "user6:pass6:email6:email_pass6:ct0=abc"]
+    path = tmp_path / "accounts.txt"
+    path.write_text("\n".join(lines) + "\n\n")
+
+    rep = await pool_mock.load_from_file(
+        str(path), "username:password:email:email_password:cookies"
+    )
+    assert rep == {"total": 7, "inserted": 5, "skipped": 2}
+
+    accs = await pool_mock.get_all()
+    assert len(accs) == 6
+    assert all(x.user_agent for x in accs)
+    assert (await pool_mock.get("user2")).password == "pass2"
+    assert (await pool_mock.get("user6")).active is True
+
+    # new active account is available in already known queue
+    acc = await pool_mock.get_for_queue("test_queue")
+    assert acc is not None and acc.username == "user6"
+
+    # invalid file is rejected before anything is written
+    path.write_text("user7:pass7:email7:email_pass7:_\nuser8:pass8")
+    with pytest.raises(ValueError, match="Invalid line"):
+        await pool_mock.load_from_file(str(path), "username:password:email:email_password:_")
+    assert len(await pool_mock.get_all()) == 6
+
+
+async def test_login_all_concurrency(tmp_path):
+    cfg = LoginConfig(concurrency=4, per_proxy=2)
+    pool = AccountsPool(str(tmp_path / "login.db"), login_config=cfg)
+    for x in range(12):
+        proxy = f"http://proxy{x % 2}:8080" if x < 8 else None
+        await pool.add_account(f"user{x}", f"pass{x}", f"email{x}", f"email_pass{x}", proxy=proxy)
+
+    running: dict[str | None, int] = {}
+    peak = {"total": 0, "proxy": 0}
+
+    async def fake_login(acc: Account):
+        proxy = acc.get_proxy()
+        running[proxy] = running.get(proxy, 0) + 1
+        peak["total"] = max(peak["total"], sum(running.values()))
+        peak["proxy"] = max(peak["proxy"], running[proxy])
+        await asyncio.sleep(0.05)
+        running[proxy] -= 1
+        return acc.username != "user3"
+
+    pool.login = fake_login  # type: ignore
+    rep = await pool.login_all()
+    assert rep == {"total": 12, "success": 11, "failed": 1}
+    assert peak == {"total": 4, "proxy": 2}
+
+
 async def test_get_all(pool_mock: AccountsPool):
     # should return empty list
     accs = await pool_mock.get_all()
@@ -136,3 +204,299 @@ async def test_get_stats(pool_mock: AccountsPool):
     assert stats["total"] == 1
     assert stats["active"] == 1
     assert stats[f"locked_{Q}"] == 1
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+async def test_budget_aware_selection(tmp_path, in_memory: bool):
+    Q = "test_queue"
+    pool = AccountsPool(str(tmp_path / "budget.db"), in_memory=in_memory)
+    for x in range(1, 5):
+        await pool.add_account(f"user{x}", f"pass{x}", f"email{x}", f"email_pass{x}")
+        await pool.set_active(f"user{x}", True)
+
+    reset = utc.ts() + 600
+    await pool.unlock("user1", Q, limit_remaining=5, limit_reset=reset)
+    await pool.unlock("user2", Q, limit_remaining=40, limit_reset=reset)
+    await pool.unlock("user3", Q, limit_remaining=40, limit_reset=reset - 300)
+    await pool.unlock("user4", Q, limit_remaining=1, limit_reset=utc.ts() - 10)  # already reset
+
+    # full budget first, then most requests left (soonest reset on tie)
+    order = [(await pool.get_for_queue(Q)) for _ in range(5)]
+    assert [x.username if x else None for x in order] == ["user4", "user3", "user2", "user1", None]
+
+    # unlock without rate limit info keeps last seen budget
+    await pool.unlock("user1", Q)
+    await pool.unlock("user2", Q)
+    acc = await pool.get_for_queue(Q)
+    assert acc is not None and acc.username == "user2"
+    await pool.close()
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+async def test_budget_after_reset(tmp_path, in_memory: bool):
+    Q = "test_queue"
+    pool = AccountsPool(str(tmp_path / "budget.db"), in_memory=in_memory)
+    for x in range(1, 4):
+        await pool.add_account(f"user{x}", f"pass{x}", f"email{x}", f"email_pass{x}")
+        await pool.set_active(f"user{x}", True)
+
+    # user1 rate limited till reset, then has full budget again (lock also expired)
+    now = utc.ts()
+    await pool.lock_until("user1", Q, now + 1, limit_remaining=0, limit_reset=now + 1)
+    await pool.unlock("user2", Q, limit_remaining=2, limit_reset=now + 600)
+    await pool.unlock("user3", Q, limit_remaining=1)  # no reset known, so full budget
+    await asyncio.sleep(2.1)
+
+    order = [(await pool.get_for_queue(Q)) for _ in range(4)]
+    assert [x.username if x else None for x in order] == ["user1", "user3", "user2", None]
+    await pool.close()
+
+
+@pytest.mark.parametrize("prefer_budget", [False, True])
+async def test_free_account_query_plan(pool_mock: AccountsPool, prefer_budget: bool):
+    await pool_mock.add_account("user1", "pass1", "email1", "email_pass1")
+    await pool_mock._seed_queue("test_queue")
+    pool_mock._prefer_budget = prefer_budget
+
+    qs = f"EXPLAIN QUERY PLAN {pool_mock._free_account_qs()}"
+    rs = await fetchall(pool_mock._db_file, qs, {"queue": "test_queue"})
+    plan = [x[3] for x in rs]
+    assert any("USING COVERING INDEX account_queue_state_" in x for x in plan), plan
+    assert not any("TEMP B-TREE" in x for x in plan), plan
+
+
+async def test_wait_for_account(pool_mock: AccountsPool):
+    Q = "test_queue"
+    await pool_mock.add_account("user1", "pass1", "email1", "email_pass1")
+    await pool_mock.set_active("user1", True)
+    acc = await pool_mock.get_for_queue(Q)
+    assert acc is not None
+
+    # waiters are woken up by in-process unlock, not by polling
+    tasks = [asyncio.create_task(pool_mock.get_for_queue_or_wait(Q)) for _ in range(2)]
+    await asyncio.sleep(0.2)
+    assert not any(x.done() for x in tasks)
+
+    st = asyncio.get_running_loop().time()
+    await pool_mock.unlock("user1", Q)
+    done, pending = await asyncio.wait(tasks, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+    assert len(done) == 1 and len(pending) == 1
+    assert asyncio.get_running_loop().time() - st < 0.5
+
+    # second waiter wakes up when lock expires (lock_until also recalculates wait time)
+    await pool_mock.lock_until("user1", Q, utc.ts() + 1)
+    done, _ = await asyncio.wait(pending, timeout=3.5)
+    assert len(done) == 1
+    acc = done.pop().result()
+    assert acc is not None and acc.username == "user1"
+    assert not pool_mock._waiters[Q]
+
+
+async def test_db_connection_reused(pool_mock: AccountsPool):
+    await pool_mock.add_account("user1", "pass1", "email1", "email_pass1")
+    await pool_mock.set_active("user1", True)
+
+    for _ in range(5):
+        acc = await pool_mock.get_for_queue("test_queue")
+        assert acc is not None
+        await pool_mock.unlock(acc.username, "test_queue")
+
+    # all queries should go through same long-lived connection
+    state = get_pool(pool_mock._db_file)._state()
+    assert state is not None and len(state.conns) == 1
+
+
+def test_db_pool_loop_per_thread(tmp_path):
+    # threaded web app: new event loop per request, several requests at once
+    pool = AccountsPool(tmp_path / "test.db")
+
+    async def request(x: int):
+        await pool.add_account(f"user{x}", f"pass{x}", f"email{x}", f"email_pass{x}")
+        for _ in range(20):
+            await pool.get_all()
+            await asyncio.sleep(0.001)
+
+    with ThreadPoolExecutor(4) as ex:
+        list(ex.map(lambda x: asyncio.run(request(x)), range(8)))
+
+    assert len(asyncio.run(pool.get_all())) == 8
+    assert len(get_pool(str(tmp_path / "test.db"))._loops) == 1  # closed loops dropped
+
+
+async def test_migrate_queue_state(tmp_path):
+    db_path = str(tmp_path / "v4.db")
+    with sqlite3.connect(db_path) as db:
+        db.execute("""
+        CREATE TABLE accounts (
+            username TEXT PRIMARY KEY NOT NULL COLLATE NOCASE,
+            password TEXT NOT NULL,
+            email TEXT NOT NULL COLLATE NOCASE,
+            email_password TEXT NOT NULL,
+            user_agent TEXT NOT NULL,
+            active BOOLEAN DEFAULT FALSE NOT NULL,
+            locks TEXT DEFAULT '{}' NOT NULL,
+            headers TEXT DEFAULT '{}' NOT NULL,
+            cookies TEXT DEFAULT '{}' NOT NULL,
+            proxy TEXT DEFAULT NULL,
+            error_msg TEXT DEFAULT NULL,
+            stats TEXT DEFAULT '{}' NOT NULL,
+            last_used TEXT DEFAULT NULL,
+            _tx TEXT DEFAULT NULL,
+            mfa_code TEXT DEFAULT NULL
+        )""")
+        db.execute("""
+        INSERT INTO accounts (username, password, email, email_password, user_agent, active, locks, stats)
+        VALUES ('user1', 'p', 'e', 'ep', 'ua', true,
+            '{"SearchTimeline": "2099-01-01T00:00:00+00:00", "UserTweets": "2000-01-01 00:00:00"}',
+            '{"SearchTimeline": 10, "Followers": 5}')
+        """)
+        db.execute("PRAGMA user_version = 4")
+
+    pool = AccountsPool(db_path)
+    acc = await pool.get("user1")
+    assert acc.stats == {"SearchTimeline": 10, "Followers": 5}
+    assert set(acc.locks.keys()) == {"SearchTimeline", "UserTweets"}
+    assert acc.locks["SearchTimeline"].year == 2099
+
+    # still locked in SearchTimeline, lock expired in UserTweets
+    assert await pool.get_for_queue("SearchTimeline") is None
+    acc = await pool.get_for_queue("UserTweets")
+    assert acc is not None
+    assert acc.stats["SearchTimeline"] == 10
+
+
+async def test_in_memory_mode(tmp_path):
+    Q = "test_queue"
+    db_path = str(tmp_path / "mem.db")
+    db_pool = AccountsPool(db_path)  # to check what is persisted
+    pool = AccountsPool(db_path, in_memory=True, flush_interval=3600)
+
+    for x in range(1, 4):
+        await pool.add_account(f"user{x}", f"pass{x}", f"email{x}", f"email_pass{x}")
+    await pool.set_active("user1", True)
+    await pool.set_active("user2", True)
+
+    # should return accounts in order and lock them
+    acc1 = await pool.get_for_queue(Q)
+    acc2 = await pool.get_for_queue(Q)
+    assert acc1 is not None and acc1.username == "user1"
+    assert acc2 is not None and acc2.username == "user2"
+    assert await pool.get_for_queue(Q) is None
+    assert await pool.next_available_at(Q) is not None
+
+    # state written to db only on flush
+    assert len((await db_pool.get("user1")).locks) == 0
+
+    # unlocked account available again, request counters are kept
+    await pool.unlock("user1", Q, req_count=5)
+    acc = await pool.get_for_queue(Q)
+    assert acc is not None and acc.username == "user1"
+
+    # lock with future reset time and inactive account are skipped
+    end_time = utc.ts() + 60
+    await pool.lock_until("user1", Q, end_time, req_count=2)
+    await pool.mark_inactive("user2", "banned")
+    await pool.set_active("user3", True)
+    acc = await pool.get_for_queue(Q)
+    assert acc is not None and acc.username == "user3"
+
+    await pool.close()
+
+    acc = await db_pool.get("user1")
+    assert acc.stats[Q] == 7
+    assert int(acc.locks[Q].timestamp()) == end_time
+
+    acc = await db_pool.get("user2")
+    assert acc.active is False
+    assert acc.error_msg == "banned"
+
+
+STRESS_WORKER = """
+import asyncio, json, sys, time
+from twscrape.accounts_pool import AccountsPool
+from twscrape.logger import set_log_level
+
+async def worker(pool, queue, ops, unlock):
+    res = []
+    while len(res) < ops:
+        acc = await pool.get_for_queue(queue)
+        if acc is None:
+            if not unlock:
+                break
+            await asyncio.sleep(0.01)
+            continue
+
+        t1 = time.time()
+        await asyncio.sleep(0.001)
+        t2 = time.time()
+        if unlock:
+            await pool.unlock(acc.username, queue)
+        res.append((acc.username, t1, t2))
+    return res
+
+async def main(db_file, queue, ops, unlock):
+    set_log_level("ERROR")
+    pool = AccountsPool(db_file)
+    rs = await asyncio.gather(*[worker(pool, queue, ops, unlock) for _ in range(3)])
+    print(json.dumps([x for r in rs for x in r]))
+
+asyncio.run(main(sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4] == "1"))
+"""
+
+
+async def run_stress_workers(db_file: str, queue: str, procs: int, ops: int, unlock: bool):
+    env = {**os.environ, "TWS_DB_WAL": "1"}
+    args = [sys.executable, "-c", STRESS_WORKER, db_file, queue, str(ops), "1" if unlock else "0"]
+    ps = [
+        await asyncio.create_subprocess_exec(*args, env=env, stdout=asyncio.subprocess.PIPE)
+        for _ in range(procs)
+    ]
+
+    res = []
+    for p in ps:
+        out, _ = await p.communicate()
+        assert p.returncode == 0
+        res.extend(json.loads(out))
+    return res
+
+
+async def test_wal_multiprocess_locks(pool_mock: AccountsPool):
+    for x in range(20):
+        await pool_mock.add_account(f"user{x}", f"pass{x}", f"email{x}", f"email_pass{x}")
+        await pool_mock.set_active(f"user{x}", True)
+    await close_pools()
+
+    db_file = str(pool_mock._db_file)
+
+    # without unlock each account should be taken exactly once by all processes together
+    rs = await run_stress_workers(db_file, "q1", procs=4, ops=100, unlock=False)
+    usernames = [x[0] for x in rs]
+    assert len(usernames) == len(set(usernames)), "account locked twice"
+    assert len(usernames) == 20, "account lock lost"
+
+    accs = await pool_mock.get_all()
+    assert all("q1" in x.locks for x in accs)
+    assert (await pool_mock.get_for_queue("q1")) is None
+
+    # with unlock same account should never be held by two workers at same time
+    rs = await run_stress_workers(db_file, "q2", procs=4, ops=15, unlock=True)
+    assert len(rs) == 4 * 3 * 15
+
+    holds: dict[str, list[tuple[float, float]]] = {}
+    for username, t1, t2 in rs:
+        holds.setdefault(username, []).append((t1, t2))
+
+    for username, items in holds.items():
+        items = sorted(items)
+        for a, b in zip(items, items[1:]):
+            assert a[1] <= b[0], f"{username} held by two workers at same time"
+
+    stats = await pool_mock.stats()
+    assert stats.get("locked_q2", 0) == 0
+
+
+def test_safari_agents():
+    # picked from dataset, not fallback single agent
+    items = _safari_agents()
+    assert len(items) > 1
+    assert all("Safari" in x and "Chrome" not in x for x in items)
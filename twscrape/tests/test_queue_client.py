@@ -1,14 +1,29 @@
+import asyncio
+import os
+import stat
 from contextlib import aclosing
 
 import httpx
+import pytest
 from pytest_httpx import HTTPXMock
 
+import twscrape.queue_client as queue_client_mod
+import twscrape.transports as transports_mod
+from twscrape import jsonlib
 from twscrape.accounts_pool import AccountsPool
-from twscrape.queue_client import QueueClient
+from twscrape.api import API
+from twscrape.db import fetchall
+from twscrape.dedupe import BloomIds
+from twscrape.pacing import Pacer
+from twscrape.queue_client import AbortReqError, QueueClient, XClIdGenStore
+from twscrape.transports import TransportPool
+from twscrape.utils import gather, utc
+from twscrape.xclid import XClIdGen
 
 DB_FILE = "/tmp/twscrape_test_queue_client.db"
 URL = "https://example.com/api"
 CF = tuple[AccountsPool, QueueClient]
+xclid_get = XClIdGenStore.get  # mocked by conftest fixture for other tests
 
 
 async def get_locked(pool: AccountsPool) -> set[str]:
@@ -156,3 +171,307 @@ async def test_ctx_closed_on_break(httpx_mock: HTTPXMock, client_fixture: CF):
 
     # ctx should be None after break
     assert client.ctx is None
+
+
+async def test_save_rate_limit_budget(httpx_mock: HTTPXMock, client_fixture: CF):
+    pool, client = client_fixture
+
+    await client.__aenter__()
+    hdr = {"x-rate-limit-remaining": "42", "x-rate-limit-reset": str(utc.ts() + 600)}
+    httpx_mock.add_response(url=URL, json={"foo": "bar"}, status_code=200, headers=hdr)
+    assert (await client.get(URL)) is not None
+    await client.__aexit__(None, None, None)
+
+    qs = "SELECT username, limit_remaining FROM account_queue_state WHERE limit_remaining IS NOT NULL"
+    rs = await fetchall(pool._db_file, qs)
+    assert [tuple(x) for x in rs] == [("user1", 42)]
+
+
+async def test_transport_reused_between_sessions(httpx_mock: HTTPXMock, client_fixture: CF):
+    pool, _ = client_fixture
+
+    seen = []
+    for _ in range(2):
+        async with QueueClient(pool, "SearchTimeline") as qc:
+            assert qc.ctx is not None and qc.ctx.transport is not None
+            seen.append((qc.ctx.acc.username, qc.ctx.transport))
+
+    assert seen[0][0] == seen[1][0]
+    assert seen[0][1] is seen[1][1]
+
+    # idle transports closed after keepalive timeout
+    tp = TransportPool(keepalive=0.05, max_connections=2)
+    t1 = await tp.acquire("user1", None)
+    assert await tp.acquire("user2", None) is not t1
+    await tp.release("user1", None, t1)
+    assert await tp.acquire("USER1", None) is t1  # same account, case insensitive
+    await tp.release("user1", None, t1)
+
+    await asyncio.sleep(0.06)
+    assert await tp.acquire("user1", None) is not t1
+    await tp.close()
+
+
+async def test_http2_transport(monkeypatch):
+    tp = TransportPool(keepalive=60, max_connections=2)
+    t1 = await tp.acquire("user1", None)
+    t2 = await tp.acquire("user1", None, http2=True)
+    assert t1 is not t2
+    await tp.release("user1", None, t2, http2=True)
+    assert await tp.acquire("user1", None, http2=True) is t2
+
+    # without h2 package same HTTP/1.1 transport used (checked & warned once)
+    calls = []
+    monkeypatch.setattr(transports_mod.importlib.util, "find_spec", lambda x: calls.append(x))
+    transports_mod.http2_available.cache_clear()
+    try:
+        assert await tp.acquire("user1", None, http2=True) is t1
+        assert await tp.acquire("user1", None, http2=True) is t1
+        assert calls == ["h2"]
+    finally:
+        transports_mod.http2_available.cache_clear()
+    await tp.close()
+
+
+async def test_response_decoded_once(httpx_mock: HTTPXMock, client_fixture: CF, monkeypatch):
+    pool, _ = client_fixture
+    with open(os.path.join(os.path.dirname(__file__), "mocked-data", "raw_search.json")) as fp:
+        httpx_mock.add_response(text=fp.read())
+
+    calls = []
+    orig = jsonlib.loads
+    monkeypatch.setattr(jsonlib, "loads", lambda x: calls.append(isinstance(x, bytes)) or orig(x))
+
+    tweets = await gather(API(pool).search("elon musk", limit=1))
+    assert len(tweets) > 0
+    assert sum(calls) == 1  # response bodies (account fields are str)
+
+
+async def test_strict_limit(httpx_mock: HTTPXMock, client_fixture: CF):
+    pool, _ = client_fixture
+    with open(os.path.join(os.path.dirname(__file__), "mocked-data", "raw_search.json")) as fp:
+        httpx_mock.add_response(text=fp.read(), is_reusable=True)  # 11 tweets per page
+
+    # whole page returned by default
+    tweets = await gather(API(pool).search("elon musk", limit=5))
+    assert len(tweets) == 11
+    assert len(httpx_mock.get_requests()) == 1
+
+    # exact limit, next page requested only when items needed
+    tweets = await gather(API(pool, strict_limit=True).search("elon musk", limit=5))
+    assert len(tweets) == 5
+    assert len(httpx_mock.get_requests()) == 2
+
+    tweets = await gather(API(pool, strict_limit=True).search("elon musk", limit=15))
+    assert len(tweets) == 15
+    assert len(httpx_mock.get_requests()) == 4
+
+
+async def test_dedupe(httpx_mock: HTTPXMock, client_fixture: CF):
+    pool, _ = client_fixture
+    with open(os.path.join(os.path.dirname(__file__), "mocked-data", "raw_search.json")) as fp:
+        httpx_mock.add_response(text=fp.read(), is_reusable=True)  # same page every time
+
+    tweets = await gather(API(pool).search("elon musk", limit=20))
+    assert len(tweets) == 22
+
+    for dedupe in ["set", "bloom"]:
+        api = API(pool, dedupe=dedupe)
+        tweets = await gather(api.search("elon musk", limit=20))
+        assert len(tweets) == 11
+        assert len(set(x.id for x in tweets)) == 11
+        assert api.dedupe_stats == {"items": 11, "dropped": 11}
+
+    # bloom filter sized from iterator limit, not default capacity
+    api = API(pool, dedupe="bloom", dedupe_capacity=50_000, dedupe_error_rate=0.01)
+    for limit, capacity in [(20, 120), (-1, 50_000)]:
+        seen = api._limit(limit).seen
+        assert isinstance(seen, BloomIds) and seen.capacity == capacity
+    with pytest.raises(ValueError):
+        API(pool, dedupe="bloom", dedupe_error_rate=1)
+
+
+async def test_prefetch(httpx_mock: HTTPXMock, client_fixture: CF):
+    pool, _ = client_fixture
+    with open(os.path.join(os.path.dirname(__file__), "mocked-data", "raw_search.json")) as fp:
+        httpx_mock.add_response(text=fp.read(), is_reusable=True)
+
+    api = API(pool, prefetch=1)
+    tweets = await gather(api.search("elon musk", limit=30))
+    assert len(tweets) == 33
+    assert len(httpx_mock.get_requests()) == 3
+
+    # next page requested while consumer is on first one, cancelled on break
+    async with aclosing(api.search_raw("elon musk")) as gen:
+        async for _ in gen:
+            await asyncio.sleep(0.05)
+            assert len(httpx_mock.get_requests()) == 5
+            break
+
+    assert len(await get_locked(pool)) == 0
+
+
+async def test_xclid_store(monkeypatch, tmp_path):
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return XClIdGen([len(calls)] * 48, "key")
+
+    monkeypatch.setattr(XClIdGen, "create", create)
+    monkeypatch.setattr(queue_client_mod, "XCLID_CACHE", str(tmp_path / "xclid.json"))
+    monkeypatch.setattr(XClIdGenStore, "gen", None)
+    monkeypatch.setattr(XClIdGenStore, "created_at", 0.0)
+
+    # one generator created for concurrent requests of all accounts
+    gens = await asyncio.gather(*[xclid_get(f"user{x % 10}") for x in range(50)])
+    assert len(calls) == 1
+    assert all(x is gens[0] for x in gens)
+
+    # keys rejected: not created again right after refresh
+    assert await xclid_get("user1", fresh=True) is gens[0]
+    assert len(calls) == 1
+
+    # warm start from disk
+    monkeypatch.setattr(XClIdGenStore, "gen", None)
+    gen = await xclid_get("user1")
+    assert gen.vk_bytes == gens[0].vk_bytes and len(calls) == 1
+
+    # stale keys returned while refreshed in background
+    monkeypatch.setattr(XClIdGenStore, "created_at", 0.0)
+    assert await xclid_get("user1") is gen
+    await asyncio.sleep(0.05)
+    assert len(calls) == 2
+    assert (await xclid_get("user1")).vk_bytes[0] == 2
+
+    # cache of other user not trusted
+    if hasattr(os, "getuid"):
+        monkeypatch.setattr(XClIdGenStore, "gen", None)
+        with monkeypatch.context() as m:
+            m.setattr(os, "getuid", lambda: os.stat(tmp_path).st_uid + 1)
+            XClIdGenStore._load()
+        assert XClIdGenStore.gen is None
+        XClIdGenStore._load()
+        assert XClIdGenStore.gen is not None
+
+        # dir writable by others (eg. planted in shared tempdir): cache not saved there
+        shared = tmp_path / "shared"
+        shared.mkdir(mode=0o777)
+        shared.chmod(0o777)
+        os.symlink(tmp_path / "victim", shared / "xclid.json")
+        monkeypatch.setattr(queue_client_mod, "XCLID_CACHE", str(shared / "xclid.json"))
+        XClIdGenStore._save()
+        assert not (tmp_path / "victim").exists() and os.listdir(shared) == ["xclid.json"]
+
+        shared.chmod(0o700)  # own private dir: symlink replaced, not followed
+        XClIdGenStore._save()
+        assert not (tmp_path / "victim").exists() and os.listdir(shared) == ["xclid.json"]
+        assert not os.path.islink(shared / "xclid.json")
+        assert stat.S_IMODE(os.stat(shared / "xclid.json").st_mode) == 0o600
+
+
+async def test_xclid_store_refresh_backoff(monkeypatch, tmp_path):
+    calls = []
+
+    async def create():
+        calls.append(1)
+        raise ValueError("keys not found on page")
+
+    monkeypatch.setattr(XClIdGen, "create", create)
+    monkeypatch.setattr(queue_client_mod, "XCLID_CACHE", "")
+    monkeypatch.setattr(XClIdGenStore, "gen", XClIdGen([1] * 48, "key"))
+    monkeypatch.setattr(XClIdGenStore, "created_at", 0.0)
+    monkeypatch.setattr(XClIdGenStore, "failed_at", 0.0)
+
+    # stale keys used, failed refresh not repeated by each request
+    gen = XClIdGenStore.gen
+    assert await xclid_get("user1") is gen
+    await asyncio.sleep(0.01)
+    for _ in range(10):
+        assert await xclid_get("user1") is gen
+        assert await xclid_get("user1", fresh=True) is gen
+        await asyncio.sleep(0)
+    assert len(calls) == 1
+
+    # no keys at all: request aborted without new refresh
+    monkeypatch.setattr(XClIdGenStore, "gen", None)
+    with pytest.raises(AbortReqError):
+        await xclid_get("user1")
+    assert len(calls) == 1
+
+    monkeypatch.setattr(XClIdGenStore, "failed_at", 0.0)
+    with pytest.raises(ValueError):
+        await xclid_get("user1")
+    assert len(calls) == 2
+
+
+async def test_pacing_switch_account(httpx_mock: HTTPXMock, client_fixture: CF, monkeypatch):
+    pool, _ = client_fixture
+    monkeypatch.setattr(queue_client_mod, "pacer", Pacer(burst=1, max_wait=10))
+
+    # 10 requests left for 15 minutes: next one in 90s, so other account used
+    hdr = {"x-rate-limit-remaining": "10", "x-rate-limit-reset": str(utc.ts() + 900)}
+    httpx_mock.add_response(url=URL, json={}, headers=hdr, is_reusable=True)
+
+    async with QueueClient(pool, "SearchTimeline", pacing=True) as client:
+        rep = await client.get(URL)
+        assert rep is not None and getattr(rep, "__username") == "user1"
+        rep = await client.get(URL)
+        assert rep is not None and getattr(rep, "__username") == "user2"
+
+    assert await get_locked(pool) == {"user1"}
+
+
+async def test_hedged_requests(httpx_mock: HTTPXMock, client_fixture: CF):
+    pool, _ = client_fixture
+    with open(os.path.join(os.path.dirname(__file__), "mocked-data", "raw_user_by_id.json")) as fp:
+        body = fp.read()
+
+    calls = []
+
+    async def slow_first(request: httpx.Request):
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(10)  # slow proxy / account
+        return httpx.Response(200, text=body)
+
+    httpx_mock.add_callback(slow_first, is_reusable=True)
+
+    api = API(pool, hedge=95)
+    api.hedge_delay = 0.05
+    user = await asyncio.wait_for(api.user_by_id(2244994945), timeout=2)
+    assert user is not None and user.id == 2244994945
+    assert api.hedge_stats == {"requests": 1, "hedged": 1, "won_by_hedge": 1}
+    # slow request cancelled, account unlocked
+    assert [x.username for x in await pool.get_all() if any(x.locks.values())] == []
+
+    # fast response: not hedged
+    user = await api.user_by_id(2244994945)
+    assert user is not None and len(calls) == 3
+    assert api.hedge_stats == {"requests": 2, "hedged": 1, "won_by_hedge": 1}
+
+
+async def test_hedge_cancelled_on_ctx_setup(
+    httpx_mock: HTTPXMock, client_fixture: CF, monkeypatch: pytest.MonkeyPatch
+):
+    pool, _ = client_fixture
+    with open(os.path.join(os.path.dirname(__file__), "mocked-data", "raw_user_by_id.json")) as fp:
+        httpx_mock.add_response(text=fp.read(), is_reusable=True)
+
+    acquire, calls = queue_client_mod.transports.acquire, []
+
+    async def slow_acquire(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) == 1:
+            await asyncio.sleep(10)  # account already locked, transport not ready yet
+        return await acquire(*args, **kwargs)
+
+    monkeypatch.setattr(queue_client_mod.transports, "acquire", slow_acquire)
+
+    api = API(pool, hedge=95)
+    api.hedge_delay = 0.05
+    user = await asyncio.wait_for(api.user_by_id(2244994945), timeout=2)
+    assert user is not None and len(calls) == 2 and calls[0] != calls[1]
+    # loser cancelled inside __aenter__, account unlocked
+    assert [x.username for x in await pool.get_all() if any(x.locks.values())] == []
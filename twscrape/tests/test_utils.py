@@ -1,6 +1,20 @@
+import asyncio
+import email.utils
+import importlib.util
+import json
+import os
+import re
+from contextlib import aclosing
+from datetime import datetime
+
 import pytest
 
-from twscrape.utils import parse_cookies
+from twscrape import jsonlib, models
+from twscrape.dedupe import BloomIds, SeenIds
+from twscrape.models import parse_tweets
+from twscrape.utils import gather, parse_cookies, parse_date, read_ahead, snowflake_ts
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "mocked-data")
 
 
 def test_cookies_parse():
@@ -25,3 +39,150 @@ def test_cookies_parse():
     with pytest.raises(ValueError, match=r"Invalid cookie value: .+"):
         val = "{invalid}"
         assert parse_cookies(val) == {}
+
+
+@pytest.mark.parametrize("name", jsonlib.BACKENDS)
+def test_json_backends(name: str):
+    if importlib.util.find_spec(name) is None:
+        pytest.skip(f"{name} not installed")
+
+    loads, dumps = jsonlib.get_backend(name)
+    with open(os.path.join(DATA_DIR, "raw_search.json"), "rb") as fp:
+        data = fp.read()
+
+    assert loads(data) == json.loads(data)
+    with pytest.raises(json.JSONDecodeError):
+        loads(b"{invalid")
+
+    # same output as stdlib
+    obj = {"a": 1, "b": None, "c": 'ü\x1f\x7f😀\u2028"\\/', "d": datetime(2023, 1, 2)}
+    assert dumps(obj, default=str) == json.dumps(obj, default=str)
+    assert dumps(obj, default=str, compact=True) == json.dumps(
+        obj, default=str, separators=(",", ":")
+    )
+    assert dumps({"a": 1, "b": [1, 2]}, compact=True) == '{"a":1,"b":[1,2]}'
+    assert json.loads(dumps({"big": 1 << 70})) == {"big": 1 << 70}
+
+    for x in parse_tweets(loads(data)):
+        assert dumps(x.dict(), default=str) == json.dumps(x.dict(), default=str)
+        compact = json.dumps(x.dict(), default=str, separators=(",", ":"))
+        assert dumps(x.dict(), default=str, compact=True) == compact
+        compact = json.dumps(x.dict(), default=str, separators=(",", ":"), ensure_ascii=False)
+        assert dumps(x.dict(), default=str, compact=True, ascii=False) == compact
+
+
+def test_json_fast_path(monkeypatch):
+    # compact output not encoded by stdlib when orjson installed
+    if importlib.util.find_spec("orjson") is None:
+        pytest.skip("orjson not installed")
+
+    _, dumps = jsonlib.get_backend("orjson")
+    monkeypatch.setattr(jsonlib, "_json_dumps", lambda *args, **kwargs: pytest.fail("stdlib"))
+    assert dumps({"a": "ü😀", "b": [1.5, None]}, compact=True) == (
+        '{"a":"\\u00fc\\ud83d\\ude00","b":[1.5,null]}'
+    )
+    assert dumps({"a": "ü😀"}, compact=True, ascii=False) == '{"a":"ü😀"}'
+
+
+def test_parse_date():
+    vals = set()
+    for filename in os.listdir(DATA_DIR):
+        with open(os.path.join(DATA_DIR, filename)) as fp:
+            vals.update(re.findall(r'"created_at":\s*"([^"]+)"', fp.read()))
+
+    assert len(vals) > 100
+    for x in vals:
+        assert parse_date(x) == email.utils.parsedate_to_datetime(x), x
+
+    # other shapes handled by stdlib parser
+    for x in ["Wed Oct 10 20:19:24 +0530 2018", "Wed, 10 Oct 2018 20:19:24 -0000"]:
+        assert parse_date(x) == email.utils.parsedate_to_datetime(x)
+
+
+def test_snowflake_ts():
+    tweets = []
+    for filename in os.listdir(DATA_DIR):
+        if not filename.endswith(".json"):
+            continue
+
+        with open(os.path.join(DATA_DIR, filename), "rb") as fp:
+            tweets.extend(parse_tweets(json.loads(fp.read())))
+
+    assert len(tweets) > 100
+    for x in tweets:
+        ts = snowflake_ts(x.id)
+        assert ts is not None and ts.replace(microsecond=0) == x.date
+        assert snowflake_ts(x.id_str) == ts
+
+    assert snowflake_ts(20) is None  # first tweet, before snowflake ids
+
+
+def test_dedupe_filters():
+    ids = [str(1_700_000_000_000_000_000 + x * 7919) for x in range(1000)]
+    for seen in [SeenIds(), BloomIds(capacity=1000, error_rate=0.001)]:
+        assert all(seen.add(x) for x in ids[:500])
+        assert not any(seen.add(x) for x in ids[:500])
+        assert all(x in seen for x in ids[:500])
+        assert sum(x in seen for x in ids[500:]) <= 5
+        assert seen.dropped == 500
+
+    stats = {}
+    seen = SeenIds(stats)
+    assert seen.add("trend name") and not seen.add("trend name") and seen.add("1")
+    assert stats == {"items": 2, "dropped": 1}
+
+    for x in [0, 1, -0.1]:
+        with pytest.raises(ValueError):
+            BloomIds(error_rate=x)
+
+
+def test_dedupe_parse_error(monkeypatch):
+    with open(os.path.join(DATA_DIR, "raw_search.json"), "rb") as fp:
+        data = fp.read()
+
+    def broken(obj: dict, res: dict):
+        raise KeyError("full_text")
+
+    # item failed to parse not marked as seen, so yielded when found on next page
+    seen = SeenIds()
+    monkeypatch.setattr(models, "_write_dump", lambda *args: None)
+    with monkeypatch.context() as m:
+        m.setattr(models.Tweet, "parse", broken)
+        assert list(parse_tweets(jsonlib.loads(data), seen=seen)) == []
+
+    tweets = list(parse_tweets(jsonlib.loads(data), seen=seen))
+    assert len(tweets) > 0 and seen.items == len(tweets) and seen.dropped == 0
+    assert list(parse_tweets(jsonlib.loads(data), seen=seen)) == []
+    assert seen.dropped == len(tweets)
+
+
+async def test_read_ahead():
+    events = []
+
+    async def pages(count: int):
+        try:
+            for i in range(count):
+                await asyncio.sleep(0)
+                events.append(i)
+                yield i
+        finally:
+            events.append("closed")
+
+    assert await gather(read_ahead(pages(5), 1)) == [0, 1, 2, 3, 4]
+
+    events.clear()
+    async with aclosing(read_ahead(pages(5), 2)) as gen:
+        async for x in gen:
+            await asyncio.sleep(0.01)  # processing: next pages fetched, but only `depth` ahead
+            assert events == list(range(x + 3))
+            if x == 1:
+                break
+
+    assert events == [0, 1, 2, 3, "closed"]
+
+    async def failed():
+        yield 1
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        await gather(read_ahead(failed(), 1))
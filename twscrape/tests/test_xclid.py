@@ -0,0 +1,82 @@
+import os
+
+import bs4
+import pytest
+
+from twscrape import xclid
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "mocked-data")
+ANIM_IDX = [9, 17, 33, 41]
+
+
+def load_page():
+    with open(os.path.join(DATA_DIR, "xclid_page.html")) as fp:
+        return fp.read()
+
+
+def bs4_keys(text: str):
+    soup = bs4.BeautifulSoup(text, "html.parser")
+    return xclid.parse_vk_bytes(soup), xclid.parse_anim_paths(soup)
+
+
+def test_find_keys_same_as_bs4():
+    text = load_page()
+    assert (xclid.find_vk_bytes(text), xclid.find_anim_paths(text)) == bs4_keys(text)
+    assert len(xclid.find_anim_paths(text)) == 4
+
+    # other attributes order & quotes, self-closing tags
+    vk = xclid.find_vk_bytes(text)
+    meta = text.split('<meta name="twitter-site-verification" ')[1].split(" />")[0]
+    alt = text.replace(f'<meta name="twitter-site-verification" {meta} />', "")
+    alt = alt.replace("<title>", f"<meta {meta} name='twitter-site-verification'><title>")
+    alt = alt.replace('fill="none"></path>', "fill='none' />")
+    assert xclid.find_vk_bytes(alt) == vk
+    assert xclid.find_anim_paths(alt) == xclid.find_anim_paths(text)
+    assert bs4_keys(alt) == bs4_keys(text)
+
+
+async def test_load_keys(monkeypatch):
+    text = load_page()
+    expected = xclid.calc_keys(text, ANIM_IDX)
+
+    async def get_tw_page_text(url: str, clt=None):
+        assert "/ondemand.s." in url
+        return ", ".join(f"(e[{x}], 16)" for x in ANIM_IDX)
+
+    def no_bs4(*args, **kwargs):
+        raise AssertionError("bs4 should not be used")
+
+    monkeypatch.setattr(xclid, "get_tw_page_text", get_tw_page_text)
+    monkeypatch.setattr(bs4, "BeautifulSoup", no_bs4)
+    assert await xclid.load_keys(text) == expected
+
+    # fallback to bs4 when markup is not matched by regexes
+    monkeypatch.undo()
+    monkeypatch.setattr(xclid, "find_anim_paths", lambda text: [])
+    assert xclid.calc_keys(text, ANIM_IDX) == expected
+
+    with pytest.raises(Exception, match="animation array"):
+        xclid.calc_keys(text.replace("loading-x-anim", "loading"), ANIM_IDX)
+
+
+def test_partial_match_fallback(monkeypatch):
+    text = load_page()
+    expected = xclid.calc_keys(text, ANIM_IDX)
+    used_bs4 = []
+    parse_vk_bytes = xclid.parse_vk_bytes
+    monkeypatch.setattr(xclid, "parse_vk_bytes", lambda x: used_bs4.append(1) or parse_vk_bytes(x))
+
+    # path of one svg not matched by regex (child element), so only 3 of 4 found
+    alt = text.replace('fill="none"></path>', 'fill="none"><title>x</title></path>', 1)
+    assert len(xclid.find_anim_paths(alt)) == 3
+    assert xclid.calc_keys(alt, ANIM_IDX) == expected and len(used_bs4) == 1
+
+    # wrong element matched (no animation frames)
+    alt = text.replace('<path d="M 10,30 C', '<path d="M 0,0 H 24"/><path d="M 10,30 C', 1)
+    assert not xclid.valid_anim_paths(alt, xclid.find_anim_paths(alt))
+
+    # verification content not strict base64
+    vk = text.split('name="twitter-site-verification" content="')[1].split('"')[0]
+    alt = text.replace(vk, f"{vk[:10]}!{vk[10:]}")
+    assert xclid.find_vk_bytes(alt) is None
+    assert xclid.calc_keys(alt, ANIM_IDX) == expected and len(used_bs4) == 2
@@ -4,4 +4,5 @@ from .accounts_pool import AccountsPool, NoAccountError
 from .api import API
 from .logger import set_log_level
 from .models import *  # noqa: F403
+from .retry import Breakers, CircuitOpenError, RetryPolicy
 from .utils import gather
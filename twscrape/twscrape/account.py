@@ -1,4 +1,4 @@
-import json
+import functools
 import os
 import sqlite3
 from dataclasses import asdict, dataclass, field
@@ -6,6 +6,7 @@ from datetime import datetime
 
 from httpx import AsyncClient, AsyncHTTPTransport
 
+from . import jsonlib
 from .models import JSONTrait
 from .utils import utc
 
@@ -33,30 +34,39 @@ class Account(JSONTrait):
     @staticmethod
     def from_rs(rs: sqlite3.Row):
         doc = dict(rs)
-        doc["locks"] = {k: utc.from_iso(v) for k, v in json.loads(doc["locks"]).items()}
-        doc["stats"] = {k: v for k, v in json.loads(doc["stats"]).items() if isinstance(v, int)}
-        doc["headers"] = json.loads(doc["headers"])
-        doc["cookies"] = json.loads(doc["cookies"])
+        doc["locks"] = {k: utc.from_iso(v) for k, v in jsonlib.loads(doc["locks"]).items()}
+        doc["stats"] = {k: v for k, v in jsonlib.loads(doc["stats"]).items() if isinstance(v, int)}
+        doc["headers"] = jsonlib.loads(doc["headers"])
+        doc["cookies"] = jsonlib.loads(doc["cookies"])
         doc["active"] = bool(doc["active"])
         doc["last_used"] = utc.from_iso(doc["last_used"]) if doc["last_used"] else None
         return Account(**doc)
 
     def to_rs(self):
         rs = asdict(self)
-        rs["locks"] = json.dumps(rs["locks"], default=lambda x: x.isoformat())
-        rs["stats"] = json.dumps(rs["stats"])
-        rs["headers"] = json.dumps(rs["headers"])
-        rs["cookies"] = json.dumps(rs["cookies"])
+        # stored fields are only read back as json, so compact (fast backend when installed)
+        dumps = functools.partial(jsonlib.dumps, compact=True, ascii=False)
+        rs["locks"] = dumps(rs["locks"], default=lambda x: x.isoformat())
+        rs["stats"] = dumps(rs["stats"])
+        rs["headers"] = dumps(rs["headers"])
+        rs["cookies"] = dumps(rs["cookies"])
         rs["last_used"] = rs["last_used"].isoformat() if rs["last_used"] else None
         return rs
 
-    def make_client(self, proxy: str | None = None) -> AsyncClient:
+    def get_proxy(self, proxy: str | None = None) -> str | None:
         proxies = [proxy, os.getenv("TWS_PROXY"), self.proxy]
         proxies = [x for x in proxies if x is not None]
-        proxy = proxies[0] if proxies else None
+        return proxies[0] if proxies else None
 
-        transport = AsyncHTTPTransport(retries=3)
-        client = AsyncClient(proxy=proxy, follow_redirects=True, transport=transport)
+    def make_client(
+        self, proxy: str | None = None, transport: AsyncHTTPTransport | None = None
+    ) -> AsyncClient:
+        if transport is not None:  # shared transport, already configured with proxy
+            client = AsyncClient(follow_redirects=True, transport=transport)
+        else:
+            proxy = self.get_proxy(proxy)
+            transport = AsyncHTTPTransport(retries=3)
+            client = AsyncClient(proxy=proxy, follow_redirects=True, transport=transport)
 
         # saved from previous usage
         client.cookies.update(self.cookies)
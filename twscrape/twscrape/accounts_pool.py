@@ -1,6 +1,9 @@
 import asyncio
-import sqlite3
-import uuid
+import contextlib
+import functools
+import random
+from collections import deque
+from dataclasses import fields
 from datetime import datetime, timezone
 from typing import TypedDict
 
@@ -8,9 +11,10 @@ from fake_useragent import UserAgent
 from httpx import HTTPStatusError
 
 from .account import Account
-from .db import execute, fetchall, fetchone
+from .db import DB, execute, execute_tx, fetchall, fetchone, lock_retry
 from .logger import logger
 from .login import LoginConfig, login
+from .scheduler import NO_LIMIT, AccountScheduler
 from .utils import get_env_bool, parse_cookies, utc
 
 
@@ -27,6 +31,48 @@ class AccountInfo(TypedDict):
     error_msg: str | None
 
 
+# locks & stats are stored in account_queue_state table (since db v5) and collected here
+# to json objects, so Account.from_rs works same way as with old json columns
+_ACCOUNT_COLS = [f"a.{x.name}" for x in fields(Account) if x.name not in ("locks", "stats")]
+_ACCOUNT_QS = f"""
+SELECT {", ".join(_ACCOUNT_COLS)},
+    (SELECT json_group_object(s.queue, s.locked_until) FROM account_queue_state s
+     WHERE s.username = a.username AND s.locked_until IS NOT NULL) AS locks,
+    (SELECT json_group_object(s.queue, s.req_count) FROM account_queue_state s
+     WHERE s.username = a.username AND s.req_count > 0) AS stats
+FROM accounts a
+"""
+
+
+@functools.cache
+def _safari_agents() -> list[str]:
+    # UserAgent loads and filters whole dataset on each init / attribute access (~10ms),
+    # so candidates collected once (same set as `UserAgent().safari` picks from)
+    ua = UserAgent()
+    names = {"safari", "mobile safari"}  # browser names case differs between dataset versions
+    items = [x["useragent"] for x in ua.data_browsers if (x.get("browser") or "").lower() in names]
+    return items or [ua.safari]
+
+
+def _random_user_agent():
+    return random.choice(_safari_agents())
+
+
+def _budget_rank(limit_remaining: int | None, limit_reset: int | None):
+    # stored sort key, so selection is index ordered: most requests left, then soonest reset;
+    # it's valid only till `limit_reset`, after it account has full budget (checked in query)
+    if limit_remaining is None or limit_reset is None:
+        return None
+    if limit_reset <= utc.ts():
+        return 0
+    return (NO_LIMIT - limit_remaining) << 32 | limit_reset
+
+
+def _wake(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
 def guess_delim(line: str):
     lp, rp = tuple([x.strip() for x in line.split("username")])
     return rp[0] if not lp else lp[-1]
@@ -35,16 +81,32 @@ def guess_delim(line: str):
 class AccountsPool:
     # _order_by: str = "RANDOM()"
     _order_by: str = "username"
+    # select account with most requests left by last seen rate limit (soonest reset on tie)
+    _prefer_budget: bool = True
+    # waiters are woken up in-process on unlock; otherwise they sleep till earliest lock expires
+    # (but no longer than `_max_wait`, as account can be unlocked by other process)
+    _max_wait: float = 60.0
 
     def __init__(
         self,
         db_file="accounts.db",
         login_config: LoginConfig | None = None,
         raise_when_no_account=False,
+        in_memory=False,
+        flush_interval=5.0,
     ):
         self._db_file = db_file
         self._login_config = login_config or LoginConfig()
         self._raise_when_no_account = raise_when_no_account
+        self._queues: set[str] = set()  # queues with seeded account_queue_state rows
+        self._waiters: dict[str, deque[asyncio.Future]] = {}  # see `get_for_queue_or_wait`
+
+        # in-memory mode: locks served from memory and written to db in batches, use it only
+        # when single process owns the pool; call `close()` on shutdown to flush last changes
+        self._in_memory = in_memory
+        self._flush_interval = flush_interval
+        self._sched: AccountScheduler | None = None
+        self._flush_task: asyncio.Task | None = None
 
     async def load_from_file(self, filepath: str, line_format: str):
         line_delim = guess_delim(line_format)
@@ -68,8 +130,46 @@ class AccountsPool:
                 vals = {k: v for k, v in zip(tokens, data) if k != "_"}
                 accounts.append(vals)
 
+        return await self.add_accounts(accounts)
+
+    async def add_accounts(self, accounts: list[dict]):
+        # bulk version of `add_account`: all accounts built (validated) first, then inserted
+        # in single transaction; existing accounts and duplicates in input are skipped
+        items: dict[str, Account] = {}
         for x in accounts:
-            await self.add_account(**x)
+            acc = self._new_account(**x)
+            items.setdefault(acc.username.lower(), acc)
+
+        cols = [x.name for x in fields(Account) if x.name not in ("locks", "stats")]
+        rows = [{k: v for k, v in x.to_rs().items() if k in cols} for x in items.values()]
+        qs = f"""
+        INSERT INTO accounts ({",".join(cols)}) VALUES ({",".join([f":{x}" for x in cols])})
+        ON CONFLICT(username) DO NOTHING
+        """
+
+        # new accounts should be available in all already known queues
+        qs2 = """
+        INSERT OR IGNORE INTO account_queue_state (username, queue)
+        SELECT a.username, q.queue FROM accounts a
+        CROSS JOIN (SELECT DISTINCT queue FROM account_queue_state) q
+        """
+
+        await self._drop_sched()
+        async with DB(self._db_file, immediate=True) as db:
+            changes = db.total_changes
+            if rows:
+                await db.executemany(qs, rows)
+            inserted = db.total_changes - changes
+            await db.execute(qs2)
+
+        self._notify_all_queues()
+        counter = {
+            "total": len(accounts),
+            "inserted": inserted,
+            "skipped": len(accounts) - inserted,
+        }
+        logger.info(f"Accounts added: {counter['inserted']}, skipped: {counter['skipped']}")
+        return counter
 
     async def add_account(
         self,
@@ -88,12 +188,29 @@ class AccountsPool:
             logger.warning(f"Account {username} already exists")
             return
 
+        account = self._new_account(
+            username, password, email, email_password, user_agent, proxy, cookies, mfa_code
+        )
+        await self.save(account)
+        logger.info(f"Account {username} added successfully (active={account.active})")
+
+    def _new_account(
+        self,
+        username: str,
+        password: str,
+        email: str,
+        email_password: str,
+        user_agent: str | None = None,
+        proxy: str | None = None,
+        cookies: str | None = None,
+        mfa_code: str | None = None,
+    ):
         account = Account(
             username=username,
             password=password,
             email=email,
             email_password=email_password,
-            user_agent=user_agent or UserAgent().safari,
+            user_agent=user_agent or _random_user_agent(),
             active=False,
             locks={},
             stats={},
@@ -106,8 +223,7 @@ class AccountsPool:
         if "ct0" in account.cookies:
             account.active = True
 
-        await self.save(account)
-        logger.info(f"Account {username} added successfully (active={account.active})")
+        return account
 
     async def delete_accounts(self, usernames: str | list[str]):
         usernames = usernames if isinstance(usernames, list) else [usernames]
@@ -116,27 +232,40 @@ class AccountsPool:
             logger.warning("No usernames provided")
             return
 
-        qs = f"""DELETE FROM accounts WHERE username IN ({",".join([f'"{x}"' for x in usernames])})"""
-        await execute(self._db_file, qs)
+        await self._drop_sched()
+        us = ",".join([f'"{x}"' for x in usernames])
+        await execute_tx(
+            self._db_file,
+            [
+                (f"DELETE FROM accounts WHERE username IN ({us})", None),
+                (f"DELETE FROM account_queue_state WHERE username IN ({us})", None),
+            ],
+        )
 
     async def delete_inactive(self):
-        qs = "DELETE FROM accounts WHERE active = false"
-        await execute(self._db_file, qs)
+        await self._drop_sched()
+        qs = "DELETE FROM account_queue_state WHERE username IN (SELECT username FROM accounts WHERE active = false)"
+        await execute_tx(
+            self._db_file,
+            [(qs, None), ("DELETE FROM accounts WHERE active = false", None)],
+        )
 
     async def get(self, username: str):
-        qs = "SELECT * FROM accounts WHERE username = :username"
+        await self.flush()
+        qs = f"{_ACCOUNT_QS} WHERE a.username = :username"
         rs = await fetchone(self._db_file, qs, {"username": username})
         if not rs:
             raise ValueError(f"Account {username} not found")
         return Account.from_rs(rs)
 
     async def get_all(self):
-        qs = "SELECT * FROM accounts"
-        rs = await fetchall(self._db_file, qs)
+        await self.flush()
+        rs = await fetchall(self._db_file, _ACCOUNT_QS)
         return [Account.from_rs(x) for x in rs]
 
     async def get_account(self, username: str):
-        qs = "SELECT * FROM accounts WHERE username = :username"
+        await self.flush()
+        qs = f"{_ACCOUNT_QS} WHERE a.username = :username"
         rs = await fetchone(self._db_file, qs, {"username": username})
         if not rs:
             return None
@@ -144,13 +273,25 @@ class AccountsPool:
 
     async def save(self, account: Account):
         data = account.to_rs()
+        # locks & stats columns not used since db v5, queue state updated by lock methods only
+        data = {k: v for k, v in data.items() if k not in ("locks", "stats")}
         cols = list(data.keys())
 
         qs = f"""
         INSERT INTO accounts ({",".join(cols)}) VALUES ({",".join([f":{x}" for x in cols])})
         ON CONFLICT(username) DO UPDATE SET {",".join([f"{x}=excluded.{x}" for x in cols])}
         """
-        await execute(self._db_file, qs, data)
+
+        # new account should be available in all already known queues
+        qs2 = """
+        INSERT OR IGNORE INTO account_queue_state (username, queue)
+        SELECT :username, queue FROM account_queue_state GROUP BY queue
+        """
+        await execute_tx(self._db_file, [(qs, data), (qs2, {"username": account.username})])
+        if self._sched is not None:
+            self._sched.upsert(account)
+        if account.active:
+            self._notify_all_queues()
 
     async def login(self, account: Account):
         try:
@@ -169,20 +310,42 @@ class AccountsPool:
 
     async def login_all(self, usernames: list[str] | None = None):
         if usernames is None:
-            qs = "SELECT * FROM accounts WHERE active = false AND error_msg IS NULL"
+            qs = f"{_ACCOUNT_QS} WHERE a.active = false AND a.error_msg IS NULL"
         else:
             us = ",".join([f'"{x}"' for x in usernames])
-            qs = f"SELECT * FROM accounts WHERE username IN ({us})"
+            qs = f"{_ACCOUNT_QS} WHERE a.username IN ({us})"
 
         rs = await fetchall(self._db_file, qs)
         accounts = [Account.from_rs(rs) for rs in rs]
-        # await asyncio.gather(*[login(x) for x in self.accounts])
 
-        counter = {"total": len(accounts), "success": 0, "failed": 0}
-        for i, x in enumerate(accounts, start=1):
-            logger.info(f"[{i}/{len(accounts)}] Logging in {x.username} - {x.email}")
-            status = await self.login(x)
+        cfg = self._login_config
+        # email code prompts can not be answered in parallel
+        limit = asyncio.Semaphore(1 if cfg.manual else max(1, cfg.concurrency))
+        proxy_limits: dict[str | None, asyncio.Semaphore] = {}
+
+        total, started = len(accounts), 0
+        counter = {"total": total, "success": 0, "failed": 0}
+
+        async def login_one(x: Account):
+            nonlocal started
+            proxy_limit = contextlib.nullcontext()
+            if cfg.per_proxy > 0:
+                proxy = x.get_proxy()
+                proxy_limit = proxy_limits.setdefault(proxy, asyncio.Semaphore(cfg.per_proxy))
+
+            # proxy slot taken first, so global slots are not held by logins waiting for proxy
+            async with proxy_limit, limit:
+                started += 1
+                logger.info(f"[{started}/{total}] Logging in {x.username} - {x.email}")
+                status = await self.login(x)
+
             counter["success" if status else "failed"] += 1
+            if cfg.concurrency > 1:  # in sequential mode order is clear from start messages
+                done = counter["success"] + counter["failed"]
+                msg = f"success: {counter['success']}, failed: {counter['failed']}"
+                logger.info(f"Login progress: {done}/{total} ({msg})")
+
+        await asyncio.gather(*[login_one(x) for x in accounts])
         return counter
 
     async def relogin(self, usernames: str | list[str]):
@@ -192,19 +355,21 @@ class AccountsPool:
             logger.warning("No usernames provided")
             return
 
-        qs = f"""
+        us = ",".join([f'"{x}"' for x in usernames])
+        qs1 = f"""
         UPDATE accounts SET
             active = false,
-            locks = json_object(),
             last_used = NULL,
             error_msg = NULL,
             headers = json_object(),
             cookies = json_object(),
-            user_agent = "{UserAgent().safari}"
-        WHERE username IN ({",".join([f'"{x}"' for x in usernames])})
+            user_agent = "{_random_user_agent()}"
+        WHERE username IN ({us})
         """
+        qs2 = f"UPDATE account_queue_state SET locked_until = NULL WHERE username IN ({us})"
 
-        await execute(self._db_file, qs)
+        await self._drop_sched()
+        await execute_tx(self._db_file, [(qs1, None), (qs2, None)])
         await self.login_all(usernames)
 
     async def relogin_failed(self):
@@ -213,122 +378,259 @@ class AccountsPool:
         await self.relogin([x["username"] for x in rs])
 
     async def reset_locks(self):
-        qs = "UPDATE accounts SET locks = json_object()"
+        await self._drop_sched()
+        qs = "UPDATE account_queue_state SET locked_until = NULL"
         await execute(self._db_file, qs)
 
     async def set_active(self, username: str, active: bool):
         qs = "UPDATE accounts SET active = :active WHERE username = :username"
         await execute(self._db_file, qs, {"username": username, "active": active})
+        if self._sched is not None:
+            self._sched.set_active(username, active)
+        if active:
+            self._notify_all_queues()
+
+    # note: values passed as params (not formatted in query) to reuse cached prepared statements
+
+    async def _set_lock(
+        self,
+        username: str,
+        queue: str,
+        locked_until: str,
+        req_count: int,
+        params,
+        limit_remaining: int | None = None,
+        limit_reset: int | None = None,
+    ):
+        if limit_remaining is None or limit_reset is None:
+            limit_remaining, limit_reset = None, None
 
-    async def lock_until(self, username: str, queue: str, unlock_at: int, req_count=0):
         qs = f"""
-        UPDATE accounts SET
-            locks = json_set(locks, '$.{queue}', datetime({unlock_at}, 'unixepoch')),
-            stats = json_set(stats, '$.{queue}', COALESCE(json_extract(stats, '$.{queue}'), 0) + {req_count}),
-            last_used = datetime({utc.ts()}, 'unixepoch')
-        WHERE username = :username
+        INSERT INTO account_queue_state
+            (username, queue, locked_until, req_count, limit_remaining, limit_reset, budget_rank)
+        VALUES (:username, :queue, {locked_until}, :req_count,
+            :limit_remaining, datetime(:limit_reset, 'unixepoch'), :budget_rank)
+        ON CONFLICT(username, queue) DO UPDATE SET
+            locked_until = excluded.locked_until,
+            req_count = req_count + excluded.req_count,
+            limit_remaining = coalesce(excluded.limit_remaining, limit_remaining),
+            limit_reset = coalesce(excluded.limit_reset, limit_reset),
+            budget_rank = coalesce(excluded.budget_rank, budget_rank)
         """
-        await execute(self._db_file, qs, {"username": username})
+        qs2 = (
+            "UPDATE accounts SET last_used = datetime(:ts, 'unixepoch') WHERE username = :username"
+        )
 
-    async def unlock(self, username: str, queue: str, req_count=0):
-        qs = f"""
-        UPDATE accounts SET
-            locks = json_remove(locks, '$.{queue}'),
-            stats = json_set(stats, '$.{queue}', COALESCE(json_extract(stats, '$.{queue}'), 0) + {req_count}),
-            last_used = datetime({utc.ts()}, 'unixepoch')
-        WHERE username = :username
+        params = {
+            **params,
+            "username": username,
+            "queue": queue,
+            "req_count": req_count,
+            "limit_remaining": limit_remaining,
+            "limit_reset": limit_reset,
+            "budget_rank": _budget_rank(limit_remaining, limit_reset),
+        }
+        await execute_tx(
+            self._db_file, [(qs, params), (qs2, {"username": username, "ts": utc.ts()})]
+        )
+
+    async def lock_until(
+        self,
+        username: str,
+        queue: str,
+        unlock_at: int,
+        req_count=0,
+        limit_remaining: int | None = None,
+        limit_reset: int | None = None,
+    ):
+        limit = (limit_remaining, limit_reset)
+        if sched := await self._get_sched():
+            sched.set_lock(username, queue, unlock_at, req_count, *limit)
+        else:
+            lock_val = "datetime(:unlock_at, 'unixepoch')"
+            params = {"unlock_at": unlock_at}
+            await self._set_lock(username, queue, lock_val, req_count, params, *limit)
+
+        # lock can be shorter than waiters expect, let them recalculate wake up time
+        self._notify(queue, n=None)
+
+    async def unlock(
+        self,
+        username: str,
+        queue: str,
+        req_count=0,
+        limit_remaining: int | None = None,
+        limit_reset: int | None = None,
+    ):
+        limit = (limit_remaining, limit_reset)
+        if sched := await self._get_sched():
+            sched.set_lock(username, queue, 0, req_count, *limit)
+        else:
+            await self._set_lock(username, queue, "NULL", req_count, {}, *limit)
+
+        self._notify(queue)
+
+    async def _seed_queue(self, queue: str):
+        # every account has row per known queue, so free account can be found by index seek
+        if queue in self._queues:
+            return
+
+        qs = """
+        INSERT OR IGNORE INTO account_queue_state (username, queue)
+        SELECT username, :queue FROM accounts
         """
-        await execute(self._db_file, qs, {"username": username})
+        await execute(self._db_file, qs, {"queue": queue})
+        self._queues.add(queue)
 
+    @lock_retry()
     async def _get_and_lock(self, queue: str, condition: str):
         # if space in condition, it's a subquery, otherwise it's username
         condition = f"({condition})" if " " in condition else f"'{condition}'"
 
-        if int(sqlite3.sqlite_version_info[1]) >= 35:
-            qs = f"""
-            UPDATE accounts SET
-                locks = json_set(locks, '$.{queue}', datetime('now', '+15 minutes')),
-                last_used = datetime({utc.ts()}, 'unixepoch')
-            WHERE username = {condition}
-            RETURNING *
-            """
-            rs = await fetchone(self._db_file, qs)
-        else:
-            tx = uuid.uuid4().hex
-            qs = f"""
-            UPDATE accounts SET
-                locks = json_set(locks, '$.{queue}', datetime('now', '+15 minutes')),
-                last_used = datetime({utc.ts()}, 'unixepoch'),
-                _tx = '{tx}'
-            WHERE username = {condition}
+        async with DB(self._db_file, immediate=True) as db:
+            async with db.execute(f"SELECT {condition}", {"queue": queue}) as cur:
+                rs = await cur.fetchone()
+
+            username = rs[0] if rs else None
+            if username is None:
+                return None
+
+            qs = """
+            INSERT INTO account_queue_state (username, queue, locked_until)
+            VALUES (:username, :queue, datetime('now', '+15 minutes'))
+            ON CONFLICT(username, queue) DO UPDATE SET locked_until = excluded.locked_until
             """
-            await execute(self._db_file, qs)
+            await db.execute(qs, {"username": username, "queue": queue})
 
-            qs = f"SELECT * FROM accounts WHERE _tx = '{tx}'"
-            rs = await fetchone(self._db_file, qs)
+            qs = "UPDATE accounts SET last_used = datetime(:ts, 'unixepoch') WHERE username = :username"
+            await db.execute(qs, {"username": username, "ts": utc.ts()})
+
+            qs = f"{_ACCOUNT_QS} WHERE a.username = :username"
+            async with db.execute(qs, {"username": username}) as cur:
+                rs = await cur.fetchone()
 
         return Account.from_rs(rs) if rs else None
 
     async def get_for_queue(self, queue: str):
-        q = f"""
-        SELECT username FROM accounts
-        WHERE active = true AND (
-            locks IS NULL
-            OR json_extract(locks, '$.{queue}') IS NULL
-            OR json_extract(locks, '$.{queue}') < datetime('now')
+        if sched := await self._get_sched():
+            return sched.acquire(queue)
+
+        await self._seed_queue(queue)
+        return await self._get_and_lock(queue, self._free_account_qs())
+
+    def _free_account_qs(self):
+        free = """s.queue = :queue
+            AND (s.locked_until IS NULL OR s.locked_until < datetime('now'))
+            AND EXISTS (SELECT 1 FROM accounts a WHERE a.username = s.username AND a.active = true)
+        """
+        if not self._prefer_budget:
+            return f"""
+            SELECT s.username FROM account_queue_state s WHERE {free}
+            ORDER BY s.locked_until, {self._order_by} LIMIT 1
+            """
+
+        # same order as in-memory scheduler: full budget first (by name), then most requests
+        # left; each step follows index columns, so first account found without sorting
+        full = "s.limit_reset IS NULL OR s.limit_reset <= datetime('now')"
+        live = "s.budget_rank > 0 AND s.limit_reset > datetime('now')"
+        return f"""
+        SELECT coalesce(
+            (SELECT s.username FROM account_queue_state s WHERE {free} AND ({full})
+             ORDER BY {self._order_by} LIMIT 1),
+            (SELECT s.username FROM account_queue_state s WHERE {free} AND {live}
+             ORDER BY s.budget_rank, {self._order_by} LIMIT 1)
         )
-        ORDER BY {self._order_by}
-        LIMIT 1
         """
 
-        return await self._get_and_lock(queue, q)
+    def _notify(self, queue: str, n: int | None = 1):
+        waiters = self._waiters.get(queue)
+        while waiters and (n is None or n > 0):
+            fut = waiters.popleft()
+            loop = fut.get_loop()
+            if not fut.done() and not loop.is_closed():
+                if loop is asyncio.get_running_loop():
+                    fut.set_result(None)
+                else:  # waiter in loop of other thread (eg. threaded web app)
+                    loop.call_soon_threadsafe(_wake, fut)
+                n = n - 1 if n is not None else None
+
+    def _notify_all_queues(self):
+        for queue in list(self._waiters):
+            self._notify(queue)
 
     async def get_for_queue_or_wait(self, queue: str) -> Account | None:
         msg_shown = False
         while True:
-            account = await self.get_for_queue(queue)
-            if not account:
+            # waiter registered before check, so unlock between check and wait is not lost
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(queue, deque()).append(waiter)
+            consumed = False
+            try:
+                account = await self.get_for_queue(queue)
+                if account:
+                    if msg_shown:
+                        logger.info(f"Continuing with account {account.username} on queue {queue}")
+                    return account
+
                 if self._raise_when_no_account or get_env_bool("TWS_RAISE_WHEN_NO_ACCOUNT"):
                     raise NoAccountError(f"No account available for queue {queue}")
 
+                trg = await self._next_available_ts(queue)
                 if not msg_shown:
-                    nat = await self.next_available_at(queue)
-                    if not nat:
+                    if trg is None:
                         logger.warning("No active accounts. Stopping...")
                         return None
 
+                    nat = self._fmt_available_at(utc.from_ts(trg))
                     msg = f'No account available for queue "{queue}". Next available at {nat}'
                     logger.info(msg)
                     msg_shown = True
 
-                await asyncio.sleep(5)
-                continue
-            else:
-                if msg_shown:
-                    logger.info(f"Continuing with account {account.username} on queue {queue}")
-
-            return account
+                # +1s as locks stored with seconds precision and compared with strict `<`
+                timeout = self._max_wait
+                if trg is not None:
+                    timeout = min(max(trg - utc.now().timestamp(), 0) + 1, timeout)
+
+                await asyncio.wait([waiter], timeout=timeout)
+                consumed = True
+            finally:
+                if waiter in self._waiters.get(queue, ()):
+                    self._waiters[queue].remove(waiter)
+                if not waiter.done():
+                    waiter.cancel()
+                elif not consumed:  # woken up, but exits (got account / cancelled), pass it on
+                    self._notify(queue)
 
     async def next_available_at(self, queue: str):
-        qs = f"""
-        SELECT json_extract(locks, '$."{queue}"') as lock_until
-        FROM accounts
-        WHERE active = true AND json_extract(locks, '$."{queue}"') IS NOT NULL
-        ORDER BY lock_until ASC
+        ts = await self._next_available_ts(queue)
+        return self._fmt_available_at(utc.from_ts(ts)) if ts is not None else None
+
+    async def _next_available_ts(self, queue: str) -> int | None:
+        if sched := await self._get_sched():
+            return sched.next_available_at(queue)
+
+        qs = """
+        SELECT s.locked_until FROM account_queue_state s
+        WHERE s.queue = :queue AND s.locked_until IS NOT NULL
+            AND EXISTS (SELECT 1 FROM accounts a WHERE a.username = s.username AND a.active = true)
+        ORDER BY s.locked_until ASC
         LIMIT 1
         """
-        rs = await fetchone(self._db_file, qs)
-        if rs:
-            now, trg = utc.now(), utc.from_iso(rs[0])
-            if trg < now:
-                return "now"
+        rs = await fetchone(self._db_file, qs, {"queue": queue})
+        return int(utc.from_iso(rs[0]).timestamp()) if rs else None
 
-            at_local = datetime.now() + (trg - now)
-            return at_local.strftime("%H:%M:%S")
+    def _fmt_available_at(self, trg: datetime):
+        now = utc.now()
+        if trg < now:
+            return "now"
 
-        return None
+        at_local = datetime.now() + (trg - now)
+        return at_local.strftime("%H:%M:%S")
 
     async def mark_inactive(self, username: str, error_msg: str | None):
+        if sched := await self._get_sched():
+            return sched.mark_inactive(username, error_msg)
+
         qs = """
         UPDATE accounts SET active = false, error_msg = :error_msg
         WHERE username = :username
@@ -336,27 +638,24 @@ class AccountsPool:
         await execute(self._db_file, qs, {"username": username, "error_msg": error_msg})
 
     async def stats(self):
-        def locks_count(queue: str):
-            return f"""
-            SELECT COUNT(*) FROM accounts
-            WHERE json_extract(locks, '$.{queue}') IS NOT NULL
-                AND json_extract(locks, '$.{queue}') > datetime('now')
-            """
-
-        qs = "SELECT DISTINCT(f.key) as k from accounts, json_each(locks) f"
-        rs = await fetchall(self._db_file, qs)
-        gql_ops = [x["k"] for x in rs]
+        await self.flush()
+        qs = """
+        SELECT
+            (SELECT COUNT(*) FROM accounts) as total,
+            (SELECT COUNT(*) FROM accounts WHERE active = true) as active,
+            (SELECT COUNT(*) FROM accounts WHERE active = false) as inactive
+        """
+        rs = await fetchone(self._db_file, qs)
+        res = dict(rs) if rs else {}
 
-        config = [
-            ("total", "SELECT COUNT(*) FROM accounts"),
-            ("active", "SELECT COUNT(*) FROM accounts WHERE active = true"),
-            ("inactive", "SELECT COUNT(*) FROM accounts WHERE active = false"),
-            *[(f"locked_{x}", locks_count(x)) for x in gql_ops],
-        ]
+        qs = """
+        SELECT queue, SUM(locked_until > datetime('now')) as locked
+        FROM account_queue_state GROUP BY queue
+        """
+        for x in await fetchall(self._db_file, qs):
+            res[f"locked_{x['queue']}"] = x["locked"] or 0
 
-        qs = f"SELECT {','.join([f'({q}) as {k}' for k, q in config])}"
-        rs = await fetchone(self._db_file, qs)
-        return dict(rs) if rs else {}
+        return res
 
     async def accounts_info(self):
         accounts = await self.get_all()
@@ -383,3 +682,91 @@ class AccountsPool:
         items = sorted(items, key=lambda x: x["active"], reverse=True)
         # items = sorted(items, key=lambda x: x["total_req"], reverse=True)
         return items
+
+    # in-memory mode
+
+    async def _get_sched(self) -> AccountScheduler | None:
+        if not self._in_memory:
+            return None
+
+        if self._sched is None:
+            rs = await fetchall(self._db_file, _ACCOUNT_QS)
+            qs = """
+            SELECT username, queue, limit_remaining, CAST(strftime('%s', limit_reset) AS INTEGER)
+            FROM account_queue_state
+            WHERE limit_remaining IS NOT NULL AND limit_reset > datetime('now')
+            """
+            budgets = {(x[0], x[1]): (x[2], x[3]) for x in await fetchall(self._db_file, qs)}
+
+            if self._sched is None:  # can be loaded by other coroutine while waiting db
+                accounts = [Account.from_rs(x) for x in rs]
+                self._sched = AccountScheduler(
+                    accounts, budgets, prefer_budget=self._prefer_budget
+                )
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+        return self._sched
+
+    async def _drop_sched(self):
+        # management operations change db directly, so state reloaded on next use
+        await self.flush()
+        self._sched = None
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush accounts state: {e}")
+
+    async def flush(self):
+        if self._sched is None:
+            return
+
+        sched = self._sched
+        states, used, inactive = sched.take_changes()
+        if not states and not used and not inactive:
+            return
+
+        qs1 = """
+        INSERT INTO account_queue_state
+            (username, queue, locked_until, req_count, limit_remaining, limit_reset, budget_rank)
+        VALUES (:username, :queue, datetime(:locked_until, 'unixepoch'), :req_count,
+            :limit_remaining, datetime(:limit_reset, 'unixepoch'), :budget_rank)
+        ON CONFLICT(username, queue) DO UPDATE SET
+            locked_until = excluded.locked_until,
+            req_count = req_count + excluded.req_count,
+            limit_remaining = coalesce(excluded.limit_remaining, limit_remaining),
+            limit_reset = coalesce(excluded.limit_reset, limit_reset),
+            budget_rank = coalesce(excluded.budget_rank, budget_rank)
+        """
+        cols = ["username", "queue", "locked_until", "req_count", "limit_remaining", "limit_reset"]
+        ps1 = [dict(zip(cols, x), budget_rank=_budget_rank(*x[4:6])) for x in states]
+
+        qs2 = (
+            "UPDATE accounts SET last_used = datetime(:ts, 'unixepoch') WHERE username = :username"
+        )
+        ps2 = [{"username": k, "ts": v} for k, v in used.items()]
+
+        qs3 = (
+            "UPDATE accounts SET active = false, error_msg = :error_msg WHERE username = :username"
+        )
+        ps3 = [{"username": k, "error_msg": v} for k, v in inactive.items()]
+
+        try:
+            await execute_tx(self._db_file, [(qs1, ps1), (qs2, ps2), (qs3, ps3)])
+        except BaseException:
+            sched.restore_changes(states, used, inactive)
+            raise
+
+    async def close(self):
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+        await self.flush()
@@ -1,13 +1,19 @@
+import asyncio
+import os
+import time
+from collections import deque
 from contextlib import aclosing
 from typing import Literal
 
 from httpx import Response
 
 from .accounts_pool import AccountsPool
+from .dedupe import DEDUPE, DEDUPE_CAPACITY, DEDUPE_ERROR_RATE, SeenIds, make_seen
 from .logger import set_log_level
 from .models import Tweet, User, parse_trends, parse_tweet, parse_tweets, parse_user, parse_users
 from .queue_client import QueueClient
-from .utils import encode_params, find_obj, get_by_path
+from .retry import Breakers, RetryPolicy
+from .utils import encode_params, find_obj, get_by_path, get_env_bool, read_ahead, rep_json
 
 # OP_{NAME} – {NAME} should be same as second part of GQL ID (required to auto-update script)
 OP_SearchTimeline = "AIdc203rPpK_k_2KWSdm7g/SearchTimeline"
@@ -70,6 +76,29 @@ KV = dict | None
 TrendId = Literal["trending", "news", "sport", "entertainment"] | str
 
 
+class _Limit:
+    # With `strict_limit` items are counted over all pages and iteration is stopped right after
+    # `limit` items, so rest of page is not parsed and next page is not requested. Otherwise
+    # pagination stops when raw entries count reaches `limit`, and whole pages are returned.
+    # `seen` – ids yielded by this iterator on previous pages (with `dedupe` option)
+    def __init__(self, limit: int, strict: bool, seen: SeenIds | None = None):
+        self.limit, self.left = limit, limit
+        self.strict = strict and limit > 0
+        self.seen = seen
+
+    @property
+    def raw(self):  # strict: pages are requested while items needed
+        return -1 if self.strict else self.limit
+
+    @property
+    def parse(self):
+        return self.left if self.strict else -1
+
+    def take(self):  # count yielded item, True when limit reached
+        self.left -= 1
+        return self.strict and self.left <= 0
+
+
 class API:
     # Note: kv is variables, ft is features from original GQL request
     pool: AccountsPool
@@ -80,6 +109,16 @@ class API:
         debug=False,
         proxy: str | None = None,
         raise_when_no_account=False,
+        http2: bool | None = None,
+        strict_limit: bool | None = None,
+        dedupe: str | None = None,
+        dedupe_capacity: int | None = None,
+        dedupe_error_rate: float | None = None,
+        prefetch: int | None = None,
+        pacing: bool | None = None,
+        hedge: float | None = None,
+        breakers: Breakers | None = None,
+        retry_policies: dict[str, RetryPolicy] | None = None,
     ):
         if isinstance(pool, AccountsPool):
             self.pool = pool
@@ -90,11 +129,58 @@ class API:
 
         self.proxy = proxy
         self.debug = debug
+        self.http2 = http2  # None - from TWS_HTTP2 env
+        self.pacing = pacing  # None - from TWS_PACING env
+        self.breakers = breakers  # None - shared by process (`twscrape.retry.breakers`)
+        self.retry_policies = retry_policies  # per error class, None - from TWS_RETRY_* env
+        self.strict_limit = (
+            get_env_bool("TWS_STRICT_LIMIT") if strict_limit is None else strict_limit
+        )
+        self.dedupe = DEDUPE if dedupe is None else dedupe  # None - from TWS_DEDUPE env
+        if self.dedupe not in ("", "set", "bloom"):
+            raise ValueError(f"Invalid dedupe value: {self.dedupe}, expected: set, bloom")
+        # `bloom` filter size per iterator (lower when iterator `limit` given), None - from env
+        self.dedupe_capacity = DEDUPE_CAPACITY if dedupe_capacity is None else dedupe_capacity
+        self.dedupe_error_rate = (
+            DEDUPE_ERROR_RATE if dedupe_error_rate is None else dedupe_error_rate
+        )
+        if not 0 < self.dedupe_error_rate < 1:
+            raise ValueError(f"Invalid dedupe_error_rate: {self.dedupe_error_rate}")
+        self.dedupe_stats = {"items": 0, "dropped": 0}  # over all iterators with dedupe
+        # pages requested ahead of consumer by paginated methods (`*_raw` and parsed ones)
+        self.prefetch = int(os.getenv("TWS_PREFETCH", "0")) if prefetch is None else prefetch
+        # single-item methods: same request sent with second account, when first one is slower
+        # than `hedge` percentile of latencies (`hedge_delay` till enough samples)
+        self.hedge = float(os.getenv("TWS_HEDGE", "0")) if hedge is None else hedge
+        self.hedge_delay = float(os.getenv("TWS_HEDGE_DELAY", "1"))
+        self.hedge_stats = {"requests": 0, "hedged": 0, "won_by_hedge": 0}
+        self._latencies: dict[str, deque[float]] = {}  # queue -> last latencies
         if self.debug:
             set_log_level("DEBUG")
 
     # general helpers
 
+    def _client(self, queue: str):
+        return QueueClient(
+            self.pool,
+            queue,
+            self.debug,
+            proxy=self.proxy,
+            http2=self.http2,
+            pacing=self.pacing,
+            breakers=self.breakers,
+            retry_policies=self.retry_policies,
+        )
+
+    def _limit(self, limit: int):
+        # iterator yields about `limit` items (last page can overshoot), so filter not oversized
+        capacity = self.dedupe_capacity
+        if limit > 0:
+            capacity = min(capacity, limit + 100)
+
+        seen = make_seen(self.dedupe, self.dedupe_stats, capacity, self.dedupe_error_rate)
+        return _Limit(limit, self.strict_limit, seen)
+
     def _is_end(self, rep: Response, q: str, res: list, cur: str | None, cnt: int, lim: int):
         new_count = len(res)
         new_total = cnt + new_count
@@ -115,10 +201,21 @@ class API:
     async def _gql_items(
         self, op: str, kv: dict, ft: dict | None = None, limit=-1, cursor_type="Bottom"
     ):
+        # with `prefetch` next page is requested as soon as cursor known, while consumer
+        # processes current one; pages after `aclosing` / break are cancelled
+        gen = self._gql_pages(op, kv, ft, limit, cursor_type)
+        if self.prefetch > 0:
+            gen = read_ahead(gen, self.prefetch)
+
+        async with aclosing(gen) as gen:
+            async for x in gen:
+                yield x
+
+    async def _gql_pages(self, op: str, kv: dict, ft: dict | None, limit: int, cursor_type: str):
         queue, cur, cnt, active = op.split("/")[-1], None, 0, True
         kv, ft = {**kv}, {**GQL_FEATURES, **(ft or {})}
 
-        async with QueueClient(self.pool, queue, self.debug, proxy=self.proxy) as client:
+        async with self._client(queue) as client:
             while active:
                 params = {"variables": kv, "features": ft}
                 if cur is not None:
@@ -132,7 +229,7 @@ class API:
                 if rep is None:
                     return
 
-                obj = rep.json()
+                obj = rep_json(rep)
                 els = get_by_path(obj, "entries") or []
                 els = [
                     x
@@ -153,9 +250,52 @@ class API:
     async def _gql_item(self, op: str, kv: dict, ft: dict | None = None):
         ft = ft or {}
         queue = op.split("/")[-1]
-        async with QueueClient(self.pool, queue, self.debug, proxy=self.proxy) as client:
-            params = {"variables": {**kv}, "features": {**GQL_FEATURES, **ft}}
-            return await client.get(f"{GQL_URL}/{op}", params=encode_params(params))
+        params = {"variables": {**kv}, "features": {**GQL_FEATURES, **ft}}
+        url, params = f"{GQL_URL}/{op}", encode_params(params)
+        if self.hedge > 0:
+            return await self._gql_hedged(queue, url, params)
+        return await self._gql_get(queue, url, params)
+
+    async def _gql_get(self, queue: str, url: str, params: dict):
+        async with self._client(queue) as client:
+            return await client.get(url, params=params)
+
+    def _hedge_after(self, queue: str):
+        items = sorted(self._latencies.get(queue, []))
+        if len(items) < 20:
+            return self.hedge_delay
+        return items[min(int(len(items) * self.hedge / 100), len(items) - 1)]
+
+    async def _gql_hedged(self, queue: str, url: str, params: dict):
+        # first successful response is used; other request is cancelled, so its account unlocked
+        started = time.monotonic()
+        tasks = [asyncio.create_task(self._gql_get(queue, url, params))]
+        self.hedge_stats["requests"] += 1
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_after(queue))
+            if not done:  # other account taken from pool (waits if no free ones)
+                self.hedge_stats["hedged"] += 1
+                tasks.append(asyncio.create_task(self._gql_get(queue, url, params)))
+
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for x in done:
+                    if x.exception() is not None:
+                        error = error or x.exception()
+                    elif x.result() is not None:
+                        latencies = self._latencies.setdefault(queue, deque(maxlen=200))
+                        latencies.append(time.monotonic() - started)
+                        self.hedge_stats["won_by_hedge"] += int(x is not tasks[0])
+                        return x.result()
+
+            if error is not None:
+                raise error
+            return None
+        finally:
+            for x in tasks:
+                x.cancel()
+            await asyncio.wait(tasks)
 
     # search
 
@@ -173,17 +313,23 @@ class API:
                 yield x
 
     async def search(self, q: str, limit=-1, kv: KV = None):
-        async with aclosing(self.search_raw(q, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.search_raw(q, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     async def search_user(self, q: str, limit=-1, kv: KV = None):
         kv = {"product": "People", **(kv or {})}
-        async with aclosing(self.search_raw(q, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.search_raw(q, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # user_by_id
 
@@ -272,11 +418,14 @@ class API:
                 yield x
 
     async def tweet_replies(self, twid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.tweet_replies_raw(twid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.tweet_replies_raw(twid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, -1, lim.seen):
                     if x.inReplyToTweetId == twid:
                         yield x
+                        if lim.take():
+                            return
 
     # followers
 
@@ -289,10 +438,13 @@ class API:
                 yield x
 
     async def followers(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.followers_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.followers_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # verified_followers
 
@@ -307,10 +459,13 @@ class API:
                 yield x
 
     async def verified_followers(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.verified_followers_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.verified_followers_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # following
 
@@ -322,10 +477,13 @@ class API:
                 yield x
 
     async def following(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.following_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.following_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # subscriptions
 
@@ -337,10 +495,13 @@ class API:
                 yield x
 
     async def subscriptions(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.subscriptions_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.subscriptions_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # retweeters
 
@@ -352,10 +513,13 @@ class API:
                 yield x
 
     async def retweeters(self, twid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.retweeters_raw(twid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.retweeters_raw(twid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_users(rep.json(), limit):
+                for x in parse_users(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # user_tweets
 
@@ -375,10 +539,13 @@ class API:
                 yield x
 
     async def user_tweets(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.user_tweets_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.user_tweets_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # user_tweets_and_replies
 
@@ -398,10 +565,13 @@ class API:
                 yield x
 
     async def user_tweets_and_replies(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.user_tweets_and_replies_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.user_tweets_and_replies_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # user_media
 
@@ -423,9 +593,10 @@ class API:
                 yield x
 
     async def user_media(self, uid: int, limit=-1, kv: KV = None):
-        async with aclosing(self.user_media_raw(uid, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.user_media_raw(uid, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep, limit):
+                for x in parse_tweets(rep, -1, lim.seen):
                     # sometimes some tweets without media, so skip them
                     media_count = (
                         len(x.media.photos) + len(x.media.videos) + len(x.media.animated)
@@ -435,6 +606,8 @@ class API:
 
                     if media_count > 0:
                         yield x
+                        if lim.take():
+                            return
 
     # list_timeline
 
@@ -446,10 +619,13 @@ class API:
                 yield x
 
     async def list_timeline(self, list_id: int, limit=-1, kv: KV = None):
-        async with aclosing(self.list_timeline_raw(list_id, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.list_timeline_raw(list_id, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep, limit):
+                for x in parse_tweets(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # trends
 
@@ -474,20 +650,26 @@ class API:
                 yield x
 
     async def trends(self, trend_id: TrendId, limit=-1, kv: KV = None):
-        async with aclosing(self.trends_raw(trend_id, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.trends_raw(trend_id, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_trends(rep, limit):
+                for x in parse_trends(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     async def search_trend(self, q: str, limit=-1, kv: KV = None):
         kv = {
             "querySource": "trend_click",
             **(kv or {}),
         }
-        async with aclosing(self.search_raw(q, limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.search_raw(q, limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
 
     # Get current user bookmarks
 
@@ -510,7 +692,10 @@ class API:
                 yield x
 
     async def bookmarks(self, limit=-1, kv: KV = None):
-        async with aclosing(self.bookmarks_raw(limit=limit, kv=kv)) as gen:
+        lim = self._limit(limit)
+        async with aclosing(self.bookmarks_raw(limit=lim.raw, kv=kv)) as gen:
             async for rep in gen:
-                for x in parse_tweets(rep.json(), limit):
+                for x in parse_tweets(rep, lim.parse, lim.seen):
                     yield x
+                    if lim.take():
+                        return
@@ -10,10 +10,11 @@ from importlib.metadata import version
 import httpx
 
 from .api import API, AccountsPool
-from .db import get_sqlite_version
+from .db import close_pools, get_sqlite_version
 from .logger import logger, set_log_level
 from .login import LoginConfig
 from .models import Tweet, User
+from .transports import close_transports
 from .utils import print_table
 
 
@@ -49,7 +50,12 @@ async def main(args):
         print(f"SQLite runtime: {sqlite3.sqlite_version} ({await get_sqlite_version()})")
         return
 
-    login_config = LoginConfig(getattr(args, "email_first", False), getattr(args, "manual", False))
+    login_config = LoginConfig(
+        getattr(args, "email_first", False),
+        getattr(args, "manual", False),
+        getattr(args, "concurrency", 1),
+        getattr(args, "per_proxy", 0),
+    )
     pool = AccountsPool(args.db, login_config=login_config)
     api = API(pool, debug=args.debug)
 
@@ -118,6 +124,14 @@ async def main(args):
         print(to_str(doc))
 
 
+async def run_main(args):
+    try:
+        await main(args)
+    finally:
+        await close_pools()
+        await close_transports()
+
+
 def custom_help(p):
     buffer = io.StringIO()
     p.print_help(buffer)
@@ -176,6 +190,8 @@ def run():
     for cmd in login_commands:
         cmd.add_argument("--email-first", action="store_true", help="Check email first")
         cmd.add_argument("--manual", action="store_true", help="Enter email code manually")
+        cmd.add_argument("--concurrency", type=int, default=1, help="Parallel logins")
+        cmd.add_argument("--per-proxy", type=int, default=0, help="Parallel logins per proxy")
 
     subparsers.add_parser("reset_locks", help="Reset all locks")
     subparsers.add_parser("delete_inactive", help="Delete inactive accounts")
@@ -202,6 +218,6 @@ def run():
         return custom_help(p)
 
     try:
-        asyncio.run(main(args))
+        asyncio.run(run_main(args))
     except KeyboardInterrupt:
         pass
@@ -1,32 +1,60 @@
 import asyncio
+import os
 import random
 import sqlite3
-from collections import defaultdict
+import threading
 
 import aiosqlite
 
 from .logger import logger
+from .utils import get_env_bool
 
 MIN_SQLITE_VERSION = "3.24"
+DB_POOL_SIZE = int(os.getenv("TWS_DB_POOL_SIZE", "4"))
+DB_STATEMENTS_CACHE = 256
 
-_lock = asyncio.Lock()
+# WAL mode: readers do not block writers, writers wait on sqlite busy handler instead of
+# in-process lock, so several processes (cli workers, web app) can share one accounts.db
+DB_WAL = get_env_bool("TWS_DB_WAL")
+DB_BUSY_TIMEOUT = float(os.getenv("TWS_DB_BUSY_TIMEOUT", "30"))  # seconds
+
+# in-process lock per event loop (asyncio lock can't be shared by loops of other threads, eg.
+# loop per request in threaded web app – there sqlite busy handler & retry serialize writes)
+_locks: dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _loop_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _locks.get(loop)
+    if lock is None:
+        with _locks_guard:
+            for x in [x for x in _locks if x.is_closed()]:
+                del _locks[x]
+            lock = _locks.setdefault(loop, asyncio.Lock())
+    return lock
 
 
 def lock_retry(max_retries=10):
     # this lock decorator has double nature:
-    # 1. it uses asyncio lock in same process
+    # 1. it uses asyncio lock in same process (not used in WAL mode, busy_timeout handles it)
     # 2. it retries when db locked by other process (eg. two cli instances running)
     def decorator(func):
         async def wrapper(*args, **kwargs):
             for i in range(max_retries):
                 try:
-                    async with _lock:
+                    if DB_WAL:
+                        return await func(*args, **kwargs)
+
+                    async with _loop_lock():
                         return await func(*args, **kwargs)
                 except sqlite3.OperationalError as e:
                     if i == max_retries - 1 or "database is locked" not in str(e):
                         raise e
 
-                    await asyncio.sleep(random.uniform(0.5, 1.0))
+                    # in WAL mode sqlite already waited busy_timeout, so just retry shortly
+                    delay = (0.01, 0.1) if DB_WAL else (0.5, 1.0)
+                    await asyncio.sleep(random.uniform(*delay))
 
         return wrapper
 
@@ -52,6 +80,16 @@ async def check_version():
         pass
 
 
+_version_checked = False
+
+
+async def _check_version_once():
+    global _version_checked
+    if not _version_checked:
+        await check_version()
+        _version_checked = True
+
+
 async def migrate(db: aiosqlite.Connection):
     async with db.execute("PRAGMA user_version") as cur:
         rs = await cur.fetchone()
@@ -84,11 +122,93 @@ async def migrate(db: aiosqlite.Connection):
     async def v4():
         await db.execute("ALTER TABLE accounts ADD COLUMN mfa_code TEXT DEFAULT NULL")
 
+    async def v5():
+        # per-queue locks & counters moved from json columns to indexed table
+        qs = """
+        CREATE TABLE IF NOT EXISTS account_queue_state (
+            username TEXT NOT NULL COLLATE NOCASE,
+            queue TEXT NOT NULL,
+            locked_until TEXT DEFAULT NULL,
+            req_count INTEGER DEFAULT 0 NOT NULL,
+            PRIMARY KEY (username, queue)
+        );"""
+        await db.execute(qs)
+
+        qs = """
+        CREATE INDEX IF NOT EXISTS account_queue_state_lock
+        ON account_queue_state (queue, locked_until, username)
+        """
+        await db.execute(qs)
+
+        qs = """
+        INSERT OR IGNORE INTO account_queue_state (username, queue, req_count)
+        SELECT a.username, s.key, s.value FROM accounts a, json_each(a.stats) s
+        WHERE s.type = 'integer'
+        """
+        await db.execute(qs)
+
+        qs = """
+        INSERT INTO account_queue_state (username, queue, locked_until)
+        SELECT a.username, l.key, datetime(l.value) FROM accounts a, json_each(a.locks) l
+        WHERE true
+        ON CONFLICT(username, queue) DO UPDATE SET locked_until = excluded.locked_until
+        """
+        await db.execute(qs)
+
+        await db.execute("UPDATE accounts SET locks = '{}', stats = '{}'")
+
+    async def v6():
+        # last seen rate limit budget, used to select account with most requests left
+        qs = "ALTER TABLE account_queue_state ADD COLUMN limit_remaining INTEGER DEFAULT NULL"
+        await db.execute(qs)
+        qs = "ALTER TABLE account_queue_state ADD COLUMN limit_reset TEXT DEFAULT NULL"
+        await db.execute(qs)
+
+    async def v7():
+        # budget as plain sort key, so account selection is served by index (no temp b-tree)
+        qs = "ALTER TABLE account_queue_state ADD COLUMN budget_rank INTEGER DEFAULT NULL"
+        await db.execute(qs)
+
+        qs = """
+        UPDATE account_queue_state
+        SET budget_rank = ((1 << 30) - limit_remaining) << 32
+            | CAST(strftime('%s', limit_reset) AS INTEGER)
+        WHERE limit_remaining IS NOT NULL AND limit_reset > datetime('now')
+        """
+        await db.execute(qs)
+
+        qs = """
+        CREATE INDEX IF NOT EXISTS account_queue_state_budget
+        ON account_queue_state (queue, locked_until, budget_rank, username)
+        """
+        await db.execute(qs)
+
+    async def v8():
+        # free accounts selected in two index ordered steps: full budget (never limited or reset
+        # already passed) by name, then live budget by rank; locks are filter only, not order
+        await db.execute("DROP INDEX IF EXISTS account_queue_state_budget")
+
+        qs = """
+        CREATE INDEX IF NOT EXISTS account_queue_state_free
+        ON account_queue_state (queue, username, locked_until, limit_reset)
+        """
+        await db.execute(qs)
+
+        qs = """
+        CREATE INDEX IF NOT EXISTS account_queue_state_rank
+        ON account_queue_state (queue, budget_rank, username, locked_until, limit_reset)
+        """
+        await db.execute(qs)
+
     migrations = {
         1: v1,
         2: v2,
         3: v3,
         4: v4,
+        5: v5,
+        6: v6,
+        7: v7,
+        8: v8,
     }
 
     # logger.debug(f"Current migration v{uv} (latest v{len(migrations)})")
@@ -104,30 +224,160 @@ async def migrate(db: aiosqlite.Connection):
         await db.commit()
 
 
-class DB:
-    _init_queries: defaultdict[str, list[str]] = defaultdict(list)
-    _init_once: defaultdict[str, bool] = defaultdict(bool)
+class _LoopConns:
+    # connections & asyncio primitives of one event loop (primitives are bound to loop)
+    def __init__(self, size: int):
+        self.idle: list[aiosqlite.Connection] = []
+        self.conns: set[aiosqlite.Connection] = set()
+        self.sem = asyncio.Semaphore(size)
+        self.init_lock = asyncio.Lock()
 
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.conn = None
 
-    async def __aenter__(self):
-        await check_version()
-        db = await aiosqlite.connect(self.db_path)
+class ConnectionPool:
+    # long-lived connections per db file, so each query does not pay for connect + migrate
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._loops: dict[asyncio.AbstractEventLoop, _LoopConns] = {}
+        self._lock = threading.Lock()  # loops can run in other threads (eg. threaded web app)
+        self._migrated = False
+
+    async def _connect(self, state: _LoopConns) -> aiosqlite.Connection:
+        conn = aiosqlite.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT,
+            cached_statements=DB_STATEMENTS_CACHE,
+        )
+        # worker thread should not block interpreter exit if pool was not closed explicitly
+        # aiosqlite<0.21 connection is a thread itself
+        setattr(getattr(conn, "_thread", conn), "daemon", True)
+
+        db = await conn
         db.row_factory = aiosqlite.Row
 
-        if not self._init_once[self.db_path]:
-            await migrate(db)
-            self._init_once[self.db_path] = True
+        if DB_WAL:
+            await db.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT * 1000)}")
+            await db.execute("PRAGMA journal_mode = WAL")
+            await db.execute("PRAGMA synchronous = NORMAL")
+
+        async with state.init_lock:
+            if not self._migrated:
+                await migrate(db)
+                self._migrated = True
 
-        self.conn = db
         return db
 
+    async def _bind_loop(self) -> _LoopConns:
+        # each running loop has own connections (eg. several `asyncio.run` calls in same process
+        # or loop per request thread); connections of closed loops are dropped
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is not None:
+            return state
+
+        with self._lock:
+            old = [self._loops.pop(x) for x in list(self._loops) if x.is_closed()]
+            state = self._loops[loop] = _LoopConns(self.size)
+
+        for x in old:
+            for db in x.conns:
+                await db.close()
+        return state
+
+    def _state(self) -> _LoopConns | None:
+        return self._loops.get(asyncio.get_running_loop())
+
+    async def acquire(self) -> aiosqlite.Connection:
+        await _check_version_once()
+        state = await self._bind_loop()
+
+        await state.sem.acquire()
+        try:
+            if state.idle:
+                return state.idle.pop()
+
+            db = await self._connect(state)
+            state.conns.add(db)
+            return db
+        except BaseException:
+            state.sem.release()
+            raise
+
+    async def release(self, db: aiosqlite.Connection, broken=False):
+        state = self._state()
+        if state is None or db not in state.conns:  # acquired in other loop
+            await db.close()
+            return
+
+        if broken:
+            state.conns.discard(db)
+            await db.close()
+        else:
+            state.idle.append(db)
+
+        state.sem.release()
+
+    async def close(self):
+        with self._lock:
+            states, self._loops = list(self._loops.values()), {}
+
+        for x in states:
+            for db in x.conns:
+                await db.close()
+
+
+_pools: dict[str, ConnectionPool] = {}
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    db_path = str(db_path)
+    if db_path not in _pools:
+        _pools[db_path] = ConnectionPool(db_path, DB_POOL_SIZE)
+    return _pools[db_path]
+
+
+async def close_pools():
+    pools = list(_pools.values())
+    _pools.clear()
+    for x in pools:
+        await x.close()
+
+
+class DB:
+    def __init__(self, db_path, immediate=False):
+        self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.immediate = immediate
+        self.conn = None
+
+    async def __aenter__(self):
+        self.conn = await self.pool.acquire()
+        if self.immediate:
+            # take write lock at start, so read-then-write can not be interleaved by others
+            try:
+                await self.conn.execute("BEGIN IMMEDIATE")
+            except BaseException:
+                await self.pool.release(self.conn)
+                self.conn = None
+                raise
+
+        return self.conn
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.conn:
-            await self.conn.commit()
-            await self.conn.close()
+        if self.conn is None:
+            return
+
+        conn, self.conn = self.conn, None
+        try:
+            if exc_type is None:
+                await conn.commit()
+            else:
+                await conn.rollback()
+        except Exception:
+            await self.pool.release(conn, broken=True)
+            raise
+
+        await self.pool.release(conn)
 
 
 @lock_retry()
@@ -156,3 +406,14 @@ async def fetchall(db_path: str, qs: str, params: dict | None = None):
 async def executemany(db_path: str, qs: str, params: list[dict]):
     async with DB(db_path) as db:
         await db.executemany(qs, params)
+
+
+@lock_retry()
+async def execute_tx(db_path: str, queries: list[tuple[str, dict | list[dict] | None]]):
+    # runs all queries in single write transaction (list of params runs as executemany)
+    async with DB(db_path, immediate=True) as db:
+        for qs, params in queries:
+            if isinstance(params, list):
+                await db.executemany(qs, params)
+            else:
+                await db.execute(qs, params)
@@ -0,0 +1,101 @@
+import hashlib
+import math
+import os
+
+from .logger import logger
+
+# Crawl-scoped dedupe for API iterators: items already yielded on previous pages are skipped by
+# raw id before parsing. `set` keeps exact ids (~70 bytes per id); `bloom` uses fixed-size bit
+# array (~1.8 bytes per id with 0.1% error rate), but new item can be dropped as false positive
+# with `error_rate` probability (which grows when more than `capacity` ids added).
+DEDUPE = os.getenv("TWS_DEDUPE", "").strip().lower()  # "" (disabled), "set" or "bloom"
+DEDUPE_CAPACITY = int(os.getenv("TWS_DEDUPE_CAPACITY", "1000000"))
+DEDUPE_ERROR_RATE = float(os.getenv("TWS_DEDUPE_ERROR_RATE", "0.001"))
+
+if DEDUPE not in ("", "set", "bloom"):
+    logger.warning(f"Unknown TWS_DEDUPE value: {DEDUPE}, expected one of: set, bloom")
+    DEDUPE = ""
+
+
+class SeenIds:
+    def __init__(self, stats: dict[str, int] | None = None):
+        self.items, self.dropped = 0, 0
+        self.stats = stats  # shared counters, eg. of all iterators of API
+        self._ids: set[int | str] = set()
+
+    def _key(self, key: str):
+        return int(key) if key.isdigit() else key  # int takes less memory than str
+
+    def __contains__(self, key: str):
+        return self._key(key) in self._ids
+
+    def _add(self, key: str) -> bool:
+        val = self._key(key)
+        if val in self._ids:
+            return False
+
+        self._ids.add(val)
+        return True
+
+    def count(self, name: str):
+        setattr(self, name, getattr(self, name) + 1)
+        if self.stats is not None:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def add(self, key: str) -> bool:
+        # False when key already seen (item should be dropped)
+        new = self._add(key)
+        self.count("items" if new else "dropped")
+        return new
+
+
+class BloomIds(SeenIds):
+    def __init__(
+        self,
+        capacity=DEDUPE_CAPACITY,
+        error_rate=DEDUPE_ERROR_RATE,
+        stats: dict[str, int] | None = None,
+    ):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"Invalid error_rate: {error_rate}, expected 0 < error_rate < 1")
+
+        super().__init__(stats)
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # double hashing: k positions from two 64-bit halves of one digest
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=16).digest(), "little")
+        h1, h2, size = h & 0xFFFFFFFFFFFFFFFF, (h >> 64) | 1, self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def __contains__(self, key: str):
+        bits = self._bits
+        return all(bits[x >> 3] & (1 << (x & 7)) for x in self._positions(key))
+
+    def _add(self, key: str) -> bool:
+        new, bits = False, self._bits
+        for x in self._positions(key):
+            mask = 1 << (x & 7)
+            if not bits[x >> 3] & mask:
+                bits[x >> 3] |= mask
+                new = True
+
+        if new and self.items == self.capacity:
+            logger.warning(f"Dedupe filter capacity {self.capacity} exceeded, errors will grow")
+        return new
+
+
+def make_seen(
+    name: str,
+    stats: dict[str, int] | None = None,
+    capacity=DEDUPE_CAPACITY,
+    error_rate=DEDUPE_ERROR_RATE,
+) -> SeenIds | None:
+    if name == "set":
+        return SeenIds(stats)
+    if name == "bloom":
+        return BloomIds(capacity, error_rate, stats)
+    return None
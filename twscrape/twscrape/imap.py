@@ -74,6 +74,12 @@ def _wait_email_code(imap: imaplib.IMAP4_SSL, count: int, min_t: datetime | None
     return None
 
 
+def _check_inbox(imap: imaplib.IMAP4_SSL, min_t: datetime | None) -> str | None:
+    _, rep = imap.select("INBOX")
+    msg_count = int(rep[0].decode("utf-8")) if len(rep) > 0 and rep[0] is not None else 0
+    return _wait_email_code(imap, msg_count, min_t)
+
+
 async def imap_get_email_code(
     imap: imaplib.IMAP4_SSL, email: str, min_t: datetime | None = None
 ) -> str:
@@ -81,9 +87,7 @@ async def imap_get_email_code(
         logger.info(f"Waiting for confirmation code for {email}...")
         start_time = time.time()
         while True:
-            _, rep = imap.select("INBOX")
-            msg_count = int(rep[0].decode("utf-8")) if len(rep) > 0 and rep[0] is not None else 0
-            code = _wait_email_code(imap, msg_count, min_t)
+            code = await asyncio.to_thread(_check_inbox, imap, min_t)
             if code is not None:
                 return code
 
@@ -97,15 +101,18 @@ async def imap_get_email_code(
         raise e
 
 
-async def imap_login(email: str, password: str):
-    domain = _get_imap_domain(email)
+def _imap_connect(domain: str, email: str, password: str):
     imap = imaplib.IMAP4_SSL(domain)
+    imap.login(email, password)
+    imap.select("INBOX", readonly=True)
+    return imap
 
+
+async def imap_login(email: str, password: str):
+    # imaplib is blocking, so run in thread to not stall other logins (see login_all)
+    domain = _get_imap_domain(email)
     try:
-        imap.login(email, password)
-        imap.select("INBOX", readonly=True)
+        return await asyncio.to_thread(_imap_connect, domain, email, password)
     except imaplib.IMAP4.error as e:
         logger.error(f"Error logging into {email} on {domain}: {e}")
         raise EmailLoginError() from e
-
-    return imap
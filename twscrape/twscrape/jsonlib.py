@@ -0,0 +1,108 @@
+import json
+import os
+import re
+from typing import Any, Callable
+
+from .logger import logger
+
+# JSON backend for responses decoding & encoding of params, accounts fields and models output.
+# `orjson` / `msgspec` used when installed (pip install twscrape[fastjson]), else stdlib `json`.
+# Can be selected with `TWS_JSON` env: `auto` (default), `orjson`, `msgspec`, `json`.
+# Output is same as stdlib for all backends (separators, ascii escaping), so can be switched.
+# orjson used for compact output only, as it has no `", "` separators; fastest without ascii
+# escaping (`ascii=False`, eg. `Tweet.json(compact=True)`). Floats in exponent form written as
+# `1e16` (stdlib: `1e+16`).
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _select(name: str) -> str:
+    name = name.strip().lower() or "auto"
+    names = BACKENDS if name == "auto" else (name, "json")
+    if names[0] not in BACKENDS:
+        logger.warning(f"Unknown TWS_JSON value: {name}, expected one of: auto, {BACKENDS}")
+        names = BACKENDS
+
+    for x in names:
+        try:
+            __import__(x)
+            return x
+        except ImportError:
+            if name != "auto":
+                logger.warning(f"TWS_JSON={name}, but `{name}` package not installed, using json")
+
+    return "json"
+
+
+BACKEND = _select(os.getenv("TWS_JSON", "auto"))
+
+
+def _json_loads(data: str | bytes) -> Any:
+    return json.loads(data)
+
+
+def _json_dumps(
+    obj: Any, default: Callable[[Any], Any] | None = None, compact=False, ascii=True
+) -> str:
+    seps = (",", ":") if compact else None
+    return json.dumps(obj, default=default, separators=seps, ensure_ascii=ascii)
+
+
+_NON_ASCII = re.compile("[\x7f-\U0010ffff]")  # control chars already escaped by orjson
+
+
+def _escape_char(m: re.Match) -> str:
+    # same as `json.dumps(ensure_ascii=True)`: \uXXXX, surrogate pair outside of BMP
+    c = ord(m.group())
+    if c < 0x10000:
+        return f"\\u{c:04x}"
+    c -= 0x10000
+    return f"\\u{0xD800 | (c >> 10):04x}\\u{0xDC00 | (c & 0x3FF):04x}"
+
+
+def _orjson():
+    import orjson
+
+    # datetime passed to `default` to keep stdlib format (eg. `str(dt)` for models output)
+    opts = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(
+        obj: Any, default: Callable[[Any], Any] | None = None, compact=False, ascii=True
+    ) -> str:
+        if not compact:  # orjson has no `", "` / `": "` separators
+            return _json_dumps(obj, default=default, ascii=ascii)
+
+        try:
+            res = orjson.dumps(obj, default=default, option=opts).decode()
+        except TypeError:  # eg. int over 64 bit
+            return _json_dumps(obj, default=default, compact=compact, ascii=ascii)
+
+        return _NON_ASCII.sub(_escape_char, res) if ascii and not res.isascii() else res
+
+    return orjson.loads, dumps
+
+
+def _msgspec():
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+
+    def loads(data: str | bytes) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:  # same error type as other backends
+            raise json.JSONDecodeError(str(e), data if isinstance(data, str) else "", 0) from e
+
+    # msgspec encodes datetime natively in other format than stdlib, so only used for decoding
+    return loads, _json_dumps
+
+
+def get_backend(name: str):
+    if name == "orjson":
+        return _orjson()
+    if name == "msgspec":
+        return _msgspec()
+    return _json_loads, _json_dumps
+
+
+loads, dumps = get_backend(BACKEND)
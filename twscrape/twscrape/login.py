@@ -18,6 +18,8 @@ LOGIN_URL = "https://api.x.com/1.1/onboarding/task.json"
 class LoginConfig:
     email_first: bool = False
     manual: bool = False
+    concurrency: int = 1  # parallel logins in `AccountsPool.login_all`
+    per_proxy: int = 0  # parallel logins using same proxy (or direct connection), 0 - no limit
 
 
 @dataclass
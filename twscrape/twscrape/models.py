@@ -1,4 +1,3 @@
-import email.utils
 import json
 import os
 import random
@@ -6,26 +5,32 @@ import re
 import string
 import sys
 import traceback
+from collections import OrderedDict
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from typing import Generator, Optional, Union
+from typing import Any, Callable, Generator, Optional, Union
 
 import httpx
 
+from . import jsonlib
+from .dedupe import SeenIds
 from .logger import logger
-from .utils import find_item, get_or, int_or, to_old_rep, utc
+from .utils import find_item, get_or, int_or, parse_date, rep_json, to_old_rep, utc
 
 
-@dataclass
+# models are slotted (no per-instance `__dict__`), so big batches of tweets take less memory
+@dataclass(slots=True)
 class JSONTrait:
     def dict(self):
         return asdict(self)
 
-    def json(self):
-        return json.dumps(self.dict(), default=str)
+    def json(self, compact=False):
+        # compact: without spaces & non-ascii chars not escaped, encoded with fast backend when
+        # installed (see `jsonlib`); default output is same as `json.dumps(doc, default=str)`
+        return jsonlib.dumps(self.dict(), default=str, compact=compact, ascii=not compact)
 
 
-@dataclass
+@dataclass(slots=True)
 class Coordinates(JSONTrait):
     longitude: float
     latitude: float
@@ -41,7 +46,7 @@ class Coordinates(JSONTrait):
         return None
 
 
-@dataclass
+@dataclass(slots=True)
 class Place(JSONTrait):
     id: str
     fullName: str
@@ -62,7 +67,7 @@ class Place(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class TextLink(JSONTrait):
     url: str
     text: str | None
@@ -80,7 +85,7 @@ class TextLink(JSONTrait):
         return TextLink(url=url1, text=text, tcourl=url2)
 
 
-@dataclass
+@dataclass(slots=True)
 class UserRef(JSONTrait):
     id: int
     id_str: str
@@ -98,7 +103,7 @@ class UserRef(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class User(JSONTrait):
     id: int
     id_str: str
@@ -137,7 +142,7 @@ class User(JSONTrait):
             username=obj["screen_name"],
             displayname=obj["name"],
             rawDescription=obj["description"],
-            created=email.utils.parsedate_to_datetime(obj["created_at"]),
+            created=parse_date(obj["created_at"]),
             followersCount=obj["followers_count"],
             friendsCount=obj["friends_count"],
             statusesCount=obj["statuses_count"],
@@ -156,7 +161,7 @@ class User(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Tweet(JSONTrait):
     id: int
     id_str: str
@@ -198,72 +203,182 @@ class Tweet(JSONTrait):
 
     @staticmethod
     def parse(obj: dict, res: dict):
-        tw_usr = User.parse(res["users"][obj["user_id_str"]])
+        return LazyTweet(obj, res).to_tweet()
+
+
+class LazyTweet:
+    # Tweet view over raw response object: each field parsed on first access and stored in slot
+    # (so `__getattr__` called once per field), consumers of few fields (eg. `id`, `date`, `user`,
+    # `rawContent`) skip media, cards, links, nested tweets parsing. Nested tweets are lazy too.
+    # `to_tweet()` gives full `Tweet`. Errors of field parsing are raised on access of this field.
+    __slots__ = (
+        "_obj",
+        "_res",
+        "_rt_obj",
+        "_qt_obj",
+        "_cached",
+        *[x for x in Tweet.__slots__ if x != "_type"],
+    )
 
-        rt_id_path = [
-            "retweeted_status_id_str",
-            "retweeted_status_result.result.rest_id",
-            "retweeted_status_result.result.tweet.rest_id",
-        ]
-
-        qt_id_path = [
-            "quoted_status_id_str",
-            "quoted_status_result.result.rest_id",
-            "quoted_status_result.result.tweet.rest_id",
-        ]
-
-        rt_obj = get_or(res, f"tweets.{_first(obj, rt_id_path)}")
-        qt_obj = get_or(res, f"tweets.{_first(obj, qt_id_path)}")
+    id: int
+    id_str: str
+    url: str
+    date: datetime
+    user: User
+    lang: str
+    rawContent: str
+    replyCount: int
+    retweetCount: int
+    likeCount: int
+    quoteCount: int
+    bookmarkedCount: int
+    conversationId: int
+    conversationIdStr: str
+    hashtags: list[str]
+    cashtags: list[str]
+    mentionedUsers: list[UserRef]
+    links: list[TextLink]
+    media: "Media"
+    viewCount: int | None
+    retweetedTweet: Optional["LazyTweet"]
+    quotedTweet: Optional["LazyTweet"]
+    place: Optional[Place]
+    coordinates: Optional[Coordinates]
+    inReplyToTweetId: int | None
+    inReplyToTweetIdStr: str | None
+    inReplyToUser: UserRef | None
+    source: str | None
+    sourceUrl: str | None
+    sourceLabel: str | None
+    card: Union[None, "SummaryCard", "PollCard", "BroadcastCard", "AudiospaceCard"]
+    possibly_sensitive: bool | None
+
+    def __init__(self, obj: dict, res: dict):
+        self._obj, self._res = obj, res
+        self._cached: set[str] = set()  # fields already stored in slots
+
+    def __getattr__(self, name: str):
+        fn = _TWEET_FIELDS.get(name)
+        if fn is None:
+            raise AttributeError(f"'LazyTweet' object has no attribute '{name}'")
+
+        val = fn(self)
+        setattr(self, name, val)
+        self._cached.add(name)
+        return val
+
+    def __repr__(self):
+        return f"LazyTweet(id={self.id!r}, url={self.url!r})"
 
-        url = f"https://x.com/{tw_usr.username}/status/{obj['id_str']}"
-        doc = Tweet(
-            id=int(obj["id_str"]),
-            id_str=obj["id_str"],
-            url=url,
-            date=email.utils.parsedate_to_datetime(obj["created_at"]),
-            user=tw_usr,
-            lang=obj["lang"],
-            rawContent=get_or(obj, "note_tweet.note_tweet_results.result.text", obj["full_text"]),
-            replyCount=obj["reply_count"],
-            retweetCount=obj["retweet_count"],
-            likeCount=obj["favorite_count"],
-            quoteCount=obj["quote_count"],
-            bookmarkedCount=get_or(obj, "bookmark_count", 0),
-            conversationId=int(obj["conversation_id_str"]),
-            conversationIdStr=obj["conversation_id_str"],
-            hashtags=[x["text"] for x in get_or(obj, "entities.hashtags", [])],
-            cashtags=[x["text"] for x in get_or(obj, "entities.symbols", [])],
-            mentionedUsers=[UserRef.parse(x) for x in get_or(obj, "entities.user_mentions", [])],
-            links=_parse_links(
-                obj, ["entities.urls", "note_tweet.note_tweet_results.result.entity_set.urls"]
-            ),
-            viewCount=_get_views(obj, rt_obj or {}),
-            retweetedTweet=Tweet.parse(rt_obj, res) if rt_obj else None,
-            quotedTweet=Tweet.parse(qt_obj, res) if qt_obj else None,
-            place=Place.parse(obj["place"]) if obj.get("place") else None,
-            coordinates=Coordinates.parse(obj),
-            inReplyToTweetId=int_or(obj, "in_reply_to_status_id_str"),
-            inReplyToTweetIdStr=get_or(obj, "in_reply_to_status_id_str"),
-            inReplyToUser=_get_reply_user(obj, res),
-            source=obj.get("source", None),
-            sourceUrl=_get_source_url(obj),
-            sourceLabel=_get_source_label(obj),
-            media=Media.parse(obj),
-            card=_parse_card(obj, url),
-            possibly_sensitive=obj.get("possibly_sensitive", None),
-        )
+    @staticmethod
+    def parse(obj: dict, res: dict):
+        doc = LazyTweet(obj, res)
+        _ = doc.id, doc.user  # fail early on broken item, like `Tweet.parse`
+        return doc
 
-        # issue #42 – restore full rt text
-        rt = doc.retweetedTweet
-        if rt is not None and rt.user is not None and doc.rawContent.endswith("…"):
-            rt_msg = f"RT @{rt.user.username}: {rt.rawContent}"
-            if doc.rawContent != rt_msg:
-                doc.rawContent = rt_msg
+    def to_tweet(self) -> Tweet:
+        # in table order, so fields used by others are computed (and stored) before; fields
+        # already accessed are taken from slots
+        kv, cached = {}, self._cached
+        for k, fn in _TWEET_FIELDS.items():
+            if k in cached:
+                kv[k] = getattr(self, k)
+                continue
 
-        return doc
+            kv[k] = val = fn(self)
+            if k in _TWEET_DEPS:
+                setattr(self, k, val)
+                cached.add(k)
 
+        del kv["_rt_obj"], kv["_qt_obj"]
+        for k in ("retweetedTweet", "quotedTweet"):
+            kv[k] = kv[k].to_tweet() if kv[k] is not None else None
+        return Tweet(**kv)
 
-@dataclass
+    def dict(self):
+        return self.to_tweet().dict()
+
+    def json(self, compact=False):
+        return self.to_tweet().json(compact)
+
+
+_RT_ID_PATH = [
+    "retweeted_status_id_str",
+    "retweeted_status_result.result.rest_id",
+    "retweeted_status_result.result.tweet.rest_id",
+]
+
+_QT_ID_PATH = [
+    "quoted_status_id_str",
+    "quoted_status_result.result.rest_id",
+    "quoted_status_result.result.tweet.rest_id",
+]
+
+
+def _tw_raw_content(t: LazyTweet) -> str:
+    obj = t._obj
+    text = get_or(obj, "note_tweet.note_tweet_results.result.text", obj["full_text"])
+
+    # issue #42 – restore full rt text
+    rt = t.retweetedTweet if text.endswith("…") else None
+    if rt is not None and rt.user is not None:
+        text = f"RT @{rt.user.username}: {rt.rawContent}"
+
+    return text
+
+
+_TWEET_DEPS = {
+    "_rt_obj",
+    "_qt_obj",
+    "user",
+    "url",
+    "retweetedTweet",
+}  # fields read by other fields
+
+# field name -> parse function, used by `LazyTweet` and `Tweet.parse` (`_` prefixed are internal)
+_TWEET_FIELDS: dict[str, Callable[[LazyTweet], Any]] = {
+    "_rt_obj": lambda t: get_or(t._res, f"tweets.{_first(t._obj, _RT_ID_PATH)}"),
+    "_qt_obj": lambda t: get_or(t._res, f"tweets.{_first(t._obj, _QT_ID_PATH)}"),
+    "id": lambda t: int(t._obj["id_str"]),
+    "id_str": lambda t: t._obj["id_str"],
+    "user": lambda t: _get_user(t._res, t._obj["user_id_str"]),
+    "url": lambda t: f"https://x.com/{t.user.username}/status/{t._obj['id_str']}",
+    "date": lambda t: parse_date(t._obj["created_at"]),
+    "lang": lambda t: t._obj["lang"],
+    "replyCount": lambda t: t._obj["reply_count"],
+    "retweetCount": lambda t: t._obj["retweet_count"],
+    "likeCount": lambda t: t._obj["favorite_count"],
+    "quoteCount": lambda t: t._obj["quote_count"],
+    "bookmarkedCount": lambda t: get_or(t._obj, "bookmark_count", 0),
+    "conversationId": lambda t: int(t._obj["conversation_id_str"]),
+    "conversationIdStr": lambda t: t._obj["conversation_id_str"],
+    "hashtags": lambda t: [x["text"] for x in get_or(t._obj, "entities.hashtags", [])],
+    "cashtags": lambda t: [x["text"] for x in get_or(t._obj, "entities.symbols", [])],
+    "mentionedUsers": lambda t: [
+        UserRef.parse(x) for x in get_or(t._obj, "entities.user_mentions", [])
+    ],
+    "links": lambda t: _parse_links(
+        t._obj, ["entities.urls", "note_tweet.note_tweet_results.result.entity_set.urls"]
+    ),
+    "media": lambda t: Media.parse(t._obj),
+    "viewCount": lambda t: _get_views(t._obj, t._rt_obj or {}),
+    "retweetedTweet": lambda t: LazyTweet(t._rt_obj, t._res) if t._rt_obj else None,
+    "quotedTweet": lambda t: LazyTweet(t._qt_obj, t._res) if t._qt_obj else None,
+    "rawContent": _tw_raw_content,
+    "place": lambda t: Place.parse(t._obj["place"]) if t._obj.get("place") else None,
+    "coordinates": lambda t: Coordinates.parse(t._obj),
+    "inReplyToTweetId": lambda t: int_or(t._obj, "in_reply_to_status_id_str"),
+    "inReplyToTweetIdStr": lambda t: get_or(t._obj, "in_reply_to_status_id_str"),
+    "inReplyToUser": lambda t: _get_reply_user(t._obj, t._res),
+    "source": lambda t: t._obj.get("source", None),
+    "sourceUrl": lambda t: _get_source_url(t._obj),
+    "sourceLabel": lambda t: _get_source_label(t._obj),
+    "card": lambda t: _parse_card(t._obj, t.url),
+    "possibly_sensitive": lambda t: t._obj.get("possibly_sensitive", None),
+}
+
+
+@dataclass(slots=True)
 class MediaPhoto(JSONTrait):
     url: str
 
@@ -272,7 +387,7 @@ class MediaPhoto(JSONTrait):
         return MediaPhoto(url=obj["media_url_https"])
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaVideo(JSONTrait):
     thumbnailUrl: str
     variants: list["MediaVideoVariant"]
@@ -291,7 +406,7 @@ class MediaVideo(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaAnimated(JSONTrait):
     thumbnailUrl: str
     videoUrl: str
@@ -307,7 +422,7 @@ class MediaAnimated(JSONTrait):
             return None
 
 
-@dataclass
+@dataclass(slots=True)
 class MediaVideoVariant(JSONTrait):
     contentType: str
     bitrate: int
@@ -322,7 +437,7 @@ class MediaVideoVariant(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Media(JSONTrait):
     photos: list[MediaPhoto] = field(default_factory=list)
     videos: list[MediaVideo] = field(default_factory=list)
@@ -355,12 +470,12 @@ class Media(JSONTrait):
         return Media(photos=photos, videos=videos, animated=animated)
 
 
-@dataclass
+@dataclass(slots=True)
 class Card(JSONTrait):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class SummaryCard(Card):
     title: str
     description: str
@@ -371,20 +486,20 @@ class SummaryCard(Card):
     _type: str = "summary"
 
 
-@dataclass
+@dataclass(slots=True)
 class PollOption(JSONTrait):
     label: str
     votesCount: int
 
 
-@dataclass
+@dataclass(slots=True)
 class PollCard(Card):
     options: list[PollOption]
     finished: bool
     _type: str = "poll"
 
 
-@dataclass
+@dataclass(slots=True)
 class BroadcastCard(Card):
     title: str
     url: str
@@ -392,19 +507,19 @@ class BroadcastCard(Card):
     _type: str = "broadcast"
 
 
-@dataclass
+@dataclass(slots=True)
 class AudiospaceCard(Card):
     url: str
     _type: str = "audiospace"
 
 
-@dataclass
+@dataclass(slots=True)
 class RequestParam(JSONTrait):
     key: str
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class TrendUrl(JSONTrait):
     url: str
     urlType: str
@@ -422,7 +537,7 @@ class TrendUrl(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class TrendMetadata(JSONTrait):
     domain_context: str
     meta_description: str
@@ -437,7 +552,7 @@ class TrendMetadata(JSONTrait):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class GroupedTrend(JSONTrait):
     name: str
     url: TrendUrl
@@ -447,7 +562,7 @@ class GroupedTrend(JSONTrait):
         return GroupedTrend(name=obj["name"], url=TrendUrl.parse(obj["url"]))
 
 
-@dataclass
+@dataclass(slots=True)
 class Trend(JSONTrait):
     id: Optional[str]
     rank: Optional[str | int]
@@ -619,6 +734,44 @@ def _parse_card(obj: dict, url: str):
 
 # internal helpers
 
+# parsed users shared by all tweets of same author (incl. retweets & quotes): once per response,
+# and between responses with LRU of `TWS_USER_CACHE` size (0 to disable); user from LRU reused
+# only when all its source fields are same. Shared objects, so should not be modified in place.
+USER_CACHE_SIZE = int(os.getenv("TWS_USER_CACHE", "0"))
+
+_USER_FIELDS = [
+    *("screen_name", "name", "description", "created_at", "location", "entities"),
+    *("followers_count", "friends_count", "statuses_count", "favourites_count"),
+    *("listed_count", "media_count", "profile_image_url_https", "profile_banner_url"),
+    *("verified", "is_blue_verified", "verified_type", "protected", "pinned_tweet_ids_str"),
+]
+
+_users_lru: OrderedDict[str, tuple[list, User]] = OrderedDict()
+
+
+def _get_user(res: dict, user_id: str) -> User:
+    parsed: dict[str, User] = res.setdefault("parsed_users", {})
+    if user_id in parsed:
+        return parsed[user_id]
+
+    obj = res["users"][user_id]
+    if USER_CACHE_SIZE <= 0:
+        parsed[user_id] = User.parse(obj)
+        return parsed[user_id]
+
+    stamp = [obj.get(k) for k in _USER_FIELDS]
+    item = _users_lru.get(user_id)
+    if item is not None and item[0] == stamp:
+        _users_lru.move_to_end(user_id)
+    else:
+        item = _users_lru[user_id] = (stamp, User.parse(obj))
+        _users_lru.move_to_end(user_id)
+        while len(_users_lru) > USER_CACHE_SIZE:
+            _users_lru.popitem(last=False)
+
+    parsed[user_id] = item[1]
+    return item[1]
+
 
 def _get_reply_user(tw_obj: dict, res: dict):
     user_id = tw_obj.get("in_reply_to_user_id_str", None)
@@ -697,37 +850,43 @@ def _write_dump(kind: str, e: Exception, x: dict, obj: dict):
     logger.error(f"Failed to parse response of {kind}, writing dump to {dumpfile}")
 
 
-def _parse_items(rep: httpx.Response, kind: str, limit: int = -1):
+def _parse_items(rep: httpx.Response, kind: str, limit: int = -1, seen: SeenIds | None = None):
     if kind == "user":
         Cls, key = User, "users"
     elif kind == "tweet":
         Cls, key = Tweet, "tweets"
     elif kind == "trends":
         Cls, key = Trend, "trends"
+    elif kind == "lazy_tweet":
+        Cls, key = LazyTweet, "tweets"
     else:
         raise ValueError(f"Invalid kind: {kind}")
 
-    # check for dict, because httpx.Response can be mocked in tests with different type
-    res = rep if isinstance(rep, dict) else rep.json()
-    obj = to_old_rep(res)
+    obj = to_old_rep(rep_json(rep))
 
     ids = set()
-    for x in obj[key].values():
+    for k, x in obj[key].items():
         if limit != -1 and len(ids) >= limit:
-            # todo: move somewhere in configuration like force_limit
+            # API passes limit only with `strict_limit`, otherwise whole pages are returned
             # https://github.com/vladkens/twscrape/issues/26#issuecomment-1656875132
-            # break
-            pass
+            break
+
+        if seen is not None and k in seen:  # yielded on previous page
+            seen.count("dropped")
+            continue
 
         try:
             tmp = Cls.parse(x, obj)
-            if tmp.id not in ids:
-                ids.add(tmp.id)
-                yield tmp
         except Exception as e:
             _write_dump(kind, e, x, obj)
             continue
 
+        if seen is not None:  # only parsed, so broken item can be yielded from other page
+            seen.add(k)
+        if tmp.id not in ids:
+            ids.add(tmp.id)
+            yield tmp
+
 
 # public helpers
 
@@ -766,13 +925,25 @@ def parse_trend(rep: httpx.Response) -> Trend | None:
         return None
 
 
-def parse_tweets(rep: httpx.Response, limit: int = -1) -> Generator[Tweet, None, None]:
-    return _parse_items(rep, "tweet", limit)  # type: ignore
+def parse_tweets(
+    rep: httpx.Response, limit: int = -1, seen: SeenIds | None = None
+) -> Generator[Tweet, None, None]:
+    return _parse_items(rep, "tweet", limit, seen)  # type: ignore
+
+
+def parse_tweets_lazy(
+    rep: httpx.Response, limit: int = -1, seen: SeenIds | None = None
+) -> Generator[LazyTweet, None, None]:
+    return _parse_items(rep, "lazy_tweet", limit, seen)  # type: ignore
 
 
-def parse_users(rep: httpx.Response, limit: int = -1) -> Generator[User, None, None]:
-    return _parse_items(rep, "user", limit)  # type: ignore
+def parse_users(
+    rep: httpx.Response, limit: int = -1, seen: SeenIds | None = None
+) -> Generator[User, None, None]:
+    return _parse_items(rep, "user", limit, seen)  # type: ignore
 
 
-def parse_trends(rep: httpx.Response, limit: int = -1) -> Generator[Trend, None, None]:
-    return _parse_items(rep, kind="trends", limit=limit)  # type: ignore
+def parse_trends(
+    rep: httpx.Response, limit: int = -1, seen: SeenIds | None = None
+) -> Generator[Trend, None, None]:
+    return _parse_items(rep, kind="trends", limit=limit, seen=seen)  # type: ignore
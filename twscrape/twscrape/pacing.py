@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from .utils import get_env_bool
+
+# Client-side pacing: requests of account to queue are spread over rate limit window (token
+# bucket refilled with `remaining / (reset - now)` rate from last response headers), instead
+# of burst till `remaining=0`. Waits longer than `max_wait` are not done on same account,
+# it locked for this time and request goes to other account.
+PACING = get_env_bool("TWS_PACING")
+PACING_BURST = float(os.getenv("TWS_PACING_BURST", "5"))  # requests allowed without wait
+PACING_MAX_WAIT = float(os.getenv("TWS_PACING_MAX_WAIT", "10"))  # seconds
+
+
+class TokenBucket:
+    def __init__(self, burst: float, now: float):
+        self.burst = burst
+        self.tokens = burst
+        self.rate = 0.0  # tokens per second
+        self.reset = 0.0  # end of rate limit window, no pacing after it till next update
+        self.ts = now
+
+    def update(self, remaining: int, reset: float, now: float):
+        # response with `remaining=0` handled as rate limited and request retried, so it kept
+        usable = max(remaining - 1, 0)
+        self._refill(now)
+        self.rate = usable / max(reset - now, 1)
+        self.tokens = min(self.tokens, usable)
+        self.reset = reset
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def reserve(self, now: float) -> float:
+        # take token (can go negative, so concurrent callers queue up), returns wait time
+        if now >= self.reset:  # window not known yet or ended, so full budget
+            self.tokens, self.ts = self.burst - 1, now
+            return 0.0
+
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+
+        wait = -self.tokens / self.rate if self.rate > 0 else self.reset - now
+        return min(wait, self.reset - now)
+
+    def cancel(self):
+        self.tokens += 1
+
+
+class Pacer:
+    def __init__(
+        self,
+        burst=PACING_BURST,
+        max_wait=PACING_MAX_WAIT,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        self.burst = burst
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._items: dict[tuple[str, str], TokenBucket] = {}  # (username, queue) -> bucket
+
+    def _bucket(self, username: str, queue: str):
+        key = (username, queue)
+        if key not in self._items:
+            self._items[key] = TokenBucket(self.burst, self._clock())
+        return self._items[key]
+
+    def update(self, username: str, queue: str, remaining: int, reset: float):
+        self._bucket(username, queue).update(remaining, reset, self._clock())
+
+    async def wait(self, username: str, queue: str) -> float:
+        # returns 0 when request can be sent, else time to wait above `max_wait` (token not taken)
+        bucket = self._bucket(username, queue)
+        wait = bucket.reserve(self._clock())
+        if wait > self.max_wait:
+            bucket.cancel()
+            return wait
+
+        if wait > 0:
+            await self._sleep(wait)
+        return 0.0
+
+
+pacer = Pacer()
@@ -1,6 +1,11 @@
 import asyncio
+import getpass
 import json
+import math
 import os
+import stat
+import tempfile
+import time
 from typing import Any
 from urllib.parse import urlparse
 
@@ -9,7 +14,12 @@ from httpx import AsyncClient, Response
 
 from .accounts_pool import Account, AccountsPool
 from .logger import logger
-from .utils import utc
+from .pacing import PACING, pacer
+from .retry import Breakers, CircuitOpenError, RetryPolicy
+from .retry import breakers as default_breakers
+from .retry import retry_policies as default_retry_policies
+from .transports import HTTP2, transports
+from .utils import rep_json, utc
 from .xclid import XClIdGen
 
 ReqParams = dict[str, str | int] | None
@@ -22,19 +32,70 @@ class HandledError(Exception): ...
 class AbortReqError(Exception): ...
 
 
+def _xclid_cache_default():
+    # per-user dir in temp, as shared /tmp is writable by everyone
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"twscrape-{user}", "xclid.json")
+
+
+# x-client-transaction-id keys are taken from public page (not from account session), so one
+# generator shared by all accounts; saved to disk for fast start of next process
+XCLID_CACHE = os.getenv("TWS_XCLID_CACHE", _xclid_cache_default())  # "" to disable
+XCLID_TTL = int(os.getenv("TWS_XCLID_TTL", "3600"))  # seconds, then refreshed in background
+XCLID_RETRY = 60.0  # seconds after failed refresh before next one (stale keys used meanwhile)
+
+
 class XClIdGenStore:
-    items: dict[str, XClIdGen] = {}  # username -> XClIdGen
+    gen: XClIdGen | None = None
+    created_at = 0.0
+    failed_at = 0.0
+    _task: asyncio.Task | None = None  # creation in progress, awaited by all callers
+    _loop: asyncio.AbstractEventLoop | None = None
 
     @classmethod
     async def get(cls, username: str, fresh=False) -> XClIdGen:
-        if username in cls.items and not fresh:
-            return cls.items[username]
+        # `fresh` – keys rejected (404), new generator created unless just refreshed
+        loop = asyncio.get_running_loop()
+        if cls._loop is not loop:  # task bound to event loop
+            cls._loop, cls._task = loop, None
+
+        if cls.gen is None and not fresh:
+            cls._load()
+
+        now = time.time()
+        age, backoff = now - cls.created_at, now - cls.failed_at < XCLID_RETRY
+        if cls.gen is not None and not (fresh and age > 5 and not backoff):
+            if age > XCLID_TTL and not backoff:  # stale keys still used while new ones loading
+                cls._refresh()
+            return cls.gen
+
+        if backoff and (cls._task is None or cls._task.done()):
+            retry_in = cls.failed_at + XCLID_RETRY - now
+            raise AbortReqError(f"XClIdGen not available, next try in {retry_in:.0f}s")
+
+        return await asyncio.shield(cls._refresh())
+
+    @classmethod
+    def _refresh(cls) -> asyncio.Task:
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._create())
+            cls._task.add_done_callback(cls._done)
+        return cls._task
 
+    @classmethod
+    def _done(cls, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            cls.failed_at = time.time()  # so each request does not start new refresh
+            logger.warning(f"Failed to refresh XClIdGen: {task.exception()}")
+
+    @classmethod
+    async def _create(cls) -> XClIdGen:
         tries = 0
         while tries < 3:
             try:
                 clid_gen = await XClIdGen.create()
-                cls.items[username] = clid_gen
+                cls.gen, cls.created_at = clid_gen, time.time()
+                cls._save()
                 return clid_gen
             except httpx.HTTPStatusError:
                 tries += 1
@@ -44,15 +105,76 @@ class XClIdGenStore:
             "Faield to create XClIdGen. See: https://github.com/vladkens/twscrape/issues/248"
         )
 
+    @classmethod
+    def _load(cls):
+        try:
+            with open(XCLID_CACHE) as fp:
+                # file of other user can be planted with keys that break requests
+                if hasattr(os, "getuid") and os.fstat(fp.fileno()).st_uid != os.getuid():
+                    logger.warning(f"XClIdGen cache {XCLID_CACHE} not owned by user, ignored")
+                    return
+                obj = json.load(fp)
+            cls.gen = XClIdGen(obj["vk_bytes"], obj["anim_key"])
+            cls.created_at = float(obj["created_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    @classmethod
+    def _save(cls):
+        if not XCLID_CACHE or cls.gen is None:
+            return
+
+        obj = {"vk_bytes": cls.gen.vk_bytes, "anim_key": cls.gen.anim_key}
+        obj["created_at"] = cls.created_at
+        dirname = os.path.dirname(XCLID_CACHE) or "."
+        try:
+            os.makedirs(dirname, mode=0o700, exist_ok=True)
+            # shared tempdir: dir can be planted by other user (eg. with symlink to our files)
+            st = os.lstat(dirname)
+            if hasattr(os, "getuid") and (
+                not stat.S_ISDIR(st.st_mode)
+                or st.st_uid != os.getuid()
+                or stat.S_IMODE(st.st_mode) != 0o700
+            ):
+                logger.warning(f"XClIdGen cache dir {dirname} not private to user, not saved")
+                return
+
+            fd, tmp = tempfile.mkstemp(prefix=".xclid.", suffix=".tmp", dir=dirname)  # O_EXCL
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    json.dump(obj, fp)
+                os.replace(tmp, XCLID_CACHE)  # atomic, so other processes read whole file
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            logger.warning(f"Failed to save XClIdGen cache: {e}")
+
 
 class Ctx:
-    def __init__(self, acc: Account, clt: AsyncClient):
+    def __init__(
+        self,
+        acc: Account,
+        clt: AsyncClient,
+        proxy: str | None = None,
+        transport: httpx.AsyncHTTPTransport | None = None,
+        http2=False,
+    ):
         self.req_count = 0
         self.acc = acc
         self.clt = clt
+        self.proxy = proxy
+        self.transport = transport  # borrowed from shared pool
+        self.http2 = http2
+        self.limit: tuple[int, int] | tuple[None, None] = (None, None)  # remaining, reset
 
     async def aclose(self):
-        await self.clt.aclose()
+        if self.transport is None:
+            await self.clt.aclose()
+            return
+
+        # client closing would close shared transport too, so transport returned to pool instead
+        await transports.release(self.acc.username, self.proxy, self.transport, self.http2)
 
     async def req(self, method: str, url: str, params: ReqParams = None) -> Response:
         # if code 404 on first try then generate new x-client-transaction-id and retry
@@ -104,7 +226,7 @@ def dump_rep(rep: Response):
     msg.append("\n")
 
     try:
-        msg.append(json.dumps(rep.json(), indent=2))
+        msg.append(json.dumps(rep_json(rep), indent=2))
     except json.JSONDecodeError:
         msg.append(rep.text)
 
@@ -114,12 +236,27 @@ def dump_rep(rep: Response):
 
 
 class QueueClient:
-    def __init__(self, pool: AccountsPool, queue: str, debug=False, proxy: str | None = None):
+    def __init__(
+        self,
+        pool: AccountsPool,
+        queue: str,
+        debug=False,
+        proxy: str | None = None,
+        http2: bool | None = None,
+        pacing: bool | None = None,
+        breakers: Breakers | None = None,
+        retry_policies: dict[str, RetryPolicy] | None = None,
+    ):
         self.pool = pool
         self.queue = queue
         self.debug = debug
         self.ctx: Ctx | None = None
         self.proxy = proxy
+        self.http2 = HTTP2 if http2 is None else http2
+        self.pacing = PACING if pacing is None else pacing
+        # None - shared by process; policies can be overridden per error class
+        self.breakers = default_breakers if breakers is None else breakers
+        self.retry_policies = {**default_retry_policies, **(retry_policies or {})}
 
     async def __aenter__(self):
         await self._get_ctx()
@@ -141,10 +278,12 @@ class QueueClient:
             return
 
         if reset_at > 0:
-            await self.pool.lock_until(ctx.acc.username, self.queue, reset_at, ctx.req_count)
+            await self.pool.lock_until(
+                ctx.acc.username, self.queue, reset_at, ctx.req_count, *ctx.limit
+            )
             return
 
-        await self.pool.unlock(ctx.acc.username, self.queue, ctx.req_count)
+        await self.pool.unlock(ctx.acc.username, self.queue, ctx.req_count, *ctx.limit)
 
     async def _get_ctx(self):
         if self.ctx:
@@ -154,8 +293,15 @@ class QueueClient:
         if acc is None:
             return None
 
-        clt = acc.make_client(proxy=self.proxy)
-        self.ctx = Ctx(acc, clt)
+        proxy = acc.get_proxy(self.proxy)
+        try:
+            transport = await transports.acquire(acc.username, proxy, self.http2)
+        except BaseException:  # eg. cancelled hedge request, account would stay locked otherwise
+            await asyncio.shield(self.pool.unlock(acc.username, self.queue))
+            raise
+
+        clt = acc.make_client(transport=transport)
+        self.ctx = Ctx(acc, clt, proxy, transport, self.http2)
         return self.ctx
 
     async def _check_rep(self, rep: Response) -> None:
@@ -168,13 +314,17 @@ class QueueClient:
             dump_rep(rep)
 
         try:
-            res = rep.json()
+            res = rep_json(rep)
         except json.JSONDecodeError:
             res: Any = {"_raw": rep.text}
 
         limit_remaining = int(rep.headers.get("x-rate-limit-remaining", -1))
         limit_reset = int(rep.headers.get("x-rate-limit-reset", -1))
         # limit_max = int(rep.headers.get("x-rate-limit-limit", -1))
+        if self.ctx is not None and limit_remaining >= 0 and limit_reset > 0:
+            self.ctx.limit = (limit_remaining, limit_reset)  # saved to pool on ctx close
+            if self.pacing:
+                pacer.update(self.ctx.acc.username, self.queue, limit_remaining, limit_reset)
 
         err_msg = "OK"
         if "errors" in res:
@@ -243,45 +393,79 @@ class QueueClient:
             rep.raise_for_status()
         except httpx.HTTPStatusError:
             logger.error(f"Unhandled API response code: {log_msg}")
-            await self._close_ctx(utc.ts() + 60 * 15)  # 15 minutes
+            # 5xx – X side failing, not account; counted by queue breaker, so account not locked
+            reset_at = -1 if rep.status_code >= 500 else utc.ts() + 60 * 15  # 15 minutes
+            await self._close_ctx(reset_at)
             raise HandledError()
 
     async def get(self, url: str, params: ReqParams = None) -> Response | None:
         return await self.req("GET", url, params=params)
 
     async def req(self, method: str, url: str, params: ReqParams = None) -> Response | None:
-        unknown_retry, connection_retry = 0, 0
+        retries: dict[str, int] = {}  # error class -> retries in row
+        skipped: set[str] = set()  # proxies with open breaker, accounts of which were switched
+        shared = self.proxy if self.proxy is not None else os.getenv("TWS_PROXY")
+        if shared is not None:  # same proxy for all accounts, no switching
+            skipped.add(self.breakers.proxy(shared).key)
 
         while True:
+            # X side failing for this queue – requests not sent (and accounts not locked)
+            queue_cb = self.breakers.queue(self.queue)
+            if not queue_cb.allow():
+                raise CircuitOpenError(queue_cb.key, queue_cb.retry_in())
+
             ctx = await self._get_ctx()  # not need to close client, class implements __aexit__
             if ctx is None:
                 return None
 
+            if self.pacing:
+                wait = await pacer.wait(ctx.acc.username, self.queue)
+                if wait > 0:  # budget of account is used too fast, so other one taken
+                    await self._close_ctx(math.ceil(utc.ts() + wait))
+                    continue
+
+            # proxy failing – accounts with other proxies used meanwhile; when next account has
+            # same proxy (or it's shared by all), cooldown is waited instead of locking all pool
+            proxy_cb = self.breakers.proxy(ctx.proxy)
+            if not proxy_cb.allow():
+                if proxy_cb.key in skipped:
+                    await asyncio.sleep(proxy_cb.retry_in())
+                else:
+                    skipped.add(proxy_cb.key)
+                    await self._close_ctx(math.ceil(utc.ts() + proxy_cb.retry_in()))
+                continue
+
             try:
                 rep = await ctx.req(method, url, params=params)
+                proxy_cb.success()
+                if rep.status_code >= 500:
+                    queue_cb.failure()
+                else:
+                    queue_cb.success()
+
                 setattr(rep, "__username", ctx.acc.username)
                 await self._check_rep(rep)
 
                 ctx.req_count += 1  # count only successful
-                unknown_retry, connection_retry = 0, 0
                 return rep
             except AbortReqError:
                 # abort all queries
                 return
-            except HandledError:
+            except HandledError as e:
                 # retry with new account
-                continue
-            except (httpx.ReadTimeout, httpx.ProxyError):
+                kind, err = "handled", e
+            except (httpx.ReadTimeout, httpx.ProxyError) as e:
                 # http transport failed, just retry with same account
-                continue
+                kind, err = "network", e
+                proxy_cb.failure()
             except (httpx.ConnectError, httpx.ConnectTimeout) as e:
                 # if proxy missconfigured or ???
-                connection_retry += 1
-                if connection_retry >= 3:
-                    raise e
+                kind, err = "connect", e
+                proxy_cb.failure()
             except Exception as e:
-                unknown_retry += 1
-                if unknown_retry >= 3:
+                kind, err = "unknown", e
+                attempts = self.retry_policies[kind].attempts
+                if attempts > 0 and retries.get(kind, 0) + 1 >= attempts:
                     msg = [
                         "Unknown error. Account timeouted for 15 minutes.",
                         "Create issue please: https://github.com/vladkens/twscrape/issues",
@@ -290,3 +474,12 @@ class QueueClient:
 
                     logger.warning(" ".join(msg))
                     await self._close_ctx(utc.ts() + 60 * 15)  # 15 minutes
+                    retries[kind] = 0
+                    continue
+
+            retries[kind] = retries.get(kind, 0) + 1
+            policy = self.retry_policies[kind]
+            if policy.attempts > 0 and retries[kind] >= policy.attempts:
+                raise err
+
+            await asyncio.sleep(policy.delay(retries[kind]))
@@ -0,0 +1,121 @@
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import urlparse
+
+from .logger import logger
+
+# Retries of QueueClient requests by error class, delays are exponential with full jitter (random
+# in 0..delay), so many clients are not retrying in sync; counters are reset on success
+RETRY_ATTEMPTS = int(os.getenv("TWS_RETRY_ATTEMPTS", "10"))  # network errors, 0 - unlimited
+RETRY_BACKOFF = float(os.getenv("TWS_RETRY_BACKOFF", "0.5"))  # seconds, first delay
+RETRY_BACKOFF_MAX = float(os.getenv("TWS_RETRY_BACKOFF_MAX", "30"))  # seconds
+
+# Circuit breaker opened after `threshold` failures in row: requests are not sent for `cooldown`
+# seconds, then one probe request allowed (half-open) – success closes breaker, failure opens.
+# Disabled by default (threshold 0), as open queue breaker raises `CircuitOpenError`
+BREAKER_THRESHOLD = int(os.getenv("TWS_BREAKER_THRESHOLD", "0"))
+BREAKER_COOLDOWN = float(os.getenv("TWS_BREAKER_COOLDOWN", "30"))  # seconds
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int  # max retries in row, 0 - unlimited
+    backoff: float
+    backoff_max: float
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+
+
+retry_policies = {
+    # read timeout / proxy error – retried with same account
+    "network": RetryPolicy(RETRY_ATTEMPTS, RETRY_BACKOFF, RETRY_BACKOFF_MAX),
+    # connection failed (eg. proxy misconfigured) – error raised after attempts
+    "connect": RetryPolicy(3, RETRY_BACKOFF, RETRY_BACKOFF_MAX),
+    # account rate limited / banned – retried with other account
+    "handled": RetryPolicy(0, RETRY_BACKOFF / 5, RETRY_BACKOFF_MAX / 3),
+    # unknown error – account locked after attempts
+    "unknown": RetryPolicy(3, RETRY_BACKOFF, RETRY_BACKOFF_MAX),
+}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, key: str, retry_in: float):
+        super().__init__(f"Circuit breaker {key} is open, retry in {retry_in:.0f}s")
+        self.key = key
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, key: str, threshold: int, cooldown: float, clock: Callable[[], float]):
+        self.key = key
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._clock = clock
+
+    @property
+    def state(self):
+        if self.threshold <= 0 or self.failures < self.threshold:
+            return "closed"
+        return "open" if self._clock() < self.open_until else "half-open"
+
+    def retry_in(self):
+        return max(self.open_until - self._clock(), 0.0)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":  # one probe per cooldown, others wait for its result
+            self.open_until = self._clock() + self.cooldown
+        return state != "open"
+
+    def success(self):
+        if 0 < self.threshold <= self.failures:
+            logger.info(f"Circuit breaker {self.key} closed")
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if 0 < self.threshold <= self.failures:
+            if self.failures == self.threshold:
+                logger.warning(f"Circuit breaker {self.key} opened for {self.cooldown:.0f}s")
+            self.open_until = self._clock() + self.cooldown
+
+
+class Breakers:
+    def __init__(
+        self,
+        threshold=BREAKER_THRESHOLD,
+        cooldown=BREAKER_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._items: dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str):
+        if key not in self._items:
+            self._items[key] = CircuitBreaker(key, self.threshold, self.cooldown, self._clock)
+        return self._items[key]
+
+    def proxy(self, proxy: str | None):
+        # credentials not in key, as it used in logs & state
+        url = urlparse(proxy) if proxy else None
+        return self.get(f"proxy:{url.hostname}:{url.port}" if url else "proxy:direct")
+
+    def queue(self, queue: str):
+        return self.get(f"queue:{queue}")
+
+    def state(self) -> dict[str, dict]:
+        return {
+            k: {"state": x.state, "failures": x.failures, "retry_in": x.retry_in()}
+            for k, x in self._items.items()
+        }
+
+
+breakers = Breakers()
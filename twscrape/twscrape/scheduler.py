@@ -0,0 +1,234 @@
+import heapq
+from collections import defaultdict
+from typing import Callable
+
+from .account import Account
+from .utils import utc
+
+NO_LIMIT = 1 << 30  # budget of account without known rate limit (not used yet or limit reset)
+
+
+class AccountScheduler:
+    # In-memory accounts selection. Two heaps per queue:
+    # - `_free`: available accounts by (-limit_remaining, limit_reset, username)
+    # - `_timers`: (ts, username) when account should be checked again (lock end / limit reset)
+    # Heap entries are not removed on state change, instead new entry is pushed and old one
+    # is skipped when it reaches top (free entry is valid only if it matches `_keys` value).
+
+    def __init__(
+        self,
+        accounts: list[Account],
+        budgets: dict[tuple[str, str], tuple[int, int]] | None = None,
+        lock_for=15 * 60,
+        prefer_budget=True,
+        clock: Callable[[], int] = utc.ts,
+    ):
+        self.lock_for = lock_for
+        self.prefer_budget = prefer_budget
+        self._clock = clock
+        self._accs: dict[str, Account] = {}
+        self._budgets = budgets or {}  # (username, queue) -> (limit_remaining, limit_reset)
+
+        self._avail: dict[str, dict[str, int]] = {}  # queue -> username -> available_at
+        self._budget: dict[str, dict[str, tuple[int, int]]] = {}  # queue -> username -> budget
+        self._keys: dict[str, dict[str, tuple[int, int, str]]] = {}  # queue -> username -> key
+        self._free: dict[str, list[tuple[int, int, str]]] = {}
+        self._timers: dict[str, list[tuple[int, str]]] = {}
+
+        # write-behind changes, taken by `take_changes`
+        self._dirty: dict[tuple[str, str], int] = {}  # (username, queue) -> req_count delta
+        self._used: dict[str, int] = {}  # username -> last_used ts
+        self._inactive: dict[str, str | None] = {}  # username -> error_msg
+
+        for x in accounts:
+            self._accs[x.username] = x
+
+    def _queue(self, queue: str):
+        if queue not in self._free:
+            self._avail[queue], self._budget[queue], self._keys[queue] = {}, {}, {}
+            self._free[queue], self._timers[queue] = [], []
+
+            now = self._clock()
+            for x in self._accs.values():
+                lock = x.locks.get(queue)
+                self._avail[queue][x.username] = int(lock.timestamp()) if lock else 0
+                if (x.username, queue) in self._budgets:
+                    self._budget[queue][x.username] = self._budgets[(x.username, queue)]
+                self._schedule(queue, x.username, now)
+
+        return self._free[queue]
+
+    def _schedule(self, queue: str, username: str, now: int):
+        # put account to free heap or to timers heap according to its current state
+        keys = self._keys[queue]
+        keys.pop(username, None)
+        if not self._accs[username].active:
+            return
+
+        available_at = self._avail[queue][username]
+        if available_at > now:
+            heapq.heappush(self._timers[queue], (available_at, username))
+            return
+
+        remaining, reset = self._budget[queue].get(username, (NO_LIMIT, 0))
+        if reset <= now:
+            remaining, reset = NO_LIMIT, 0
+        else:
+            heapq.heappush(self._timers[queue], (reset, username))  # budget restored at reset
+
+        if self.prefer_budget:
+            key = (-remaining, reset, username)
+        else:
+            key = (0, available_at, username)
+
+        keys[username] = key
+        heapq.heappush(self._free[queue], key)
+
+    def _refresh(self, queue: str, now: int):
+        timers, avail, budget = self._timers[queue], self._avail[queue], self._budget[queue]
+        while timers and timers[0][0] <= now:
+            ts, username = heapq.heappop(timers)
+            lock_end = ts == avail.get(username)
+            limit_reset = ts == budget.get(username, (0, 0))[1] and avail[username] <= now
+            if lock_end or limit_reset:
+                self._schedule(queue, username, now)
+
+    def _compact(self, queue: str):
+        free, timers, avail = self._free[queue], self._timers[queue], self._avail[queue]
+        if len(free) + len(timers) > 2 * len(avail) + 64:
+            free.clear()
+            timers.clear()
+            self._keys[queue].clear()
+
+            now = self._clock()
+            for username in avail:
+                self._schedule(queue, username, now)
+
+    def _peek(self, queue: str, now: int):
+        free = self._queue(queue)
+        self._refresh(queue, now)
+
+        keys = self._keys[queue]
+        while free:
+            username = free[0][2]
+            if keys.get(username) == free[0] and self._accs[username].active:
+                return username
+            heapq.heappop(free)
+
+        return None
+
+    def acquire(self, queue: str) -> Account | None:
+        now = self._clock()
+        username = self._peek(queue, now)
+        if username is None:
+            return None
+
+        heapq.heappop(self._free[queue])
+        self._set(username, queue, now + self.lock_for, 0)
+        self._schedule(queue, username, now)
+        return self._accs[username]
+
+    def next_available_at(self, queue: str) -> int | None:
+        now = self._clock()
+        username = self._peek(queue, now)
+        if username is not None:
+            return self._avail[queue][username]
+
+        # no free accounts, so only lock timers are relevant
+        timers, avail = self._timers[queue], self._avail[queue]
+        while timers:
+            ts, username = timers[0]
+            if self._accs[username].active and ts == avail.get(username):
+                return ts
+            heapq.heappop(timers)
+
+        return None
+
+    def _set(self, username: str, queue: str, available_at: int, req_count: int):
+        acc = self._accs[username]
+        self._avail[queue][username] = available_at
+
+        if available_at > 0:
+            acc.locks[queue] = utc.from_ts(available_at)
+        else:
+            acc.locks.pop(queue, None)
+
+        if req_count:
+            acc.stats[queue] = acc.stats.get(queue, 0) + req_count
+
+        key = (username, queue)
+        self._dirty[key] = self._dirty.get(key, 0) + req_count
+        self._used[username] = utc.ts()
+        acc.last_used = utc.now()
+
+    def set_lock(
+        self,
+        username: str,
+        queue: str,
+        available_at: int,
+        req_count=0,
+        limit_remaining: int | None = None,
+        limit_reset: int | None = None,
+    ):
+        if username not in self._accs:
+            return
+
+        self._queue(queue)
+        self._set(username, queue, available_at, req_count)
+        if limit_remaining is not None and limit_reset is not None:
+            self._budget[queue][username] = (limit_remaining, limit_reset)
+
+        self._schedule(queue, username, self._clock())
+        self._compact(queue)
+
+    def upsert(self, account: Account):
+        old = self._accs.get(account.username)
+        if old is not None:  # keep in-memory state, it can be newer than in db
+            account.locks, account.stats = old.locks, old.stats
+
+        self._accs[account.username] = account
+        now = self._clock()
+        for queue, avail in self._avail.items():
+            if account.username not in avail:
+                lock = account.locks.get(queue)
+                avail[account.username] = int(lock.timestamp()) if lock else 0
+            self._schedule(queue, account.username, now)
+
+    def set_active(self, username: str, active: bool):
+        acc = self._accs.get(username)
+        if acc is None:
+            return
+
+        acc.active = active
+        if active:
+            self._inactive.pop(username, None)
+            self.upsert(acc)
+
+    def mark_inactive(self, username: str, error_msg: str | None):
+        acc = self._accs.get(username)
+        if acc is None:
+            return
+
+        acc.active, acc.error_msg = False, error_msg
+        self._inactive[username] = error_msg
+
+    def take_changes(self):
+        states = []
+        for (username, queue), req_count in self._dirty.items():
+            ts = self._avail.get(queue, {}).get(username, 0)
+            remaining, reset = self._budget.get(queue, {}).get(username, (None, None))
+            states.append((username, queue, ts if ts > 0 else None, req_count, remaining, reset))
+
+        used, inactive = self._used, self._inactive
+        self._dirty, self._used, self._inactive = {}, {}, {}
+        return states, used, inactive
+
+    def restore_changes(self, states: list, used: dict[str, int], inactive: dict[str, str | None]):
+        # put back not persisted changes (eg. db write failed), newer values have priority
+        merged: defaultdict[tuple[str, str], int] = defaultdict(int, self._dirty)
+        for username, queue, _, req_count, *_ in states:
+            merged[(username, queue)] += req_count
+
+        self._dirty = dict(merged)
+        self._used = {**used, **self._used}
+        self._inactive = {**inactive, **self._inactive}
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import importlib.util
+import os
+import time
+from dataclasses import dataclass, field
+
+from httpx import AsyncHTTPTransport, Limits
+
+from .logger import logger
+from .utils import get_env_bool
+
+# keep-alive transports per (account, proxy), so QueueClient sessions of same account reuse opened
+# TCP+TLS connections instead of new handshake for each session (eg. each `user_by_id` call)
+HTTP_KEEPALIVE = float(os.getenv("TWS_HTTP_KEEPALIVE", "60"))  # seconds, 0 to disable reuse
+HTTP_MAX_CONNECTIONS = int(os.getenv("TWS_HTTP_MAX_CONNECTIONS", "10"))  # per account & proxy
+
+# HTTP/2: concurrent requests of account multiplexed over single connection; protocol is
+# negotiated with server (ALPN), so HTTP/1.1 used when it not supported on the way
+HTTP2 = get_env_bool("TWS_HTTP2")
+
+
+@functools.cache  # warning logged once
+def http2_available():
+    res = importlib.util.find_spec("h2") is not None
+    if not res:
+        logger.warning(
+            "HTTP/2 requires `h2` package (pip install twscrape[http2]), using HTTP/1.1"
+        )
+    return res
+
+
+@dataclass
+class _Entry:
+    transport: AsyncHTTPTransport
+    users: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class TransportPool:
+    def __init__(self, keepalive: float, max_connections: int):
+        self.keepalive = keepalive
+        self.max_connections = max_connections
+        self._items: dict[tuple[str, str | None, bool], _Entry] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _make(self, proxy: str | None, http2: bool):
+        limits = Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive,
+        )
+        return AsyncHTTPTransport(retries=3, proxy=proxy, limits=limits, http2=http2)
+
+    async def _evict(self):
+        now = time.monotonic()
+        for key, x in list(self._items.items()):
+            if x.users == 0 and now - x.last_used >= self.keepalive:
+                del self._items[key]
+                await x.transport.aclose()
+
+    async def acquire(self, username: str, proxy: str | None, http2=False) -> AsyncHTTPTransport:
+        # connections are bound to event loop, so dropped when loop changed (eg. several
+        # `asyncio.run` calls in same process); borrowed ones closed on release
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._items = loop, {}
+
+        await self._evict()
+
+        key = (username.lower(), proxy, http2 and http2_available())
+        if key not in self._items:
+            self._items[key] = _Entry(self._make(proxy, key[2]))
+
+        item = self._items[key]
+        item.users += 1
+        return item.transport
+
+    async def release(
+        self, username: str, proxy: str | None, transport: AsyncHTTPTransport, http2=False
+    ):
+        item = self._items.get((username.lower(), proxy, http2 and http2_available()))
+        if item is None or item.transport is not transport:
+            await transport.aclose()
+            return
+
+        item.users -= 1
+        item.last_used = time.monotonic()
+        if self.keepalive <= 0:
+            await self._evict()
+
+    async def close(self):
+        items, self._items = list(self._items.values()), {}
+        if self._loop is not asyncio.get_running_loop():
+            return
+
+        for x in items:
+            await x.transport.aclose()
+
+
+transports = TransportPool(HTTP_KEEPALIVE, HTTP_MAX_CONNECTIONS)
+
+
+async def close_transports():
+    await transports.close()
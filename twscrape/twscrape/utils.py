@@ -1,10 +1,17 @@
+import asyncio
 import base64
+import email.utils
+import functools
 import json
 import os
 from collections import defaultdict
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any, AsyncGenerator, Callable, TypeVar
 
+from httpx import Response
+
+from . import jsonlib
+
 T = TypeVar("T")
 
 
@@ -17,11 +24,50 @@ class utc:
     def from_iso(iso: str) -> datetime:
         return datetime.fromisoformat(iso).replace(tzinfo=timezone.utc)
 
+    @staticmethod
+    def from_ts(ts: int | float) -> datetime:
+        return datetime.fromtimestamp(ts, timezone.utc)
+
     @staticmethod
     def ts() -> int:
         return int(utc.now().timestamp())
 
 
+_MONTHS = {
+    x: i for i, x in enumerate("Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split(), 1)
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(val: str) -> datetime:
+    # `created_at` of X objects, eg. "Wed Oct 10 20:19:24 +0000 2018" (same result as
+    # `email.utils.parsedate_to_datetime`, which is used for other shapes)
+    parts = val.split(" ")
+    if len(parts) == 6 and parts[4] == "+0000" and parts[1] in _MONTHS:
+        try:
+            hh, mm, ss = parts[3].split(":")
+            mon, day, year = _MONTHS[parts[1]], int(parts[2]), int(parts[5])
+            return datetime(year, mon, day, int(hh), int(mm), int(ss), tzinfo=timezone.utc)
+        except ValueError:
+            pass
+
+    return email.utils.parsedate_to_datetime(val)
+
+
+SNOWFLAKE_EPOCH = 1288834974657  # ms, https://en.wikipedia.org/wiki/Snowflake_ID
+SNOWFLAKE_MIN_ID = 29700859247  # first snowflake tweet id (2010-11-04), older ids are sequential
+_SNOWFLAKE_EPOCH_DT = datetime.fromtimestamp(SNOWFLAKE_EPOCH / 1000, timezone.utc)
+
+
+def snowflake_ts(id: int | str) -> datetime | None:
+    # creation time of tweet (or other object) from its id, ms precision (`created_at` has seconds)
+    id = int(id)
+    if id < SNOWFLAKE_MIN_ID:
+        return None
+
+    return _SNOWFLAKE_EPOCH_DT + timedelta(milliseconds=id >> 22)
+
+
 async def gather(gen: AsyncGenerator[T, None]) -> list[T]:
     items = []
     async for x in gen:
@@ -29,12 +75,44 @@ async def gather(gen: AsyncGenerator[T, None]) -> list[T]:
     return items
 
 
+async def read_ahead(gen: AsyncGenerator[T, None], depth: int) -> AsyncGenerator[T, None]:
+    # items of `gen` are produced in background task up to `depth` items ahead of consumer;
+    # slot is held by each ready item and by current one of consumer, so memory stays bounded
+    slots, queue = asyncio.Semaphore(depth + 1), asyncio.Queue()
+
+    async def produce():
+        try:
+            while True:
+                await slots.acquire()
+                queue.put_nowait((await gen.__anext__(), None))
+        except StopAsyncIteration:
+            queue.put_nowait((None, StopAsyncIteration()))
+        except Exception as e:
+            queue.put_nowait((None, e))
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item, err = await queue.get()
+            if isinstance(err, StopAsyncIteration):
+                return
+            if err is not None:
+                raise err
+
+            yield item
+            slots.release()
+    finally:
+        task.cancel()
+        await asyncio.wait([task])  # not raises, so outer cancellation is not swallowed
+        await gen.aclose()
+
+
 def encode_params(obj: dict):
     res = {}
     for k, v in obj.items():
         if isinstance(v, dict):
             v = {a: b for a, b in v.items() if b is not None}
-            v = json.dumps(v, separators=(",", ":"))
+            v = jsonlib.dumps(v, compact=True)
 
         res[k] = str(v)
 
@@ -57,6 +135,19 @@ def int_or(obj: dict, key: str, default_value: int | None = None):
         return default_value
 
 
+def rep_json(rep: Any) -> Any:
+    # decoded body cached on response (like `__username` in QueueClient), so each page decoded
+    # once for QueueClient checks, API pagination and models parsing; failed decode not cached
+    if isinstance(rep, dict):  # already decoded object (parsers accept it too)
+        return rep
+
+    res = getattr(rep, "__json", None)
+    if res is None:
+        res = jsonlib.loads(rep.content) if isinstance(rep, Response) else rep.json()
+        setattr(rep, "__json", res)
+    return res
+
+
 # https://stackoverflow.com/a/43184871
 def get_by_path(obj: dict, key: str, default=None):
     stack = [iter(obj.items())]
@@ -124,6 +215,54 @@ def get_typed_object(obj: dict, res: defaultdict[str, list]):
     return res
 
 
+# tweet / user objects in timeline are under `tweet_results` / `user_results` of entries, inside of
+# them only keys which can hold nested tweets & users (author, retweet, quote, media source user,
+# card users, etc) are visited; rest of response (timeline instructions, entries, unknown shapes)
+# walked fully as in `get_typed_object`, as well as results where nothing parsable found (eg. new
+# wrapper key around tweet)
+_RESULT_KEYS = {"tweet_results", "user_results"}
+_NESTED_KEYS = {
+    *_RESULT_KEYS,
+    *("result", "tweet", "core", "legacy", "quotedRefResult", "card", "user_refs_results"),
+    *("retweeted_status_result", "quoted_status_result"),
+    *("conversation_control", "conversation_owner_results"),
+    *("entities", "extended_entities", "media", "additional_media_info", "source_user"),
+}
+
+
+def get_timeline_objects(obj: dict, res: defaultdict[str, list], in_result=False):
+    obj_type = obj.get("__typename", None)
+    if obj_type is not None:
+        res[obj_type].append(obj)
+
+    for k, v in obj.items():
+        if in_result and k not in _NESTED_KEYS:
+            continue
+
+        if k in _RESULT_KEYS and isinstance(v, dict):
+            _get_result_objects(v, res)
+            continue
+
+        nested = in_result or k in _RESULT_KEYS
+        if isinstance(v, dict):
+            get_timeline_objects(v, res, nested)
+        elif isinstance(v, list):
+            for x in v:
+                if isinstance(x, dict):
+                    get_timeline_objects(x, res, nested)
+
+    return res
+
+
+def _get_result_objects(obj: dict, res: defaultdict[str, list]):
+    tmp = get_timeline_objects(obj, defaultdict(list), True)
+    if not any("legacy" in x or "tweet" in x for items in tmp.values() for x in items):
+        tmp = get_typed_object(obj, defaultdict(list))
+
+    for k, items in tmp.items():
+        res[k].extend(items)
+
+
 def to_old_obj(obj: dict):
     return {
         **obj,
@@ -134,18 +273,24 @@ def to_old_obj(obj: dict):
     }
 
 
-def to_old_rep(obj: dict) -> dict[str, dict]:
-    tmp = get_typed_object(obj, defaultdict(list))
+def _by_id(items: list[dict]):
+    # same object can be found several times (eg. author of many tweets): last one is used, but
+    # order is by first occurrence (as in dict comprehension), so merged copy built once per id
+    res = {str(x["rest_id"]): x for x in items}
+    return {k: to_old_obj(v) for k, v in res.items()}
+
+
+def to_old_rep(obj: dict, generic=False) -> dict[str, dict]:
+    walk = get_typed_object if generic else get_timeline_objects
+    tmp = walk(obj, defaultdict(list))
 
-    tw1 = [x for x in tmp.get("Tweet", []) if "legacy" in x]
-    tw1 = {str(x["rest_id"]): to_old_obj(x) for x in tw1}
+    tw1 = _by_id([x for x in tmp.get("Tweet", []) if "legacy" in x])
 
     # https://github.com/vladkens/twscrape/issues/53
     tw2 = [x["tweet"] for x in tmp.get("TweetWithVisibilityResults", []) if "legacy" in x["tweet"]]
-    tw2 = {str(x["rest_id"]): to_old_obj(x) for x in tw2}
+    tw2 = _by_id(tw2)
 
-    users = [x for x in tmp.get("User", []) if "legacy" in x and "id" in x]
-    users = {str(x["rest_id"]): to_old_obj(x) for x in users}
+    users = _by_id([x for x in tmp.get("User", []) if "legacy" in x and "id" in x])
 
     trends = [x for x in tmp.get("TimelineTrend", [])]
     trends = {x["name"]: x for x in trends}
@@ -1,5 +1,6 @@
 import base64
 import hashlib
+import html
 import json
 import math
 import random
@@ -10,6 +11,8 @@ import bs4
 import httpx
 from fake_useragent import UserAgent
 
+from .logger import logger
+
 
 def _make_client() -> httpx.AsyncClient:
     headers = {"user-agent": UserAgent().chrome}
@@ -189,6 +192,42 @@ def cacl_anim_key(frames: list[float], target_time: float) -> str:
     return re.sub(r"[.-]", "", "".join(str_arr))
 
 
+# Keys are taken from few elements of page (~250KB), so they found with regexes on raw text;
+# BeautifulSoup used as fallback when page markup changed and regexes found nothing or only part
+
+META_REGEX = re.compile(
+    r"<meta\s(?:[^>]*?\s)?name=[\"']twitter-site-verification[\"'][^>]*>", re.I
+)
+CONTENT_REGEX = re.compile(r"\scontent=[\"']([^\"']*)[\"']", re.I)
+SVG_ID_REGEX = re.compile(r"<svg\s(?:[^>]*?\s)?id=[\"']loading-x-anim", re.I)
+SVG_REGEX = re.compile(r"<svg\s(?:[^>]*?\s)?id=[\"']loading-x-anim[^>]*>(.*?)</svg>", re.S | re.I)
+# second path of first <g> in svg (same as css selector used for bs4)
+PATH_REGEX = re.compile(
+    r"^\s*<g[^>]*>\s*<path\b[^>]*?(?:/>|>\s*</path>)"
+    r"\s*<path\s(?:[^>]*?\s)?d=[\"']([^\"']*)[\"']",
+    re.S | re.I,
+)
+
+
+ANIM_FRAMES = 16  # frame selected by `vk_bytes[x] % 16`
+ANIM_FRAME_SIZE = 11  # from / to color, rotation, 4 curve points
+
+
+def find_vk_bytes(text: str) -> list[int] | None:
+    el = META_REGEX.search(text)
+    el = CONTENT_REGEX.search(el.group(0)) if el else None
+    try:
+        val = html.unescape(el.group(1)) if el else ""
+        return list(base64.b64decode(val, validate=True)) if val else None
+    except ValueError:  # binascii.Error
+        return None
+
+
+def find_anim_paths(text: str) -> list[str]:
+    els = [PATH_REGEX.match(x.group(1)) for x in SVG_REGEX.finditer(text)]
+    return [html.unescape(x.group(1)).strip() for x in els if x]
+
+
 def parse_vk_bytes(soup: bs4.BeautifulSoup) -> list[int]:
     el = soup.find("meta", {"name": "twitter-site-verification", "content": True})
     el = str(el.get("content")) if el and isinstance(el, bs4.Tag) else None
@@ -198,6 +237,34 @@ def parse_vk_bytes(soup: bs4.BeautifulSoup) -> list[int]:
     return list(base64.b64decode(bytes(el, "utf-8")))
 
 
+def parse_anim_paths(soup: bs4.BeautifulSoup) -> list[str]:
+    # https://github.com/fa0311/twitter-tid-deobf/blob/c4fd61c36/output/a.js#L18
+    els = list(soup.select("svg[id^='loading-x-anim'] g:first-child path:nth-child(2)"))
+    return [str(x.get("d") or "").strip() for x in els]
+
+
+def valid_anim_paths(text: str, els: list[str]) -> bool:
+    # partly matched markup gives wrong keys (not error), so path of each svg and frames checked
+    if not els or len(els) != len(SVG_ID_REGEX.findall(text)):
+        return False
+
+    for path in els:
+        frames = [re.sub(r"[^\d]+", " ", x).split() for x in path[9:].split("C")]
+        if len(frames) < ANIM_FRAMES or any(len(x) < ANIM_FRAME_SIZE for x in frames):
+            return False
+    return True
+
+
+def parse_page(text: str) -> tuple[list[int], list[str]]:
+    vk_bytes, els = find_vk_bytes(text), find_anim_paths(text)
+    if vk_bytes is None or not valid_anim_paths(text, els):
+        logger.debug("XClientTxId keys not found with regexes, parsing page with bs4")
+        soup = bs4.BeautifulSoup(text, "html.parser")
+        vk_bytes, els = parse_vk_bytes(soup), parse_anim_paths(soup)
+
+    return vk_bytes, els
+
+
 async def parse_anim_idx(text: str) -> list[int]:
     scripts = list(get_scripts_list(text))
     scripts = [x for x in scripts if "/ondemand.s." in x]
@@ -213,10 +280,7 @@ async def parse_anim_idx(text: str) -> list[int]:
     return items
 
 
-def parse_anim_arr(soup: bs4.BeautifulSoup, vk_bytes: list[int]) -> list[list[float]]:
-    # https://github.com/fa0311/twitter-tid-deobf/blob/c4fd61c36/output/a.js#L18
-    els = list(soup.select("svg[id^='loading-x-anim'] g:first-child path:nth-child(2)"))
-    els = [str(x.get("d") or "").strip() for x in els]
+def parse_anim_arr(els: list[str], vk_bytes: list[int]) -> list[list[float]]:
     if not els:
         raise Exception("Couldn't get XClientTxId animation array")
 
@@ -226,10 +290,9 @@ def parse_anim_arr(soup: bs4.BeautifulSoup, vk_bytes: list[int]) -> list[list[fl
     return arr
 
 
-async def load_keys(soup: bs4.BeautifulSoup) -> tuple[list[int], str]:
-    anim_idx = await parse_anim_idx(str(soup))
-    vk_bytes = parse_vk_bytes(soup)
-    anim_arr = parse_anim_arr(soup, vk_bytes)
+def calc_keys(text: str, anim_idx: list[int]) -> tuple[list[int], str]:
+    vk_bytes, els = parse_page(text)
+    anim_arr = parse_anim_arr(els, vk_bytes)
 
     frame_time = 1
     for x in anim_idx[1:]:
@@ -243,13 +306,15 @@ async def load_keys(soup: bs4.BeautifulSoup) -> tuple[list[int], str]:
     return vk_bytes, anim_key
 
 
+async def load_keys(text: str) -> tuple[list[int], str]:
+    return calc_keys(text, await parse_anim_idx(text))
+
+
 class XClIdGen:
     @staticmethod
     async def create(clt: httpx.AsyncClient | None = None) -> "XClIdGen":
         text = await get_tw_page_text("https://x.com/tesla", clt=clt)
-        soup = bs4.BeautifulSoup(text, "html.parser")
-
-        vk_bytes, anim_key = await load_keys(soup)
+        vk_bytes, anim_key = await load_keys(text)
         clid_gen = XClIdGen(vk_bytes, anim_key)
         return clid_gen
 
@@ -277,9 +342,7 @@ class XClIdGen:
 
 async def main():
     text = await get_tw_page_text("https://x.com/elonmusk")
-    soup = bs4.BeautifulSoup(text, "html.parser")
-
-    vk_bytes, anim_key = await load_keys(soup)
+    vk_bytes, anim_key = await load_keys(text)
     clid_gen = XClIdGen(vk_bytes, anim_key)
 
     method = "GET"
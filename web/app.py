@@ -41,7 +41,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Twitter API
-api = API("../twitter_accounts.db")
+api = API("../twitter_accounts.db", strict_limit=True)
 set_log_level("WARNING")  # Reduce twscrape logging
 
 class TwitterScraperAPI: